@@ -3,13 +3,13 @@ import os
 import logging
 from typing import Literal
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 
 from agent.state import AgentState
 from tools.registry import get_all_tools
+from tools.gemini_client import get_chat_model
 
 # Load environment variables
 load_dotenv()
@@ -30,11 +30,8 @@ def create_agent():
     if not api_key:
         raise ValueError("GOOGLE_API_KEY not found in environment variables")
     
-    # Initialize the Gemini model
-    model = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash-exp",
-        temperature=0.7,
-    )
+    # Initialize the Gemini model (pooled, so vision tools reuse its transport)
+    model = get_chat_model(temperature=0.7)
     
     # Get all available tools
     tools = get_all_tools()
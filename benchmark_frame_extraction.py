@@ -0,0 +1,79 @@
+"""
+Benchmark: frame extraction with ffmpeg seeking vs. MoviePy's VideoFileClip.get_frame,
+and segment-parallel scene detection vs. a single decoder.
+
+Usage:
+    python benchmark_frame_extraction.py [video_path] [num_frames]
+
+Without a video path, a 10-minute 1080p test video is generated with ffmpeg.
+"""
+import os
+import sys
+import time
+import subprocess
+import tempfile
+
+from tools.frame_extractor import (
+    get_ffmpeg_path, probe_duration, extract_frames, extract_frames_moviepy,
+    decode_scene_scores
+)
+
+
+def generate_test_video(duration: int = 600) -> str:
+    """Generate a synthetic 1080p H.264 test video."""
+    path = os.path.join(tempfile.gettempdir(), f"benchmark_video_{duration}s.mp4")
+    if not os.path.exists(path):
+        print(f"Generating {duration}s test video at {path}...")
+        subprocess.run(
+            [get_ffmpeg_path(), "-loglevel", "error", "-y",
+             "-f", "lavfi", "-i", f"testsrc2=duration={duration}:size=1920x1080:rate=30",
+             "-pix_fmt", "yuv420p", "-c:v", "libx264", "-preset", "ultrafast", path],
+            check=True
+        )
+    return path
+
+
+def time_call(label: str, func, *args, **kwargs):
+    """Run func once and print its wall time."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<32} {elapsed:8.3f}s")
+    return result, elapsed
+
+
+def main():
+    video_path = sys.argv[1] if len(sys.argv) > 1 else generate_test_video()
+    num_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print("=" * 70)
+    print("Frame Extraction Benchmark")
+    print("=" * 70)
+    print(f"Video: {video_path}")
+
+    duration, probe_time = time_call("ffmpeg header probe", probe_duration, video_path)
+    frame_times = [duration * i / (num_frames + 1) for i in range(1, num_frames + 1)]
+    print(f"Duration: {duration:.1f}s, extracting {num_frames} frames\n")
+
+    _, ffmpeg_time = time_call("ffmpeg (exact seek)", extract_frames, video_path, frame_times)
+    time_call("ffmpeg (keyframes only)", extract_frames, video_path, frame_times, exact=False)
+
+    try:
+        _, moviepy_time = time_call("moviepy VideoFileClip", extract_frames_moviepy, video_path, frame_times)
+        print(f"\nSpeedup (exact seek vs moviepy): {moviepy_time / ffmpeg_time:.1f}x")
+    except ImportError:
+        print("\nmoviepy not installed; skipping the baseline")
+
+    # Full-timeline scene detection, sequential vs. one segment per core
+    cores = os.cpu_count() or 1
+    print(f"\nScene detection decode ({cores} cores available):")
+    _, sequential_time = time_call("1 worker", decode_scene_scores, video_path, workers=1)
+    if cores > 1:
+        _, parallel_time = time_call(f"{cores} workers", decode_scene_scores, video_path, workers=cores)
+        print(f"\nParallel decode speedup: {sequential_time / parallel_time:.1f}x")
+
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Ingest a Wikipedia dump as an offline snapshot for year-pinned lookups.
+
+Usage:
+    python setup_wikipedia_snapshot.py <dump> [year] [max_pages]
+
+The dump is a pages-articles XML file (.xml, .xml.bz2 or .xml.gz, e.g. from
+https://dumps.wikimedia.org/enwiki/) or JSON lines with "title" and "text".
+Without a year, the year of the newest revision in the dump is used.
+"""
+import sys
+import time
+
+from tools.wikipedia_snapshot import ingest_dump, available_years
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    dump_path = sys.argv[1]
+    year = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    max_pages = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    print(f"Ingesting {dump_path}...")
+    print("=" * 60)
+    start = time.perf_counter()
+    meta = ingest_dump(dump_path, year, max_pages)
+    print(f"✓ {meta['year']} snapshot: {meta['articles']} articles, {meta['redirects']} redirects, "
+          f"{meta['terms']} terms ({time.perf_counter() - start:.1f}s)")
+    print("=" * 60)
+    print(f"Snapshots available: {', '.join(map(str, available_years()))}")
@@ -0,0 +1,99 @@
+"""Tests for local chess diagram recognition in tools.chess_vision."""
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from tools.chess_vision import MIN_CONFIDENCE, recognize_chess_board
+
+SOLID_GLYPHS = {"k": "♚", "q": "♛", "r": "♜", "b": "♝", "n": "♞", "p": "♟"}
+OUTLINE_GLYPHS = {"k": "♔", "q": "♕", "r": "♖", "b": "♗", "n": "♘", "p": "♙"}
+SQUARE_COLOURS = ((240, 217, 181), (181, 136, 99))
+
+
+@pytest.fixture(scope="module")
+def font_path():
+    try:
+        ImageFont.truetype("DejaVuSans.ttf", 12)
+    except OSError:
+        pytest.skip("DejaVuSans font not available")
+    return "DejaVuSans.ttf"
+
+
+def _render(font_path, path, placement, style="filled", flipped=False, labels=True, square=60, margin=25):
+    """Draw a diagram of a FEN piece placement, with rank and file labels in the margin."""
+    rows = []
+    for fen_row in placement.split("/"):
+        row = []
+        for char in fen_row:
+            row.extend([None] * int(char) if char.isdigit() else [char])
+        rows.append(row)
+    if flipped:
+        rows = [row[::-1] for row in rows[::-1]]
+
+    size = 8 * square + 2 * margin
+    image = Image.new("RGB", (size, size), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.truetype(font_path, int(square * 0.85))
+    for r, row in enumerate(rows):
+        for c, piece in enumerate(row):
+            x, y = margin + c * square, margin + r * square
+            draw.rectangle((x, y, x + square - 1, y + square - 1), fill=SQUARE_COLOURS[(r + c) % 2])
+            if piece is None:
+                continue
+            centre = (x + square / 2, y + square / 2)
+            if piece.islower():
+                draw.text(centre, SOLID_GLYPHS[piece], font=font, fill="black", anchor="mm")
+            elif style == "filled":
+                draw.text(centre, SOLID_GLYPHS[piece.lower()], font=font, fill="white", anchor="mm",
+                          stroke_width=max(1, square // 30), stroke_fill="black")
+            else:
+                draw.text(centre, OUTLINE_GLYPHS[piece.lower()], font=font, fill="black", anchor="mm")
+    if labels:
+        label_font = ImageFont.truetype(font_path, margin // 2)
+        ranks, files = ("12345678", "hgfedcba") if flipped else ("87654321", "abcdefgh")
+        for i in range(8):
+            draw.text((margin / 2, margin + (i + 0.5) * square), ranks[i], font=label_font, fill="black", anchor="mm")
+            draw.text((margin + (i + 0.5) * square, size - margin / 2), files[i], font=label_font,
+                      fill="black", anchor="mm")
+    image.save(path)
+    return str(path)
+
+
+def _recognized(image_path, placement, **kwargs):
+    """True if the board is read correctly; a confident misreading fails the test."""
+    fen, confidence = recognize_chess_board(image_path, **kwargs)
+    correct = fen is not None and fen.split()[0] == placement
+    assert correct or confidence < MIN_CONFIDENCE, f"read {fen} at confidence {confidence:.2f}"
+    return correct
+
+
+@pytest.mark.parametrize("placement", [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR",
+    # White king nearer the top than the black king, on a board seen from White
+    "8/4K3/8/8/8/8/3k4/8",
+    "8/3K4/8/2P5/8/8/5k2/7q",
+])
+def test_filled_diagrams(font_path, tmp_path, placement):
+    assert _recognized(_render(font_path, tmp_path / "board.png", placement), placement)
+
+
+@pytest.mark.parametrize("placement", [
+    "4k3/8/8/7Q/8/8/8/4K3",
+    # White bishops drawn as outlines on dark squares
+    "4k3/8/8/8/8/8/8/2B1KB2",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR",
+])
+def test_outline_white_pieces_keep_their_colour(font_path, tmp_path, placement):
+    _recognized(_render(font_path, tmp_path / "board.png", placement, style="outline"), placement)
+
+
+def test_orientation_read_from_labels(font_path, tmp_path):
+    placement = "8/3K4/8/2P5/8/8/5k2/7q"
+    assert _recognized(_render(font_path, tmp_path / "board.png", placement, flipped=True), placement)
+
+
+def test_orientation_given_without_labels(font_path, tmp_path):
+    placement = "8/3K4/8/2P5/8/8/5k2/7q"
+    image_path = _render(font_path, tmp_path / "board.png", placement, flipped=True, labels=False)
+    assert _recognized(image_path, placement, flipped=True)
+    fen, _ = recognize_chess_board(image_path)
+    assert fen.split()[0] == "q7/2k5/8/8/5P2/8/4K3/8"
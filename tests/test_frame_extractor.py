@@ -0,0 +1,45 @@
+"""Tests for probing and frame extraction in tools.frame_extractor."""
+import subprocess
+
+import pytest
+
+from tools.frame_extractor import extract_frames, get_ffmpeg_path, probe_video
+
+
+@pytest.fixture(scope="module")
+def ffmpeg():
+    path = get_ffmpeg_path()
+    if not path:
+        pytest.skip("ffmpeg not available")
+    return path
+
+
+def _make_video(ffmpeg: str, path, *options):
+    """Render a 3 second 320x180 test pattern video, then remux it with options."""
+    source = path.with_suffix(".source.mp4")
+    subprocess.run(
+        [ffmpeg, "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc=size=320x180:rate=10",
+         "-t", "3", "-pix_fmt", "yuv420p", str(source)],
+        check=True
+    )
+    subprocess.run([ffmpeg, "-v", "error", "-y", *options, str(path)], check=True,
+                   input=source.read_bytes() if "pipe:0" in options else None)
+    return str(path)
+
+
+def test_rotated_video_frames_keep_display_aspect(ffmpeg, tmp_path):
+    video = _make_video(ffmpeg, tmp_path / "rotated.mp4",
+                        "-display_rotation", "90", "-i", "pipe:0", "-c", "copy")
+    duration, width, height = probe_video(video)
+    assert (width, height) == (180, 320)
+    assert duration == pytest.approx(3.0, abs=0.2)
+    assert [frame.size for frame in extract_frames(video, [1.0])] == [(180, 320)]
+
+
+def test_duration_without_header_duration(ffmpeg, tmp_path):
+    # Live webm has no duration in its header ("Duration: N/A")
+    video = _make_video(ffmpeg, tmp_path / "live.webm",
+                        "-i", "pipe:0", "-c:v", "libvpx", "-live", "1", "-f", "webm")
+    duration, width, height = probe_video(video)
+    assert (width, height) == (320, 180)
+    assert duration == pytest.approx(3.0, abs=0.3)
@@ -0,0 +1,24 @@
+"""Tests for anchor-only link extraction in tools.link_extractor."""
+from tools.document_cache import parse_html
+from tools.http_client import CachedResponse
+from tools.link_extractor import extract_anchor_links
+
+PAGE = b"""<html><head><template><base href="https://elsewhere.example/"></template></head><body>
+<a href="/albums">Albums</a>
+<noscript><a href="/no-js">Plain version</a></noscript>
+<template><div><a href="/row">Row template</a></div></template>
+<a href="tours.html#2005">Tours</a>
+</body></html>"""
+
+
+def test_links_in_hidden_elements_are_skipped():
+    assert extract_anchor_links(PAGE, "https://example.org/artist/") == [
+        ("Albums", "https://example.org/albums"),
+        ("Tours", "https://example.org/artist/tours.html"),
+    ]
+
+
+def test_anchor_only_and_parsed_links_agree():
+    url = "https://example.org/artist/"
+    response = CachedResponse(url, 200, {"Content-Type": "text/html"}, PAGE)
+    assert extract_anchor_links(PAGE, url) == parse_html(url, response).links
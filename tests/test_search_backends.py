@@ -0,0 +1,72 @@
+"""Tests for the local search backend and reading its results."""
+import pytest
+import requests
+
+from tools import http_client, search_backends
+from tools.http_client import fetch
+from tools.search_backends import LocalSearchBackend, SearchBackend
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """A small local corpus, selected as the search backend."""
+    corpus_dir = tmp_path / "corpus"
+    corpus_dir.mkdir()
+    (corpus_dir / "sosa.html").write_text(
+        "<html><head><title>Mercedes Sosa</title></head><body>"
+        "<h1>Mercedes Sosa</h1><p>Mercedes Sosa was an Argentine singer.</p>"
+        "<h2>Discography</h2><p>Between 2000 and 2009 she released several studio albums, "
+        "including Corazón Libre in 2005.</p></body></html>"
+    )
+    (corpus_dir / "penguins.txt").write_text("Emperor penguins breed in the Antarctic winter.")
+    monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("SEARCH_BACKEND", "local")
+    monkeypatch.setenv("SEARCH_CORPUS_DIR", str(corpus_dir))
+    monkeypatch.setattr(search_backends, "_backend", None)
+    monkeypatch.setattr(http_client, "_local_roots", [])
+    return corpus_dir
+
+
+def test_search_backend_is_abstract():
+    with pytest.raises(TypeError):
+        SearchBackend()
+
+
+def test_local_search_ranks_matching_file_first(corpus):
+    response = LocalSearchBackend(str(corpus)).search("Mercedes Sosa albums", max_results=2)
+    assert response["answer"] is None
+    assert response["results"][0]["url"] == (corpus / "sosa.html").resolve().as_uri()
+
+
+def test_corpus_files_are_fetchable(corpus):
+    LocalSearchBackend(str(corpus))
+    response = fetch((corpus / "penguins.txt").resolve().as_uri())
+    assert response.content == b"Emperor penguins breed in the Antarctic winter."
+    assert response.content_type == "text/plain"
+
+
+def test_files_outside_corpus_are_not_fetchable(corpus, tmp_path):
+    LocalSearchBackend(str(corpus))
+    secret = tmp_path / "secret.txt"
+    secret.write_text("not for the agent")
+    with pytest.raises(requests.exceptions.InvalidURL):
+        fetch(secret.as_uri())
+
+
+def test_search_and_read_reads_local_results(corpus):
+    from tools.web_search import search_and_read
+
+    digest = search_and_read.invoke({"query": "Mercedes Sosa studio albums", "read_top": 2})
+    assert "top results read" in digest
+    assert "Corazón Libre" in digest
+
+
+def test_read_url_does_not_page_plain_text(corpus):
+    from tools.document_reader import read_url
+
+    notes = corpus / "notes.txt"
+    notes.write_text("\n".join(f"Note {i}: emperor penguins huddle for warmth." for i in range(200)))
+    LocalSearchBackend(str(corpus))
+    content = read_url.invoke({"url": notes.resolve().as_uri()})
+    assert "--- Page" not in content
+    assert content.startswith(f"Content from {notes.resolve().as_uri()}:\n\nNote 0:")
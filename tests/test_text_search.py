@@ -0,0 +1,84 @@
+"""Tests for multi-term matching and context windows in tools.text_search."""
+import sys
+
+import pytest
+
+from tools.text_search import _build_matcher, context_windows, find_matches
+
+
+@pytest.fixture(params=["lookahead", "automaton"])
+def matcher_kind(request, monkeypatch):
+    """Run a test against both the regex fallback and the pyahocorasick automaton."""
+    if request.param == "automaton":
+        pytest.importorskip("ahocorasick")
+    else:
+        # A None entry makes "import ahocorasick" raise ImportError
+        monkeypatch.setitem(sys.modules, "ahocorasick", None)
+    _build_matcher.cache_clear()
+    yield request.param
+    _build_matcher.cache_clear()
+
+
+class TestFindMatches:
+    """Test find_matches."""
+
+    def test_prefix_terms_at_same_position(self, matcher_kind):
+        matches = find_matches("I love New York and new ideas", ["new", "new york"])
+        assert matches == [(7, 10, 0), (7, 15, 1), (20, 23, 0)]
+
+    def test_overlapping_terms(self, matcher_kind):
+        matches = find_matches("abcd", ["abc", "bcd"])
+        assert matches == [(0, 3, 0), (1, 4, 1)]
+
+    def test_case_insensitive(self, matcher_kind):
+        assert find_matches("Paris and PARIS", ["paris"]) == [(0, 5, 0), (10, 15, 0)]
+
+    def test_terms_differing_only_in_case(self, matcher_kind):
+        assert find_matches("Apple pie", ["apple", "APPLE"]) == [(0, 5, 0), (0, 5, 1)]
+
+    def test_word_mode_skips_partial_words(self, matcher_kind):
+        assert find_matches("cat category cat.", ["cat"], mode="word") == [(0, 3, 0), (13, 16, 0)]
+
+    def test_regex_mode(self):
+        assert find_matches("born 1947, died 2011", [r"\d{4}"], mode="regex") == [(5, 9, 0), (16, 20, 0)]
+
+    def test_regex_backreferences_per_term(self):
+        matches = find_matches("aa bcbc", [r"(a)\1", r"(bc)\1"], mode="regex")
+        assert matches == [(0, 2, 0), (3, 7, 1)]
+
+    def test_fuzzy_mode_tolerates_typos(self):
+        assert find_matches("The Mississipi river", ["mississippi"], mode="fuzzy") == [(4, 14, 0)]
+
+    def test_blank_terms_ignored(self):
+        assert find_matches("some text", ["", "  "]) == []
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            find_matches("text", ["text"], mode="glob")
+
+
+class TestContextWindows:
+    """Test context_windows."""
+
+    def test_nearby_matches_merge(self):
+        text = "alpha beta gamma"
+        windows = context_windows(text, find_matches(text, ["alpha", "gamma"]), context_chars=10)
+        assert len(windows) == 1
+        assert windows[0]["terms"] == {0, 1}
+        assert windows[0]["matches"] == 2
+        assert windows[0]["text"] == text
+
+    def test_ellipses_mark_truncation(self):
+        text = "x" * 50 + " needle " + "y" * 50
+        windows = context_windows(text, find_matches(text, ["needle"]), context_chars=5)
+        assert windows[0]["text"] == "...xxxx needle yyyy..."
+
+    def test_windows_with_more_terms_rank_first(self):
+        text = "one " + "filler " * 40 + "one two " + "filler " * 40
+        windows = context_windows(text, find_matches(text, ["one", "two"]), context_chars=10)
+        assert len(windows) == 2
+        assert windows[0]["terms"] == {0, 1}
+        assert windows[1]["terms"] == {0}
+
+    def test_no_matches(self):
+        assert context_windows("text", []) == []
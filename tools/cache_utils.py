@@ -0,0 +1,51 @@
+"""Shared helpers for the on-disk caches used by the tools."""
+import os
+import re
+import hashlib
+import sqlite3
+from contextlib import closing, contextmanager
+from typing import Iterator
+
+
+def get_cache_dir(name: str) -> str:
+    """
+    Get (and create) a cache directory for a tool.
+    
+    The base directory defaults to .cache/ in the project root and can be
+    changed with the AGENT_CACHE_DIR environment variable.
+    
+    Args:
+        name: Subdirectory name for the cache (e.g. "frames")
+    
+    Returns:
+        Absolute path of the cache directory
+    """
+    base_dir = os.getenv("AGENT_CACHE_DIR") or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"
+    )
+    cache_dir = os.path.join(base_dir, name)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+@contextmanager
+def sqlite_connection(db_path: str, timeout: float = 10) -> Iterator[sqlite3.Connection]:
+    """
+    Open a SQLite connection for one transaction.
+    
+    The transaction is committed on success and rolled back on error, and
+    the connection is always closed (a bare "with sqlite3.connect(...)" only
+    commits and leaks the handle).
+    """
+    with closing(sqlite3.connect(db_path, timeout=timeout)) as conn, conn:
+        yield conn
+
+
+def content_hash(data: bytes) -> str:
+    """Return the SHA-256 hex digest of raw bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for use in cache keys (case and whitespace insensitive)."""
+    return re.sub(r'\s+', ' ', question).strip().lower()
@@ -0,0 +1,464 @@
+"""Local chess diagram recognition: board grid detection and piece classification with NumPy/PIL."""
+import os
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+
+# Size of the normalized piece silhouettes compared against templates
+SILHOUETTE_SIZE = 32
+
+# Cells are downscaled to at most this many pixels per side before segmentation,
+# which keeps recognition time independent of the diagram's resolution
+SEGMENT_SIZE = 32
+
+# Pieces with more than this share of core pixels much darker than their square are black.
+# Solid black glyphs score 0.6-0.95 (light detail lines lower it); white ones, filled
+# or drawn as outlines, at most about 0.5.
+BLACK_PIECE_THRESHOLD = 0.55
+
+# Distance from BLACK_PIECE_THRESHOLD at which a piece's colour is fully trusted;
+# closer readings lower the confidence so the board falls back to the vision model
+COLOUR_MARGIN = 0.08
+
+# Recognitions below this confidence should fall back to the vision model
+MIN_CONFIDENCE = 0.8
+
+# Learned templates (see learn_piece_templates) take precedence over font glyphs
+TEMPLATES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "chess_templates.npz"
+)
+
+# Fonts with chess glyphs, tried in order (Windows, Linux, macOS)
+CHESS_FONTS = ["seguisym.ttf", "DejaVuSans.ttf", "FreeSerif.ttf", "Arial Unicode.ttf"]
+
+# Black glyphs are solid, so their outline is the silhouette of either colour
+PIECE_GLYPHS = {"k": "♚", "q": "♛", "r": "♜", "b": "♝", "n": "♞", "p": "♟"}
+
+# Size of the normalized coordinate labels compared against rendered characters
+LABEL_SIZE = 16
+
+# Minimum summed correlation advantage for the labels to decide the orientation
+MIN_LABEL_EVIDENCE = 0.3
+
+_templates = None
+_label_templates = None
+
+
+def _find_grid(profile: np.ndarray) -> Tuple[int, float]:
+    """
+    Find 9 evenly spaced grid lines in a 1-D edge-strength profile.
+
+    Returns:
+        (first line position, square size) maximizing the summed edge strength
+    """
+    length = len(profile)
+    # Smooth by one pixel so lines falling between pixels still score
+    smoothed = np.convolve(profile, np.ones(3), mode="same")
+    best = (0.0, 0, length / 8)
+    for size in np.arange(length / 10, length / 8 + 0.5, 0.5):
+        starts = np.arange(0, int(length - 8 * size) + 1)
+        if len(starts) == 0:
+            continue
+        positions = (starts[:, None] + np.arange(9)[None, :] * size).round().astype(int)
+        positions = np.clip(positions, 0, length - 1)
+        # Favour larger grids on ties, so the board (not a sub-pattern) wins
+        scores = smoothed[positions].sum(axis=1) * (1 + size / length)
+        index = int(scores.argmax())
+        if scores[index] > best[0]:
+            best = (float(scores[index]), int(starts[index]), float(size))
+
+    # Refine the start on the unsmoothed profile; a difference at index i is
+    # the boundary between pixels i and i + 1
+    _, start, size = best
+
+    def raw_score(candidate: int) -> float:
+        positions = (candidate + np.arange(9) * size).round().astype(int)
+        return float(profile[positions[(positions >= 0) & (positions < length)]].sum())
+
+    start = max((start - 1, start, start + 1), key=raw_score)
+    return max(0, start + 1), size
+
+
+def locate_board(gray: np.ndarray) -> Tuple[int, int, float, float]:
+    """
+    Locate the 8x8 grid in a grayscale image from its square edges.
+
+    Returns:
+        (left, top, square width, square height) in pixels
+    """
+    dx = np.abs(np.diff(gray, axis=1)).sum(axis=0)
+    dy = np.abs(np.diff(gray, axis=0)).sum(axis=1)
+    left, square_width = _find_grid(np.append(dx, 0))
+    top, square_height = _find_grid(np.append(dy, 0))
+    return left, top, square_width, square_height
+
+
+def _dilate(mask: np.ndarray) -> np.ndarray:
+    """Grow a mask by one pixel in the four directions."""
+    grown = mask.copy()
+    grown[1:] |= mask[:-1]
+    grown[:-1] |= mask[1:]
+    grown[:, 1:] |= mask[:, :-1]
+    grown[:, :-1] |= mask[:, 1:]
+    return grown
+
+
+def _grow_region(seed: np.ndarray, allowed: np.ndarray) -> np.ndarray:
+    """Pixels of allowed that are 4-connected to seed, by repeated vectorized dilation."""
+    region = seed & allowed
+    size = np.count_nonzero(region)
+    while True:
+        grown = _dilate(region) & allowed
+        # The region only grows, so an unchanged size means it is complete
+        grown_size = np.count_nonzero(grown)
+        if grown_size == size:
+            return grown
+        region, size = grown, grown_size
+
+
+def _largest_component(mask: np.ndarray, max_components: int = 16) -> np.ndarray:
+    """Keep only the largest connected region of a mask (drops coordinate labels and specks)."""
+    remaining = mask.copy()
+    best, best_size = None, 0
+    for _ in range(max_components):
+        pixels = np.flatnonzero(remaining)
+        if len(pixels) == 0:
+            break
+        seed = np.zeros_like(mask)
+        seed.flat[pixels[0]] = True
+        component = _grow_region(seed, remaining)
+        remaining &= ~component
+        size = int(component.sum())
+        if size > best_size:
+            best, best_size = component, size
+    return mask if best is None else best
+
+
+def _silhouette(cell: np.ndarray) -> Tuple[Optional[np.ndarray], float, float]:
+    """
+    Separate a piece from its square.
+
+    Pixels similar to the square colour that are reachable from the cell
+    border are background; everything else (outline and interior) is the piece.
+
+    Returns:
+        (normalized silhouette or None if empty, foreground fraction,
+        share of the piece's core much darker than the square)
+    """
+    if max(cell.shape) > SEGMENT_SIZE:
+        scale = SEGMENT_SIZE / max(cell.shape)
+        size = (max(1, round(cell.shape[1] * scale)), max(1, round(cell.shape[0] * scale)))
+        cell = np.asarray(Image.fromarray(cell.astype(np.float32), mode="F").resize(size, Image.BILINEAR),
+                          dtype=np.float64)
+    height, width = cell.shape
+    margin_y, margin_x = max(1, height // 12), max(1, width // 12)
+    inner = cell[margin_y:height - margin_y, margin_x:width - margin_x]
+    border = np.concatenate([inner[0], inner[-1], inner[:, 0], inner[:, -1]])
+    background = np.median(border)
+
+    similar = np.abs(inner - background) < 0.12
+    border_seed = np.zeros_like(similar)
+    border_seed[[0, -1], :] = True
+    border_seed[:, [0, -1]] = True
+    # Close one-pixel gaps in thin outlines (downscaling opens some), so the
+    # background cannot leak into a light piece drawn on a light square
+    background_region = _grow_region(border_seed, ~_dilate(~similar))
+    piece = _largest_component(~background_region)
+
+    fraction = piece.mean()
+    if fraction < 0.04:
+        return None, fraction, 0.0
+
+    ys, xs = np.nonzero(piece)
+    crop = piece[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+    normalized = np.asarray(
+        Image.fromarray(crop.astype(np.uint8) * 255).resize((SILHOUETTE_SIZE, SILHOUETTE_SIZE), Image.BILINEAR),
+        dtype=np.float64
+    ) / 255.0
+    # Black pieces are solid dark; white ones are light or square-coloured
+    # inside a dark outline. The colour is read away from the piece edge,
+    # where anti-aliasing and the gap closing mix in the square colour.
+    core = piece & ~_dilate(background_region)
+    pixels = inner[core] if core.any() else inner[piece]
+    dark = pixels < background * 0.5
+    return normalized, fraction, float(dark.mean())
+
+
+def _font_templates() -> Dict[str, np.ndarray]:
+    """Render piece silhouettes from the first available font with chess glyphs."""
+    font_path = os.getenv("CHESS_FONT_PATH")
+    for name in ([font_path] if font_path else []) + CHESS_FONTS:
+        try:
+            font = ImageFont.truetype(name, 96)
+        except OSError:
+            continue
+        templates = {}
+        for piece, glyph in PIECE_GLYPHS.items():
+            canvas = Image.new("L", (128, 128), 255)
+            ImageDraw.Draw(canvas).text((64, 64), glyph, font=font, fill=0, anchor="mm")
+            silhouette, _, _ = _silhouette(np.asarray(canvas, dtype=np.float64) / 255.0)
+            if silhouette is None:
+                break
+            templates[piece] = [silhouette]
+        else:
+            return templates
+    return {}
+
+
+def get_piece_templates() -> Dict[str, List[np.ndarray]]:
+    """Load learned templates if present, otherwise render them from a font."""
+    global _templates
+    if _templates is None:
+        if os.path.exists(TEMPLATES_PATH):
+            stored = np.load(TEMPLATES_PATH)
+            _templates = {piece: list(stored[piece]) for piece in stored.files}
+        else:
+            _templates = _font_templates()
+    return _templates
+
+
+def _match(silhouette: np.ndarray, templates: Dict[str, List[np.ndarray]]) -> Tuple[str, float, float]:
+    """
+    Classify a silhouette by normalized correlation with the templates.
+
+    Returns:
+        (piece letter, best score, margin over the runner-up piece type)
+    """
+    def normalize(array: np.ndarray) -> np.ndarray:
+        centered = array - array.mean()
+        norm = np.linalg.norm(centered)
+        return centered / norm if norm > 0 else centered
+
+    target = normalize(silhouette).flatten()
+    scores = sorted(
+        ((max(float(target @ normalize(t).flatten()) for t in variants), piece)
+         for piece, variants in templates.items()),
+        reverse=True
+    )
+    best_score, best_piece = scores[0]
+    margin = best_score - scores[1][0] if len(scores) > 1 else best_score
+    return best_piece, best_score, margin
+
+
+def _board_squares(gray: np.ndarray, board: Optional[Tuple[int, int, float, float]] = None
+                   ) -> List[List[np.ndarray]]:
+    """Cut the located board into 8 rows of 8 square images (top row first)."""
+    left, top, square_width, square_height = board or locate_board(gray)
+    return [
+        [gray[int(round(top + r * square_height)):int(round(top + (r + 1) * square_height)),
+              int(round(left + c * square_width)):int(round(left + (c + 1) * square_width))]
+         for c in range(8)]
+        for r in range(8)
+    ]
+
+
+def _label_shape(area: np.ndarray) -> Optional[np.ndarray]:
+    """Normalized mask of the dark or light mark in a margin area, or None if the area is blank."""
+    if area.size == 0:
+        return None
+    mark = np.abs(area - np.median(area)) > 0.3
+    if np.count_nonzero(mark) < 4:
+        return None
+    ys, xs = np.nonzero(mark)
+    crop = mark[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+    shape = np.asarray(
+        Image.fromarray(crop.astype(np.uint8) * 255).resize((LABEL_SIZE, LABEL_SIZE), Image.BILINEAR),
+        dtype=np.float64
+    ) / 255.0
+    centered = shape - shape.mean()
+    norm = np.linalg.norm(centered)
+    return centered / norm if norm > 0 else None
+
+
+def _get_label_templates() -> Dict[str, np.ndarray]:
+    """Rendered shapes of the corner coordinates "1", "8", "a" and "h"."""
+    global _label_templates
+    if _label_templates is None:
+        font = None
+        for name in ["DejaVuSans.ttf", "arial.ttf", "Arial.ttf", "FreeSans.ttf"]:
+            try:
+                font = ImageFont.truetype(name, 48)
+                break
+            except OSError:
+                continue
+        font = font or ImageFont.load_default()
+        _label_templates = {}
+        for char in "18ah":
+            canvas = Image.new("L", (64, 64), 255)
+            ImageDraw.Draw(canvas).text((32, 32), char, font=font, fill=0, anchor="mm")
+            _label_templates[char] = _label_shape(np.asarray(canvas, dtype=np.float64) / 255.0)
+    return _label_templates
+
+
+def _labels_flipped(gray: np.ndarray, board: Tuple[int, int, float, float]) -> Optional[bool]:
+    """
+    Read the board orientation from rank and file labels printed beside the board.
+
+    Compares the labels at the corner squares with "1"/"8" (ranks, left or
+    right of the board) and "a"/"h" (files, below or above it).
+
+    Returns:
+        True if the diagram is drawn from Black's side, False if from White's,
+        None without readable labels
+    """
+    left, top, square_width, square_height = board
+    right, bottom = int(round(left + 8 * square_width)), int(round(top + 8 * square_height))
+    height, width = gray.shape
+    # Labels sit within about half a square of the board, clear of its border line
+    gap_x, gap_y = max(2, int(square_width * 0.08)), max(2, int(square_height * 0.08))
+    reach_x, reach_y = int(square_width * 0.6), int(square_height * 0.6)
+
+    def rows(index: int) -> slice:
+        return slice(int(round(top + index * square_height)), int(round(top + (index + 1) * square_height)))
+
+    def columns(index: int) -> slice:
+        return slice(int(round(left + index * square_width)), int(round(left + (index + 1) * square_width)))
+
+    beside = [slice(max(0, left - reach_x), max(0, left - gap_x)), slice(min(width, right + gap_x), min(width, right + reach_x))]
+    around = [slice(min(height, bottom + gap_y), min(height, bottom + reach_y)), slice(max(0, top - reach_y), max(0, top - gap_y))]
+    # Each entry: (area at the first corner, area at the second, label there when seen from White)
+    pairs = [(gray[rows(0), x], gray[rows(7), x], "8", "1") for x in beside]
+    pairs += [(gray[y, columns(0)], gray[y, columns(7)], "a", "h") for y in around]
+
+    templates = _get_label_templates()
+    evidence = 0.0
+    for first_area, second_area, first_label, second_label in pairs:
+        first, second = _label_shape(first_area), _label_shape(second_area)
+        if first is None or second is None:
+            continue
+        as_white = float(first.flatten() @ templates[first_label].flatten() + second.flatten() @ templates[second_label].flatten())
+        as_black = float(first.flatten() @ templates[second_label].flatten() + second.flatten() @ templates[first_label].flatten())
+        evidence += as_black - as_white
+    if abs(evidence) < MIN_LABEL_EVIDENCE:
+        return None
+    return evidence > 0
+
+
+def _load_gray(image) -> np.ndarray:
+    with Image.open(image) as img:
+        return np.asarray(img.convert("L"), dtype=np.float64) / 255.0
+
+
+def _placement_to_fen(board: List[List[Optional[str]]]) -> str:
+    """Convert an 8x8 grid of piece letters (None = empty) to FEN piece placement."""
+    rows = []
+    for row in board:
+        fen_row, empty = "", 0
+        for piece in row:
+            if piece is None:
+                empty += 1
+            else:
+                fen_row += (str(empty) if empty else "") + piece
+                empty = 0
+        rows.append(fen_row + (str(empty) if empty else ""))
+    return "/".join(rows)
+
+
+def _castling_rights(board: List[List[Optional[str]]]) -> str:
+    """Castling rights consistent with kings and rooks on their home squares."""
+    rights = ""
+    if board[7][4] == "K":
+        rights += ("K" if board[7][7] == "R" else "") + ("Q" if board[7][0] == "R" else "")
+    if board[0][4] == "k":
+        rights += ("k" if board[0][7] == "r" else "") + ("q" if board[0][0] == "r" else "")
+    return rights or "-"
+
+
+def recognize_chess_board(image_path: str, turn: str = "w",
+                          flipped: Optional[bool] = None) -> Tuple[Optional[str], float]:
+    """
+    Recognize a chess diagram and return its FEN without calling any model.
+
+    The 8x8 grid is found from the periodic square edges, each square's piece
+    is separated from the square colour, its colour is read from how much of
+    it is much darker than the square, and its type is matched against piece
+    templates. The orientation comes from flipped when given, otherwise from
+    the coordinate labels beside the board; without labels, White is assumed
+    to be at the bottom.
+
+    Args:
+        image_path: Path to the board image, or a file object with its bytes
+        turn: Side to move, "w" or "b" (cannot be read from a diagram)
+        flipped: True if the diagram is drawn from Black's side (rank 1 at the top),
+                 False if from White's, None to read it from the labels
+
+    Returns:
+        (FEN or None, confidence between 0 and 1)
+    """
+    templates = get_piece_templates()
+    if not templates:
+        return None, 0.0
+
+    gray = _load_gray(image_path)
+    location = locate_board(gray)
+    board = []
+    confidences = []
+    for row in _board_squares(gray, location):
+        board_row = []
+        for cell in row:
+            if cell.size == 0:
+                return None, 0.0
+            silhouette, fraction, dark = _silhouette(cell)
+            if silhouette is None:
+                board_row.append(None)
+                # Near the emptiness threshold the square is ambiguous
+                confidences.append(min(1.0, abs(0.04 - fraction) / 0.03))
+                continue
+            piece, score, margin = _match(silhouette, templates)
+            board_row.append(piece if dark > BLACK_PIECE_THRESHOLD else piece.upper())
+            colour_confidence = min(1.0, abs(dark - BLACK_PIECE_THRESHOLD) / COLOUR_MARGIN)
+            confidences.append(
+                max(0.0, min(1.0, score)) * min(1.0, 0.5 + margin * 5) * colour_confidence
+            )
+        board.append(board_row)
+
+    if flipped is None:
+        flipped = bool(_labels_flipped(gray, location))
+    if flipped:
+        board = [row[::-1] for row in board[::-1]]
+
+    confidence = float(np.mean(confidences)) * (min(confidences) ** 0.25)
+    placement = _placement_to_fen(board)
+    # Impossible positions are not trusted
+    if (placement.count("K") != 1 or placement.count("k") != 1
+            or any(p in "Pp" for p in (board[0] + board[7]) if p)):
+        confidence *= 0.5
+
+    fen = f"{placement} {turn} {_castling_rights(board)} - 0 1"
+    return fen, confidence
+
+
+def learn_piece_templates(image_path: str, fen: str):
+    """
+    Add piece templates from a diagram with a known position.
+
+    Run once on an image in the style you expect (e.g. a screenshot from the
+    same site) to make recognition of that style near-exact. Templates are
+    saved to data/chess_templates.npz.
+
+    Args:
+        image_path: Path to the board image (White at the bottom)
+        fen: FEN of the position shown
+    """
+    global _templates
+    rows = []
+    for fen_row in fen.split()[0].split("/"):
+        row = []
+        for char in fen_row:
+            row.extend([None] * int(char) if char.isdigit() else [char.lower()])
+        rows.append(row)
+
+    learned = {piece: list(variants) for piece, variants in get_piece_templates().items()} \
+        if os.path.exists(TEMPLATES_PATH) else {}
+    for cells, pieces in zip(_board_squares(_load_gray(image_path)), rows):
+        for cell, piece in zip(cells, pieces):
+            if piece is None:
+                continue
+            silhouette, _, _ = _silhouette(cell)
+            if silhouette is not None:
+                learned.setdefault(piece, []).append(silhouette)
+
+    os.makedirs(os.path.dirname(TEMPLATES_PATH), exist_ok=True)
+    np.savez_compressed(TEMPLATES_PATH, **{piece: np.stack(v) for piece, v in learned.items()})
+    _templates = learned
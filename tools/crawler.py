@@ -0,0 +1,194 @@
+"""Bounded-concurrency crawler over linked pages, built on the shared page cache."""
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urldefrag, urlparse
+from langchain_core.tools import tool
+
+from tools.document_cache import get_document, get_cached_document, best_passages, ParsedDocument
+from tools.text_retrieval import CHARS_PER_TOKEN
+
+
+# Pages fetched at the same time, across all hosts
+MAX_WORKERS = 8
+
+# Politeness: concurrent requests and minimum seconds between request starts, per host
+PER_HOST_CONCURRENCY = 2
+PER_HOST_DELAY = 0.5
+
+# Hard limit on pages per crawl, whatever the caller asks for
+MAX_PAGES_LIMIT = 50
+
+# Characters of each page shown in a digest
+DIGEST_CHARS = 600
+
+# Links to files the document tools cannot read
+SKIPPED_EXTENSIONS = re.compile(r"\.(jpe?g|png|gif|svg|webp|mp3|mp4|zip|gz|exe|css|js)$", re.IGNORECASE)
+
+
+class HostLimiter:
+    """Per-host concurrency and request spacing shared by the crawl workers."""
+
+    def __init__(self, concurrency: int = PER_HOST_CONCURRENCY, delay: float = PER_HOST_DELAY):
+        self.concurrency = concurrency
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    def fetch(self, url: str) -> ParsedDocument:
+        """Get a parsed page, waiting for a free slot on its host unless the page is cached."""
+        # Cached pages cost the host nothing, so they skip the slot and the delay
+        document = get_cached_document(url)
+        if document is not None:
+            return document
+
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.Semaphore(self.concurrency))
+        with semaphore:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, now))
+                self._next_start[host] = start + self.delay
+            if start > now:
+                time.sleep(start - now)
+            return get_document(url)
+
+
+def _compile_filter(link_filter: Optional[str]) -> Optional[re.Pattern]:
+    """Compile a link filter as a regex, or as plain text if it is not a valid regex."""
+    if not link_filter:
+        return None
+    try:
+        return re.compile(link_filter, re.IGNORECASE)
+    except re.error:
+        return re.compile(re.escape(link_filter), re.IGNORECASE)
+
+
+def _page_links(document: ParsedDocument, pattern: Optional[re.Pattern], same_domain: bool) -> List[str]:
+    """Links of a page that pass the filters."""
+    seed_host = urlparse(document.url).netloc
+    links = []
+    # Page links are already absolute, fragment-free and deduplicated
+    for text, url in document.links:
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or SKIPPED_EXTENSIONS.search(parsed.path):
+            continue
+        if same_domain and parsed.netloc != seed_host:
+            continue
+        if pattern and not (pattern.search(url) or pattern.search(text)):
+            continue
+        links.append(url)
+    return links
+
+
+def crawl(seed_url: str, link_filter: Optional[str] = None, max_depth: int = 1, max_pages: int = 10,
+          same_domain: bool = True) -> Tuple[List[ParsedDocument], List[str]]:
+    """
+    Breadth-first crawl from a seed page.
+
+    Each depth level is fetched concurrently (MAX_WORKERS overall, with
+    per-host limits); pages come from the shared document cache, so pages
+    already read by other tools cost nothing.
+
+    Args:
+        seed_url: Page to start from
+        link_filter: Regex (or plain text) a link's URL or text must match to be followed
+        max_depth: How many links away from the seed to go
+        max_pages: Maximum number of pages fetched, including the seed
+        same_domain: Only follow links on the seed's host
+
+    Returns:
+        (pages in crawl order, error messages for pages that failed)
+    """
+    max_pages = max(1, min(max_pages, MAX_PAGES_LIMIT))
+    pattern = _compile_filter(link_filter)
+    limiter = HostLimiter()
+    seen = {urldefrag(seed_url)[0]}
+    frontier = [seed_url]
+    pages, errors = [], []
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for depth in range(max_depth + 1):
+            frontier = frontier[:max_pages - len(pages)]
+            if not frontier:
+                break
+
+            def fetch(url: str):
+                try:
+                    return limiter.fetch(url)
+                except Exception as e:
+                    errors.append(f"{url}: {str(e)}")
+                    return None
+
+            next_frontier = []
+            for document in executor.map(fetch, frontier):
+                if document is None:
+                    continue
+                pages.append(document)
+                if depth == max_depth:
+                    continue
+                for link in _page_links(document, pattern, same_domain):
+                    if link not in seen:
+                        seen.add(link)
+                        next_frontier.append(link)
+            frontier = next_frontier
+
+    return pages, errors
+
+
+@tool
+def crawl_pages(seed_url: str, link_filter: Optional[str] = None, max_depth: int = 1,
+                max_pages: int = 10, query: Optional[str] = None, top_k: int = 8,
+                max_tokens: int = 3000) -> str:
+    """
+    Read a page and the pages it links to in one step, e.g. a discography page and its album pages.
+    Use this instead of calling extract_links and read_url on each page one by one.
+
+    Args:
+        seed_url: URL of the starting page
+        link_filter: Only follow links whose URL or text matches this (regex or plain text, e.g. "/wiki/.*album")
+        max_depth: How many links deep to follow (default: 1 = the seed and the pages it links to)
+        max_pages: Maximum number of pages to read, including the seed (default: 10, at most 50)
+        query: Optional question or keywords; returns the best matching passages across all pages
+        top_k: Maximum number of passages returned for a query (default: 8)
+        max_tokens: Approximate token budget for the output (default: 3000)
+
+    Returns:
+        Top passages across all pages for the query, or a short digest of every page
+    """
+    try:
+        pages, errors = crawl(seed_url, link_filter, max_depth, max_pages)
+        if not pages:
+            return f"Error crawling {seed_url}: " + ("; ".join(errors) or "no pages fetched")
+
+        budget = max_tokens * CHARS_PER_TOKEN
+        parts = []
+        if query:
+            for rank, (document, heading, text) in enumerate(best_passages(pages, query, top_k), 1):
+                if len(text) > budget:
+                    if parts:
+                        break
+                    text = text[:budget] + " [...]"
+                parts.append(f"{rank}. {document.title or document.url} [{heading}] ({document.url})\n{text}")
+                budget -= len(text)
+            if not parts:
+                parts.append(f"No passages matching '{query}' found")
+        else:
+            per_page = max(200, min(DIGEST_CHARS, budget // len(pages)))
+            for i, document in enumerate(pages, 1):
+                text = document.text[:per_page]
+                if len(document.text) > per_page:
+                    text += " [...]"
+                parts.append(f"{i}. {document.title or document.url} ({document.url})\n{text}")
+
+        result = f"Crawled {len(pages)} page(s) from {seed_url}"
+        if errors:
+            result += f" ({len(errors)} failed)"
+        return result + ":\n\n" + "\n\n".join(parts)
+
+    except Exception as e:
+        return f"Error crawling {seed_url}: {str(e)}"
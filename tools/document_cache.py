@@ -0,0 +1,398 @@
+"""Parsed-document cache shared by the document tools: each fetched page is parsed once."""
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from urllib.parse import urljoin
+
+from tools.cache_utils import content_hash
+from tools.http_client import fetch, get_response_cache, CachedResponse
+from tools.text_retrieval import BM25Index, split_passages
+from tools.link_extractor import HIDDEN_TAGS, extract_anchor_links, resolve_links
+
+
+# Number of parsed pages kept in memory
+MAX_DOCUMENTS = 32
+
+# Parsed pages are reused without consulting the HTTP cache for this long (seconds)
+FRESH_SECONDS = 60
+
+# Elements whose text is never content
+NON_CONTENT_TAGS = ("script", "style") + HIDDEN_TAGS
+
+# Page chrome left out of the readable text (still searched and scanned for links)
+BOILERPLATE_TAGS = ("nav", "footer", "header")
+
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+
+
+class ParsedDocument:
+    """
+    Everything the document tools need from one page, extracted in a single parse.
+
+    Attributes:
+        url: URL the page was fetched from
+        html: Decoded page source (empty for non-HTML documents)
+        title: Page title
+        text: Readable text, one text block per line, without navigation, header and footer
+        search_text: All visible text on one line, including page chrome
+        links: (link text, absolute URL) pairs in document order, deduplicated (see resolve_links)
+        headings: (level, heading text) pairs in document order
+        tables: Tables as lists of rows of cell texts
+        sections: (heading path, section text) pairs splitting the readable text at headings
+        kind: Document type: "html", "pdf", "docx", "json" or "text"
+    """
+
+    def __init__(self, url: str, html: str, title: str, text: str, search_text: str,
+                 links: List[Tuple[str, str]], headings: List[Tuple[int, str]],
+                 tables: List[List[List[str]]], sections: List[Tuple[str, str]],
+                 kind: str = "html", pages: Optional[List[str]] = None):
+        self.url = url
+        self.html = html
+        self.title = title
+        self._text = text
+        self._search_text = search_text
+        self.links = links
+        self.headings = headings
+        self.tables = tables
+        self._sections = sections
+        self.kind = kind
+        self._pages = pages
+        self._passage_index = None
+        self._dataframes = None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @property
+    def search_text(self) -> str:
+        return self._search_text
+
+    @property
+    def sections(self) -> List[Tuple[str, str]]:
+        return self._sections
+
+    @property
+    def page_count(self) -> int:
+        """Number of pages (1 for documents without pages, such as web pages)."""
+        return len(self._pages) if self._pages else 1
+
+    def page_text(self, page: int) -> str:
+        """Text of one page, numbered from 1."""
+        if not 1 <= page <= self.page_count:
+            raise IndexError(f"Page {page} out of range (document has {self.page_count} pages)")
+        return self._pages[page - 1] if self._pages else self.text
+
+    def passage_index(self) -> Tuple[List[Tuple[str, str]], BM25Index]:
+        """
+        BM25 index over the page's passages, built on first use and kept with the document.
+
+        Sections are split into passages of at most MAX_PASSAGE_CHARS; each
+        passage is indexed together with its section heading.
+
+        Returns:
+            ((heading, passage text) list, index over it)
+        """
+        if self._passage_index is None:
+            passages = [
+                (heading, passage)
+                for heading, section_text in self.sections
+                for passage in split_passages(section_text)
+            ]
+            index = BM25Index([f"{heading}\n{passage}" for heading, passage in passages])
+            self._passage_index = (passages, index)
+        return self._passage_index
+
+    def dataframes(self) -> list:
+        """The page's tables as pandas DataFrames, parsed on first use and kept with the document."""
+        if self._dataframes is None:
+            from tools.web_tables import parse_html_tables, tables_from_rows
+            self._dataframes = parse_html_tables(self.html) if self.html else tables_from_rows(self.tables)
+        return self._dataframes
+
+
+def _clean_lines(texts) -> List[str]:
+    return [line for line in (t.strip() for t in texts) if line]
+
+
+def _text_blocks(root) -> List[Tuple[int, str]]:
+    """
+    Text of an element tree in document order, one block per text node.
+
+    Headings are returned whole as a single block.
+
+    Returns:
+        (heading level, or 0 for body text, stripped text) pairs
+    """
+    from lxml import etree
+
+    blocks = []
+    walker = etree.iterwalk(root, events=("start", "end"))
+    for event, element in walker:
+        is_element = isinstance(element.tag, str)
+        if event == "start":
+            if is_element and element.tag in HEADING_TAGS:
+                text = " ".join(element.text_content().split())
+                if text:
+                    blocks.append((int(element.tag[1]), text))
+                walker.skip_subtree()
+            elif is_element and element.text and element.text.strip():
+                blocks.append((0, element.text.strip()))
+        elif element is not root and element.tail and element.tail.strip():
+            blocks.append((0, element.tail.strip()))
+    return blocks
+
+
+def best_passages(documents: List[ParsedDocument], query: str,
+                  top_k: int) -> List[Tuple[ParsedDocument, str, str]]:
+    """
+    Rank the passages of several documents together against a query.
+
+    Returns:
+        Up to top_k (document, heading, passage text) triples, best first
+    """
+    # One index over the passages of every document
+    passages = [
+        (document, heading, text)
+        for document in documents
+        for heading, text in document.passage_index()[0]
+    ]
+    index = BM25Index([f"{heading}\n{text}" for _, heading, text in passages])
+    return [passages[passage_id] for passage_id, _ in index.search(query, top_k)]
+
+
+def split_sections(blocks: List[Tuple[int, str]], title: str) -> List[Tuple[str, str]]:
+    """
+    Group text blocks into sections at headings.
+
+    Each section is labelled with its heading path (e.g. "Discography > Studio albums");
+    text before the first heading goes under the page title.
+    """
+    sections, path, lines = [], [], []
+
+    def label() -> str:
+        return " > ".join(text for _, text in path) or title
+
+    for level, text in blocks:
+        if level:
+            if lines:
+                sections.append((label(), "\n".join(lines)))
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, text))
+            lines = []
+        else:
+            lines.append(text)
+    if lines:
+        sections.append((label(), "\n".join(lines)))
+    return sections
+
+
+def parse_document(url: str, response: CachedResponse) -> ParsedDocument:
+    """
+    Parse a fetched document, dispatching on its content type.
+
+    PDF, DOCX, JSON and plain text are handled by tools.document_formats;
+    everything else is parsed as HTML.
+
+    Args:
+        url: URL the response belongs to
+        response: Fetched response
+
+    Returns:
+        The parsed document
+    """
+    from tools import document_formats
+
+    kind = document_formats.detect_kind(url, response)
+    if kind == "pdf":
+        return document_formats.PdfDocument(url, response.content)
+    if kind == "docx":
+        return document_formats.parse_docx(url, response.content)
+    if kind == "json":
+        return document_formats.parse_json(url, response.text)
+    if kind == "text":
+        return document_formats.parse_text(url, response.text)
+    return parse_html(url, response)
+
+
+def parse_html(url: str, response: CachedResponse) -> ParsedDocument:
+    """
+    Parse an HTML response with lxml and extract text, links, headings and tables.
+
+    Args:
+        url: URL the response belongs to
+        response: Fetched response
+
+    Returns:
+        The parsed document
+    """
+    import lxml.html
+    from lxml import etree
+
+    html = response.text
+    if not response.content.strip():
+        return ParsedDocument(url, html, "", "", "", [], [], [], [])
+
+    # Use the charset from the HTTP headers when given; otherwise lxml reads <meta charset>
+    match = re.search(r'charset=([\w-]+)', response.headers.get("Content-Type", ""), re.IGNORECASE)
+    parser = lxml.html.HTMLParser(encoding=match.group(1)) if match else None
+    try:
+        root = lxml.html.document_fromstring(response.content, parser=parser)
+    except (etree.ParserError, LookupError):
+        root = lxml.html.document_fromstring(response.content)
+
+    for element in root.xpath("|".join(f"//{tag}" for tag in NON_CONTENT_TAGS)):
+        element.drop_tree()
+
+    title = (root.findtext(".//title") or "").strip()
+    base_href = root.xpath("string(//base/@href)").strip()
+    links = resolve_links(
+        ((" ".join(a.text_content().split()), a.get("href")) for a in root.xpath("//a[@href]")),
+        urljoin(response.url or url, base_href) if base_href else (response.url or url)
+    )
+    headings = [
+        (int(h.tag[1]), h.text_content().strip())
+        for h in root.xpath("|".join(f"//{tag}" for tag in HEADING_TAGS)) if h.text_content().strip()
+    ]
+    tables = []
+    for table in root.xpath("//table"):
+        rows = []
+        for tr in table.xpath(".//tr"):
+            cells = [" ".join(cell.text_content().split()) for cell in tr.xpath("./th|./td")]
+            if cells:
+                rows.append(cells)
+        if rows:
+            tables.append(rows)
+
+    body = root.find("body")
+    if body is None:
+        body = root
+    search_text = " ".join(_clean_lines(body.itertext()))
+
+    for element in body.xpath("|".join(f".//{tag}" for tag in BOILERPLATE_TAGS)):
+        element.drop_tree()
+    blocks = _text_blocks(body)
+    text = "\n".join(text for _, text in blocks)
+    sections = split_sections(blocks, title)
+
+    return ParsedDocument(url, html, title, text, search_text, links, headings, tables, sections)
+
+
+class DocumentCache:
+    """
+    In-memory LRU of parsed pages, keyed by URL.
+
+    A page requested again within FRESH_SECONDS is returned as-is. After that
+    it goes through the HTTP response cache, and is only re-parsed if the body
+    actually changed.
+    """
+
+    def __init__(self, max_documents: int = MAX_DOCUMENTS):
+        self.max_documents = max_documents
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> ParsedDocument:
+        """
+        Get the parsed document for a URL, fetching and parsing only when needed.
+
+        Raises:
+            requests.exceptions.RequestException: On network errors and HTTP error statuses
+        """
+        with self._lock:
+            entry = self._documents.get(url)
+            if entry is not None:
+                self._documents.move_to_end(url)
+                if time.time() < entry["fresh_until"]:
+                    return entry["document"]
+
+        return self._store(url, fetch(url), entry)
+
+    def get_cached(self, url: str) -> Optional[ParsedDocument]:
+        """
+        Get the parsed document for a URL if it can be had without a network request.
+
+        Returns:
+            The document when it is current here or fresh in the HTTP response cache, otherwise None
+        """
+        with self._lock:
+            entry = self._documents.get(url)
+            if entry is not None:
+                self._documents.move_to_end(url)
+                if time.time() < entry["fresh_until"]:
+                    return entry["document"]
+
+        cached = get_response_cache().get(url)
+        if cached is None or not cached[1]:
+            return None
+        return self._store(url, cached[0], entry)
+
+    def _store(self, url: str, response: CachedResponse, entry: Optional[dict]) -> ParsedDocument:
+        """Parse a response (unless the body is unchanged since the previous entry) and cache it."""
+        body_hash = content_hash(response.content)
+        if entry is not None and entry["body_hash"] == body_hash:
+            document = entry["document"]
+        else:
+            document = parse_document(url, response)
+
+        with self._lock:
+            self._documents[url] = {
+                "document": document,
+                "body_hash": body_hash,
+                "fresh_until": time.time() + FRESH_SECONDS,
+            }
+            self._documents.move_to_end(url)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+        return document
+
+
+    def get_links(self, url: str) -> List[Tuple[str, str]]:
+        """
+        Get a page's links without parsing the whole page when it is not cached yet.
+
+        Uses the parsed document if there is a current one; otherwise HTML is
+        stream-parsed for anchors only (and not added to the cache).
+        """
+        with self._lock:
+            entry = self._documents.get(url)
+            if entry is not None and time.time() < entry["fresh_until"]:
+                return entry["document"].links
+
+        response = fetch(url)
+        if entry is not None and entry["body_hash"] == content_hash(response.content):
+            return entry["document"].links
+
+        from tools.document_formats import detect_kind
+        if detect_kind(url, response) != "html":
+            return self.get(url).links
+        match = re.search(r'charset=([\w-]+)', response.headers.get("Content-Type", ""), re.IGNORECASE)
+        return extract_anchor_links(response.content, response.url or url, match.group(1) if match else None)
+
+
+_document_cache = None
+
+
+def _get_document_cache() -> DocumentCache:
+    global _document_cache
+    if _document_cache is None:
+        _document_cache = DocumentCache()
+    return _document_cache
+
+
+def get_document(url: str) -> ParsedDocument:
+    """Get a parsed page from the process-wide document cache."""
+    return _get_document_cache().get(url)
+
+
+def get_cached_document(url: str) -> Optional[ParsedDocument]:
+    """Get a parsed page only if it is cached, without touching the network."""
+    return _get_document_cache().get_cached(url)
+
+
+def get_links(url: str) -> List[Tuple[str, str]]:
+    """Get a page's resolved links, stream-parsing only anchors if the page is not parsed yet."""
+    return _get_document_cache().get_links(url)
@@ -0,0 +1,196 @@
+"""Readers for non-HTML documents: PDF (lazy, page by page), DOCX, JSON and plain text."""
+import io
+import re
+import json
+import zipfile
+import threading
+from typing import Dict, List, Tuple
+
+from tools.document_cache import ParsedDocument, split_sections
+from tools.http_client import CachedResponse
+
+
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+TEXT_CONTENT_TYPES = ("text/plain", "text/csv", "text/markdown", "text/x-markdown", "text/tab-separated-values")
+
+WORD_NAMESPACE = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def detect_kind(url: str, response: CachedResponse) -> str:
+    """
+    Decide how to read a document from its content type, magic bytes and URL.
+
+    Returns:
+        "pdf", "docx", "json", "text" or "html"
+    """
+    content_type = response.content_type
+    path = url.split("?")[0].split("#")[0].lower()
+    head = response.content[:8]
+
+    if head.startswith(b"%PDF") or content_type == "application/pdf":
+        return "pdf"
+    if content_type == DOCX_CONTENT_TYPE or (head.startswith(b"PK") and path.endswith(".docx")):
+        return "docx"
+    if content_type == "application/json" or content_type.endswith("+json") or path.endswith(".json"):
+        return "json"
+    if content_type in TEXT_CONTENT_TYPES or (
+            not content_type.endswith("html") and path.endswith((".txt", ".md", ".csv", ".tsv"))):
+        return "text"
+    return "html"
+
+
+class PdfDocument(ParsedDocument):
+    """
+    A PDF whose pages are extracted lazily.
+
+    Opening the file only reads its cross-reference table and page tree
+    (kept with the cached document); each page's text is extracted the first
+    time it is requested and then kept too. The full text, needed for search
+    and retrieval, is assembled from the pages on first use.
+    """
+
+    def __init__(self, url: str, data: bytes):
+        from pypdf import PdfReader
+
+        self._reader = PdfReader(io.BytesIO(data))
+        self._page_texts: Dict[int, str] = {}
+        self._page_lock = threading.Lock()
+
+        title = ""
+        try:
+            metadata = self._reader.metadata
+            title = (metadata.title or "").strip() if metadata else ""
+        except Exception:
+            pass
+        super().__init__(url, "", title or url.rstrip("/").split("/")[-1], None, None,
+                         [], [], [], None, kind="pdf")
+
+    @property
+    def page_count(self) -> int:
+        return len(self._reader.pages)
+
+    def page_text(self, page: int) -> str:
+        if not 1 <= page <= self.page_count:
+            raise IndexError(f"Page {page} out of range (document has {self.page_count} pages)")
+        with self._page_lock:
+            if page not in self._page_texts:
+                text = self._reader.pages[page - 1].extract_text() or ""
+                self._page_texts[page] = "\n".join(line.strip() for line in text.splitlines() if line.strip())
+            return self._page_texts[page]
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "\n".join(self.page_text(page) for page in range(1, self.page_count + 1))
+        return self._text
+
+    @property
+    def search_text(self) -> str:
+        if self._search_text is None:
+            self._search_text = " ".join(self.text.split("\n"))
+        return self._search_text
+
+    @property
+    def sections(self) -> List[Tuple[str, str]]:
+        if self._sections is None:
+            self._sections = [
+                (f"Page {page}", self.page_text(page))
+                for page in range(1, self.page_count + 1) if self.page_text(page)
+            ]
+        return self._sections
+
+
+def parse_docx(url: str, data: bytes) -> ParsedDocument:
+    """
+    Read a DOCX file straight from its XML, without python-docx.
+
+    Headings come from the Heading N paragraph styles, tables from w:tbl,
+    and pages from explicit or last-rendered page breaks (a file without
+    breaks is read as a single unpaged document).
+    """
+    from lxml import etree
+
+    w = f"{{{WORD_NAMESPACE}}}"
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        root = etree.fromstring(archive.read("word/document.xml"))
+        title = ""
+        if "docProps/core.xml" in archive.namelist():
+            core = etree.fromstring(archive.read("docProps/core.xml"))
+            title = (core.findtext("{http://purl.org/dc/elements/1.1/}title") or "").strip()
+
+    blocks, tables, headings = [], [], []
+    pages, page_paragraphs, has_breaks = [], [], False
+    body = root.find(f"{w}body")
+    for element in (body if body is not None else []):
+        if element.tag == f"{w}tbl":
+            rows = []
+            for tr in element.iter(f"{w}tr"):
+                cells = [" ".join("".join(t.text or "" for t in tc.iter(f"{w}t")).split())
+                         for tc in tr.findall(f"{w}tc")]
+                rows.append(cells)
+            if rows:
+                tables.append(rows)
+                page_paragraphs.extend(" | ".join(row) for row in rows)
+                blocks.extend((0, " | ".join(row)) for row in rows)
+            continue
+        if element.tag != f"{w}p":
+            continue
+
+        if (element.find(f".//{w}br[@{w}type='page']") is not None
+                or element.find(f".//{w}lastRenderedPageBreak") is not None):
+            has_breaks = True
+            if page_paragraphs:
+                pages.append("\n".join(page_paragraphs))
+                page_paragraphs = []
+
+        text = "".join(t.text or "" for t in element.iter(f"{w}t")).strip()
+        if not text:
+            continue
+        style = element.find(f"{w}pPr/{w}pStyle")
+        style_name = style.get(f"{w}val", "") if style is not None else ""
+        match = re.match(r"(?i)heading\s*(\d)", style_name)
+        level = int(match.group(1)) if match else (1 if style_name.lower() == "title" else 0)
+        if level:
+            headings.append((level, text))
+        blocks.append((level, text))
+        page_paragraphs.append(text)
+    if page_paragraphs:
+        pages.append("\n".join(page_paragraphs))
+    if not has_breaks:
+        pages = None
+
+    text = "\n".join(text for _, text in blocks)
+    title = title or url.rstrip("/").split("/")[-1]
+    return ParsedDocument(url, "", title, text, " ".join(text.split("\n")), [], headings, tables,
+                          split_sections(blocks, title), kind="docx", pages=pages)
+
+
+def parse_json(url: str, raw: str) -> ParsedDocument:
+    """Pretty-print a JSON document so it reads and searches like text."""
+    try:
+        text = json.dumps(json.loads(raw), indent=2, ensure_ascii=False)
+    except ValueError:
+        text = raw
+    return parse_text(url, text, kind="json")
+
+
+def parse_text(url: str, raw: str, kind: str = "text") -> ParsedDocument:
+    """Read a plain-text document; Markdown-style "#" headings start sections."""
+    lines = [line.rstrip() for line in raw.splitlines()]
+    blocks, headings = [], []
+    for line in lines:
+        if not line.strip():
+            continue
+        match = re.match(r"^(#{1,6})\s+(.+)$", line) if kind == "text" else None
+        if match:
+            heading = (len(match.group(1)), match.group(2).strip())
+            headings.append(heading)
+            blocks.append(heading)
+        else:
+            blocks.append((0, line))
+
+    text = "\n".join(text for _, text in blocks)
+    title = url.rstrip("/").split("/")[-1]
+    return ParsedDocument(url, "", title, text, " ".join(text.split()), [], headings, [],
+                          split_sections(blocks, title), kind=kind)
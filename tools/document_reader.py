@@ -1,54 +1,69 @@
 """Document and URL reading tools."""
+import re
+from collections import Counter
 import requests
 from bs4 import BeautifulSoup
 from langchain_core.tools import tool
-from typing import Optional
+from typing import List, Optional
+
+from tools.document_cache import get_document, get_links, ParsedDocument
+from tools.link_extractor import filter_links
+from tools.text_retrieval import CHARS_PER_TOKEN
+from tools.text_search import find_matches, context_windows
 
 
 @tool
-def read_url(url: str, extract_text_only: bool = True) -> str:
+def read_url(url: str, extract_text_only: bool = True, query: Optional[str] = None,
+             top_k: int = 5, max_tokens: int = 2500, pages: Optional[str] = None) -> str:
     """
-    Read and extract content from a URL.
+    Read and extract content from a URL (web page, PDF, DOCX, JSON or plain text).
+    
+    For long pages, pass a query to get only the most relevant passages
+    instead of the first 10,000 characters. Follow-up queries on the same
+    page reuse its index. For PDFs and other paged documents, pass pages to
+    read specific pages without extracting the rest.
     
     Args:
         url: The URL to read
         extract_text_only: If True, extracts only text content. If False, includes some HTML structure.
+        query: Optional question or keywords; returns the best matching passages of the page
+        top_k: Maximum number of passages returned for a query (default: 5)
+        max_tokens: Approximate token budget for the returned passages (default: 2500)
+        pages: Optional page numbers or ranges to read, e.g. "3", "2-5" or "1,4-6"
     
     Returns:
         The extracted content from the URL
     """
     try:
-        # Send GET request
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        # Parse HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.decompose()
-        
-        if extract_text_only:
-            # Get text content
-            text = soup.get_text(separator='\n', strip=True)
-            
-            # Clean up excessive whitespace
-            lines = [line.strip() for line in text.splitlines() if line.strip()]
-            text = '\n'.join(lines)
+        # Fetched through the shared HTTP cache and parsed once for all document tools
+        document = get_document(url)
+        
+        if query:
+            return retrieve_passages(document, query, top_k, max_tokens)
+        
+        if pages:
+            return read_pages(document, parse_page_ranges(pages, document.page_count))
+        
+        # Limit length to avoid token overflow
+        max_chars = 10000
+        
+        if document.page_count > 1:
+            # Only extract as many pages as fit
+            return read_pages(document, range(1, document.page_count + 1), max_chars)
+        
+        if extract_text_only or not document.html:
+            text = document.text
             
-            # Limit length to avoid token overflow
-            max_chars = 10000
             if len(text) > max_chars:
                 text = text[:max_chars] + f"\n\n[Content truncated - {len(text)} total characters]"
             
             return f"Content from {url}:\n\n{text}"
         else:
             # Return formatted HTML
-            return f"Content from {url}:\n\n{soup.prettify()[:10000]}"
+            soup = BeautifulSoup(document.html, 'lxml')
+            for script in soup(["script", "style", "nav", "footer", "header"]):
+                script.decompose()
+            return f"Content from {url}:\n\n{soup.prettify()[:max_chars]}"
         
     except requests.exceptions.Timeout:
         return f"Error: Request to {url} timed out after 10 seconds"
@@ -58,124 +73,183 @@ def read_url(url: str, extract_text_only: bool = True) -> str:
         return f"Error processing URL {url}: {str(e)}"
 
 
+def parse_page_ranges(spec: str, page_count: int) -> List[int]:
+    """
+    Parse a page selection such as "3", "2-5" or "1,4-6" (1-based, inclusive).
+    
+    Raises:
+        ValueError: If the selection is malformed or outside the document
+    """
+    selected = []
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        first = int(start) if start else 1
+        last = int(end) if end else (page_count if _ else first)
+        if first < 1 or last > page_count or first > last:
+            raise ValueError(f"Invalid page range '{part}' (document has {page_count} pages)")
+        selected.extend(page for page in range(first, last + 1) if page not in selected)
+    if not selected:
+        raise ValueError(f"No pages selected in '{spec}'")
+    return selected
+
+
+def read_pages(document: ParsedDocument, pages, max_chars: Optional[int] = None) -> str:
+    """
+    Format the text of selected pages, extracting only the pages shown.
+    
+    If max_chars is given, stops at the first page that does not fit and
+    says which pages remain.
+    """
+    parts, used, shown = [], 0, []
+    for page in pages:
+        text = document.page_text(page)
+        if max_chars is not None and shown and used + len(text) > max_chars:
+            break
+        if max_chars is not None and len(text) > max_chars:
+            text = text[:max_chars] + " [...]"
+        parts.append(f"--- Page {page} ---\n{text}")
+        used += len(text)
+        shown.append(page)
+    
+    result = f"Content from {document.url} (pages {_format_pages(shown)} of {document.page_count}):\n\n"
+    result += "\n\n".join(parts)
+    if max_chars is not None and len(shown) < len(pages):
+        result += f"\n\n[Document has {document.page_count} pages - use pages=\"{shown[-1] + 1}-{document.page_count}\" to read more, or a query to find passages]"
+    return result
+
+
+def _format_pages(pages: List[int]) -> str:
+    """Compact page list, e.g. [1, 2, 3, 5] -> "1-3, 5"."""
+    ranges = []
+    for page in pages:
+        if ranges and page == ranges[-1][1] + 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def retrieve_passages(document: ParsedDocument, query: str, top_k: int = 5, max_tokens: int = 2500) -> str:
+    """
+    Format the passages of a page that best match a query, within a token budget.
+    
+    Passages are section chunks ranked with BM25; the index is kept with the
+    parsed document.
+    """
+    passages, index = document.passage_index()
+    ranked = index.search(query, top_k)
+    if not ranked:
+        return f"No passages matching '{query}' found in {document.url}"
+    
+    budget = max_tokens * CHARS_PER_TOKEN
+    parts = []
+    for rank, (passage_id, score) in enumerate(ranked, 1):
+        heading, text = passages[passage_id]
+        # The best passage is always returned, cut to the budget if needed
+        if len(text) > budget:
+            if parts:
+                break
+            text = text[:budget] + " [...]"
+        parts.append(f"{rank}. [{heading}] (score {score:.2f})\n{text}")
+        budget -= len(text)
+    
+    result = f"Top {len(parts)} of {len(index)} passages from {document.url} for '{query}':\n\n"
+    return result + "\n\n".join(parts)
+
+
 @tool
-def extract_links(url: str, filter_text: Optional[str] = None) -> str:
+def extract_links(url: str, filter_text: Optional[str] = None, domain: Optional[str] = None,
+                  pattern: Optional[str] = None, max_links: int = 50) -> str:
     """
     Extract all links from a webpage.
     
     Args:
         url: The URL to extract links from
         filter_text: Optional text to filter links (only return links containing this text)
+        domain: Optional domain; only links to it or its subdomains are returned (e.g. "wikipedia.org")
+        pattern: Optional regular expression the link URL must match (e.g. "/wiki/[^:]+$")
+        max_links: Maximum number of links listed (default: 50)
     
     Returns:
         A list of links found on the page
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Find all links
-        links = []
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href']
-            text = a_tag.get_text(strip=True)
-            
-            # Make relative URLs absolute
-            if href.startswith('/'):
-                from urllib.parse import urljoin
-                href = urljoin(url, href)
-            
-            # Apply filter if specified
-            if filter_text:
-                if filter_text.lower() in href.lower() or filter_text.lower() in text.lower():
-                    links.append(f"{text}: {href}")
-            else:
-                if href.startswith('http'):  # Only include absolute URLs
-                    links.append(f"{text}: {href}")
+        # Absolute, deduplicated links; only anchors are parsed if the page isn't cached
+        links = filter_links(get_links(url), filter_text, domain, pattern)
         
         if not links:
             return "No links found matching the criteria."
         
         # Limit number of links to avoid overwhelming output
-        max_links = 50
         result = f"Found {len(links)} links on {url}:\n\n"
-        result += "\n".join(links[:max_links])
+        result += "\n".join(f"{text}: {href}" for text, href in links[:max_links])
         
         if len(links) > max_links:
             result += f"\n\n[{len(links) - max_links} more links not shown]"
         
         return result
         
+    except re.error as e:
+        return f"Error: Invalid link pattern: {str(e)}"
     except Exception as e:
         return f"Error extracting links from {url}: {str(e)}"
 
 
 @tool
-def search_in_document(url: str, search_term: str, context_chars: int = 200) -> str:
+def search_in_document(url: str, search_term: str = "", context_chars: int = 200,
+                       search_terms: Optional[List[str]] = None, match_mode: str = "exact") -> str:
     """
     Search for specific text within a document/webpage and return surrounding context.
     
+    Several terms can be searched at once; nearby matches are merged into one
+    passage, and passages containing the most terms are listed first.
+    
     Args:
         url: The URL of the document to search
         search_term: The text to search for
         context_chars: Number of characters of context to show before and after the match
+        search_terms: Optional list of additional terms searched together with search_term
+        match_mode: "exact" (case-insensitive, default), "word" (whole words only),
+                    "regex" (terms are regular expressions) or "fuzzy" (tolerates typos)
     
     Returns:
-        All occurrences of the search term with surrounding context
+        All occurrences of the search terms with surrounding context
     """
     try:
-        # Get the document content
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        text = soup.get_text(separator=' ', strip=True)
-        
-        # Find all occurrences
-        occurrences = []
-        search_lower = search_term.lower()
-        text_lower = text.lower()
-        
-        start = 0
-        while True:
-            pos = text_lower.find(search_lower, start)
-            if pos == -1:
-                break
-            
-            # Get context
-            context_start = max(0, pos - context_chars)
-            context_end = min(len(text), pos + len(search_term) + context_chars)
-            
-            context = text[context_start:context_end]
-            
-            # Add ellipsis if truncated
-            if context_start > 0:
-                context = "..." + context
-            if context_end < len(text):
-                context = context + "..."
-            
-            occurrences.append(context)
-            start = pos + 1
-        
-        if not occurrences:
-            return f"'{search_term}' not found in {url}"
+        terms = [term for term in [search_term] + list(search_terms or []) if term and term.strip()]
+        if not terms:
+            return "Error: No search term provided"
         
-        result = f"Found {len(occurrences)} occurrence(s) of '{search_term}' in {url}:\n\n"
-        for i, occurrence in enumerate(occurrences[:10], 1):  # Limit to 10 occurrences
-            result += f"{i}. {occurrence}\n\n"
+        # Get the document content
+        text = get_document(url).search_text
+        
+        matches = find_matches(text, terms, match_mode)
+        label = "', '".join(terms)
+        if not matches:
+            return f"'{label}' not found in {url}"
+        
+        windows = context_windows(text, matches, context_chars)
+        counts = Counter(term_index for _, _, term_index in matches)
+        
+        result = f"Found {len(matches)} occurrence(s) of '{label}' in {url}"
+        if len(terms) > 1:
+            result += " (" + ", ".join(f"'{term}': {counts[i]}" for i, term in enumerate(terms)) + ")"
+        result += ":\n\n"
+        for i, window in enumerate(windows[:10], 1):  # Limit to 10 passages
+            if len(terms) > 1:
+                found = ", ".join(terms[t] for t in sorted(window["terms"]))
+                result += f"{i}. [{found}] {window['text']}\n\n"
+            else:
+                result += f"{i}. {window['text']}\n\n"
         
-        if len(occurrences) > 10:
-            result += f"[{len(occurrences) - 10} more occurrences not shown]"
+        if len(windows) > 10:
+            result += f"[{len(windows) - 10} more passages not shown]"
         
         return result
         
+    except re.error as e:
+        return f"Error: Invalid regular expression: {str(e)}"
     except Exception as e:
         return f"Error searching document {url}: {str(e)}"
@@ -0,0 +1,357 @@
+"""Fast video frame extraction using ffmpeg input seeking."""
+import os
+import re
+import json
+import shutil
+import subprocess
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+
+# Default maximum edge length of extracted frames (vision models downscale anyway)
+DEFAULT_FRAME_SIZE = 768
+
+# Maximum number of timestamps decoded by a single ffmpeg invocation
+MAX_TIMESTAMPS_PER_CALL = 32
+
+
+def get_ffmpeg_path() -> Optional[str]:
+    """Locate ffmpeg on PATH or from imageio_ffmpeg (bundled with MoviePy)."""
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        from imageio_ffmpeg import get_ffmpeg_exe
+        return get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+def _parse_seconds(value) -> Optional[float]:
+    """A positive duration in seconds, or None (ffprobe reports "N/A" when it does not know)."""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    return seconds if 0 < seconds < float("inf") else None
+
+
+def _display_size(width: int, height: int, rotation: float) -> Tuple[int, int]:
+    """Frame size as shown: ffmpeg applies the rotation metadata (phone videos) when decoding."""
+    if round(abs(rotation)) % 180 == 90:
+        return height, width
+    return width, height
+
+
+def _stream_copy_duration(video_path: str) -> Optional[float]:
+    """Duration read off the last video packet, for files whose header has none (e.g. live webm)."""
+    ffmpeg = get_ffmpeg_path()
+    if not ffmpeg:
+        return None
+    # Stream copy to a null muxer walks every packet without decoding
+    log = subprocess.run(
+        [ffmpeg, "-hide_banner", "-nostdin", "-i", video_path,
+         "-map", "0:v:0", "-c", "copy", "-f", "null", "-"],
+        capture_output=True
+    ).stderr.decode("utf-8", errors="replace")
+    times = re.findall(r"time=(\d+):(\d+):(\d+(?:\.\d+)?)", log)
+    if not times:
+        return None
+    hours, minutes, seconds = times[-1]
+    return _parse_seconds(int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+
+
+def probe_video(video_path: str) -> Tuple[float, int, int]:
+    """
+    Read duration and frame size from the container header without decoding.
+
+    Uses ffprobe when available, otherwise parses the header printed by ffmpeg.
+    The size is the displayed one, with width and height swapped for videos
+    carrying a 90 or 270 degree rotation. When the header has no duration,
+    the stream's own duration or frame count is used, and as a last resort
+    the packets are read through without decoding.
+
+    Args:
+        video_path: Path to the video file
+
+    Returns:
+        Tuple of (duration in seconds, width, height)
+
+    Raises:
+        RuntimeError: If ffmpeg is missing or the header or duration cannot be read
+    """
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe:
+        output = subprocess.run(
+            [ffprobe, "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "format=duration:stream=width,height,duration,nb_frames,avg_frame_rate"
+             ":stream_tags=rotate:stream_side_data=rotation",
+             "-of", "json", video_path],
+            capture_output=True, check=True
+        ).stdout
+        info = json.loads(output)
+        stream = info["streams"][0]
+        duration = (_parse_seconds(info.get("format", {}).get("duration"))
+                    or _parse_seconds(stream.get("duration")))
+        if duration is None and _parse_seconds(stream.get("nb_frames")):
+            numerator, _, denominator = stream.get("avg_frame_rate", "0/0").partition("/")
+            if _parse_seconds(numerator) and _parse_seconds(denominator):
+                duration = float(stream["nb_frames"]) * float(denominator) / float(numerator)
+        rotation = stream.get("tags", {}).get("rotate") or next(
+            (item["rotation"] for item in stream.get("side_data_list", []) if "rotation" in item), 0)
+        width, height = _display_size(int(stream["width"]), int(stream["height"]), float(rotation))
+    else:
+        ffmpeg = get_ffmpeg_path()
+        if not ffmpeg:
+            raise RuntimeError("ffmpeg not found. Install ffmpeg or imageio-ffmpeg")
+
+        # "ffmpeg -i" with no output prints the header and exits without decoding
+        header = subprocess.run(
+            [ffmpeg, "-hide_banner", "-i", video_path], capture_output=True
+        ).stderr.decode("utf-8", errors="replace")
+        size_match = re.search(r"Stream #.*Video:.*?(\d{2,5})x(\d{2,5})", header)
+        if not size_match:
+            raise RuntimeError(f"Could not read video header: {video_path}")
+        duration = None
+        duration_match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", header)
+        if duration_match:
+            hours, minutes, seconds = duration_match.groups()
+            duration = _parse_seconds(int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+        rotation_match = re.search(r"displaymatrix: rotation of (-?\d+(?:\.\d+)?) degrees"
+                                   r"|\brotate\s*:\s*(-?\d+)", header)
+        rotation = float(next(filter(None, rotation_match.groups()))) if rotation_match else 0.0
+        width, height = _display_size(int(size_match.group(1)), int(size_match.group(2)), rotation)
+
+    if duration is None:
+        duration = _stream_copy_duration(video_path)
+    if duration is None:
+        raise RuntimeError(f"Could not determine the duration of {video_path}")
+    return duration, width, height
+
+
+def probe_duration(video_path: str) -> float:
+    """Get the duration of a video in seconds without opening a decoder (MoviePy without ffmpeg)."""
+    if not shutil.which("ffprobe") and not get_ffmpeg_path():
+        from moviepy.editor import VideoFileClip
+
+        video = VideoFileClip(video_path)
+        try:
+            return video.duration
+        finally:
+            video.close()
+    return probe_video(video_path)[0]
+
+
+def scaled_size(width: int, height: int, max_size: int) -> Tuple[int, int]:
+    """Fit (width, height) within max_size on the longest edge, keeping even dimensions."""
+    scale = min(1.0, max_size / max(width, height))
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def _extract_frame_batch(ffmpeg: str, video_path: str, timestamps: List[float],
+                         size: Tuple[int, int], exact: bool) -> List[np.ndarray]:
+    """Decode one frame at each timestamp in a single ffmpeg process."""
+    width, height = size
+    command = [ffmpeg, "-hide_banner", "-loglevel", "error", "-nostdin"]
+
+    # One input per timestamp: "-ss" before "-i" seeks via the index to the
+    # nearest keyframe instead of decoding everything before it
+    for timestamp in timestamps:
+        if not exact:
+            command += ["-skip_frame", "nokey", "-noaccurate_seek"]
+        command += ["-ss", f"{timestamp:.3f}", "-i", video_path]
+
+    # Take the first decoded frame of each input, scale it in the decoder
+    # pipeline and concatenate everything into one raw RGB stream
+    filters = [
+        f"[{i}:v:0]trim=end_frame=1,setpts=PTS-STARTPTS,"
+        f"scale={width}:{height},setsar=1[v{i}]"
+        for i in range(len(timestamps))
+    ]
+    inputs = "".join(f"[v{i}]" for i in range(len(timestamps)))
+    filters.append(f"{inputs}concat=n={len(timestamps)}:v=1:a=0[out]")
+    command += [
+        "-filter_complex", ";".join(filters),
+        "-map", "[out]", "-vsync", "passthrough",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"
+    ]
+
+    raw = subprocess.run(command, capture_output=True, check=True).stdout
+    frame_bytes = width * height * 3
+    frames = [
+        np.frombuffer(raw[i * frame_bytes:(i + 1) * frame_bytes], dtype=np.uint8).reshape(height, width, 3)
+        for i in range(len(raw) // frame_bytes)
+    ]
+    if len(frames) != len(timestamps):
+        raise RuntimeError(f"ffmpeg returned {len(frames)} frames for {len(timestamps)} timestamps")
+    return frames
+
+
+def extract_frames(video_path: str, timestamps: List[float],
+                   max_size: int = DEFAULT_FRAME_SIZE, exact: bool = True) -> List[Image.Image]:
+    """
+    Extract frames at the given timestamps, scaled to fit max_size.
+
+    Frames are decoded by ffmpeg with input seeking, several timestamps per
+    process, and scaled before they reach Python. Falls back to MoviePy when
+    ffmpeg is unavailable.
+
+    Args:
+        video_path: Path to the video file
+        timestamps: Times in seconds
+        max_size: Maximum edge length of the returned frames
+        exact: If False, return the keyframe at or before each timestamp
+               (faster, no decoding between keyframe and timestamp)
+
+    Returns:
+        One PIL image per timestamp
+    """
+    ffmpeg = get_ffmpeg_path()
+    if not ffmpeg:
+        return extract_frames_moviepy(video_path, timestamps, max_size)
+
+    _, width, height = probe_video(video_path)
+    size = scaled_size(width, height, max_size)
+
+    frames = []
+    for start in range(0, len(timestamps), MAX_TIMESTAMPS_PER_CALL):
+        batch = timestamps[start:start + MAX_TIMESTAMPS_PER_CALL]
+        frames.extend(_extract_frame_batch(ffmpeg, video_path, batch, size, exact))
+    return [Image.fromarray(frame) for frame in frames]
+
+
+def extract_frames_moviepy(video_path: str, timestamps: List[float],
+                           max_size: int = DEFAULT_FRAME_SIZE) -> List[Image.Image]:
+    """Extract frames with MoviePy's VideoFileClip (the original, slower path)."""
+    from moviepy.editor import VideoFileClip
+
+    video = VideoFileClip(video_path)
+    try:
+        frames = []
+        for timestamp in timestamps:
+            frame = Image.fromarray(video.get_frame(timestamp))
+            frame.thumbnail((max_size, max_size))
+            frames.append(frame)
+        return frames
+    finally:
+        video.close()
+
+
+# Resolution and sampling rate of the low-res frames used for scene detection
+SCENE_FRAME_SIZE = 64
+SCENE_SAMPLE_FPS = 1.0
+
+
+def _decode_segment(ffmpeg: str, video_path: str, start: float, end: float,
+                    fps: float, size: Tuple[int, int]) -> Tuple[List[float], np.ndarray, np.ndarray]:
+    """
+    Decode one time range to small grayscale frames and score scene changes.
+
+    Runs in a worker thread; each worker drives its own single-threaded
+    ffmpeg process, so throughput scales with the number of cores.
+
+    Returns:
+        Tuple of (timestamps, frames array of shape (n, h, w), scene scores).
+        The first score is 0; the caller fixes it up using the previous segment.
+    """
+    width, height = size
+    command = [
+        ffmpeg, "-hide_banner", "-loglevel", "error", "-nostdin", "-threads", "1",
+        "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", video_path,
+        "-vf", f"fps={fps},scale={width}:{height}",
+        "-an", "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1"
+    ]
+    raw = subprocess.run(command, capture_output=True, check=True).stdout
+    count = len(raw) // (width * height)
+    frames = np.frombuffer(raw[:count * width * height], dtype=np.uint8).reshape(count, height, width)
+    times = [start + i / fps for i in range(count)]
+
+    # Mean absolute difference between consecutive frames, 0..1
+    scores = np.zeros(count)
+    if count > 1:
+        diffs = np.abs(frames[1:].astype(np.int16) - frames[:-1].astype(np.int16))
+        scores[1:] = diffs.mean(axis=(1, 2)) / 255.0
+    return times, frames, scores
+
+
+def decode_scene_scores(video_path: str, workers: Optional[int] = None,
+                        fps: float = SCENE_SAMPLE_FPS,
+                        frame_size: int = SCENE_FRAME_SIZE) -> List[Tuple[float, float]]:
+    """
+    Decode a video in parallel segments and score every sampled frame for scene change.
+
+    The timeline is split into one range per worker; each range is decoded
+    by its own ffmpeg process to low-res grayscale frames, and the results
+    are merged in order (including the score across each segment boundary).
+    Workers are threads: they only wait on ffmpeg, which does the decoding.
+
+    Args:
+        video_path: Path to the video file
+        workers: Number of parallel ffmpeg processes (default: CPU count)
+        fps: Frames sampled per second of video
+        frame_size: Maximum edge length of the decoded frames
+
+    Returns:
+        List of (timestamp, scene score) for every sampled frame, in time order
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    ffmpeg = get_ffmpeg_path()
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg not found. Install ffmpeg or imageio-ffmpeg")
+
+    duration, width, height = probe_video(video_path)
+    size = scaled_size(width, height, frame_size)
+    workers = max(1, min(workers or os.cpu_count() or 1, int(duration * fps) or 1))
+    bounds = [duration * i / workers for i in range(workers + 1)]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_decode_segment, ffmpeg, video_path, bounds[i], bounds[i + 1], fps, size)
+            for i in range(workers)
+        ]
+        segments = [future.result() for future in futures]
+
+    results = []
+    previous_frame = None
+    for times, frames, scores in segments:
+        if len(frames) == 0:
+            continue
+        if previous_frame is not None:
+            diff = np.abs(frames[0].astype(np.int16) - previous_frame.astype(np.int16))
+            scores[0] = diff.mean() / 255.0
+        previous_frame = frames[-1]
+        results.extend(zip(times, scores.tolist()))
+    return results
+
+
+def select_keyframe_times(scene_scores: List[Tuple[float, float]], num_frames: int,
+                          min_gap: Optional[float] = None) -> List[float]:
+    """
+    Pick the strongest scene changes as keyframe timestamps.
+
+    The opening frame is always a candidate (it starts the first scene), and
+    picks closer than min_gap seconds to an earlier pick are skipped.
+
+    Args:
+        scene_scores: Output of decode_scene_scores
+        num_frames: Number of timestamps to return
+        min_gap: Minimum spacing between picks (default: duration / (4 * num_frames))
+
+    Returns:
+        Selected timestamps in time order
+    """
+    if not scene_scores:
+        return []
+    duration = scene_scores[-1][0] - scene_scores[0][0]
+    min_gap = duration / (4 * num_frames) if min_gap is None else min_gap
+
+    ranked = sorted(scene_scores[1:], key=lambda item: item[1], reverse=True)
+    picks = [scene_scores[0][0]]
+    for timestamp, _ in ranked:
+        if len(picks) >= num_frames:
+            break
+        if all(abs(timestamp - pick) >= min_gap for pick in picks):
+            picks.append(timestamp)
+    return sorted(picks)
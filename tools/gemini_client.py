@@ -0,0 +1,112 @@
+"""Process-wide pool of Gemini chat clients with a shared concurrency and rate limiter."""
+import os
+import time
+import threading
+from collections import deque
+from typing import Optional
+
+
+DEFAULT_MODEL = "gemini-2.0-flash-exp"
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_chat_model(model: str = DEFAULT_MODEL, temperature: Optional[float] = None):
+    """
+    Get a pooled ChatGoogleGenerativeAI instance.
+
+    One base client is built per (model, API key); variants with other
+    settings are shallow copies, so the agent's main model and every vision
+    call share the same underlying transport and its keep-alive connections
+    instead of paying client construction and TLS setup each time.
+
+    Args:
+        model: Gemini model name
+        temperature: Sampling temperature (default: the model's default)
+
+    Returns:
+        A ChatGoogleGenerativeAI instance
+    """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    api_key = os.getenv("GOOGLE_API_KEY")
+    base_key = (model, api_key, None)
+    key = (model, api_key, temperature)
+
+    with _models_lock:
+        if key in _models:
+            return _models[key]
+        if base_key not in _models:
+            _models[base_key] = ChatGoogleGenerativeAI(model=model, google_api_key=api_key)
+        if temperature is not None:
+            _models[key] = _models[base_key].model_copy(update={"temperature": temperature})
+        return _models[key]
+
+
+class RateLimiter:
+    """
+    Limits concurrent requests and requests per minute across all threads.
+
+    Use as a context manager around each API call.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: int = 0):
+        self.requests_per_minute = requests_per_minute
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._request_times = deque()
+
+    def _wait_for_slot(self):
+        """Block until a request fits in the last-60-seconds window."""
+        if self.requests_per_minute <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._request_times and now - self._request_times[0] >= 60:
+                    self._request_times.popleft()
+                if len(self._request_times) < self.requests_per_minute:
+                    self._request_times.append(now)
+                    return
+                wait = 60 - (now - self._request_times[0])
+            time.sleep(wait)
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        try:
+            self._wait_for_slot()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._semaphore.release()
+        return False
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_gemini_rate_limiter() -> RateLimiter:
+    """
+    Get the process-wide limiter for Gemini calls made by the tools.
+
+    Created on first use, so GEMINI_MAX_CONCURRENCY and GEMINI_REQUESTS_PER_MINUTE
+    are read after .env has been loaded.
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(
+                max_concurrency=gemini_max_concurrency(),
+                requests_per_minute=int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "0")),
+            )
+        return _rate_limiter
+
+
+def gemini_max_concurrency() -> int:
+    """Concurrent Gemini calls allowed (GEMINI_MAX_CONCURRENCY, default 4)."""
+    return int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
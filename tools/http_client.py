@@ -0,0 +1,316 @@
+"""Shared HTTP session with connection pooling, an on-disk response cache and single-flight fetching."""
+import os
+import re
+import json
+import time
+import mimetypes
+import threading
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+from tools.cache_utils import get_cache_dir, sqlite_connection
+
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+# Connection pools kept (one per host) and connections kept per host
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 16
+
+# Defaults, overridable with HTTP_CACHE_DEFAULT_TTL (seconds) and HTTP_CACHE_MAX_ENTRIES.
+# The default TTL applies to responses without Cache-Control / Expires, so a page
+# read by several tools in a row is fetched once.
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_ENTRIES = 2000
+
+# Response headers worth keeping with a cached body
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control", "Expires", "Content-Disposition")
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Get the process-wide requests session.
+
+    Connections are pooled per host and kept alive between calls, transient
+    failures are retried, and responses are requested gzip- or brotli-compressed
+    (brotli only if the brotli package is installed, since urllib3 needs it to decode).
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            encodings = "gzip, deflate"
+            try:
+                import brotli  # noqa: F401
+                encodings += ", br"
+            except ImportError:
+                pass
+
+            session = requests.Session()
+            session.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": encodings})
+            retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                          allowed_methods=("GET", "HEAD"))
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                                  max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+class CachedResponse:
+    """The parts of an HTTP response the tools use, as served from the network or the cache."""
+
+    def __init__(self, url: str, status_code: int, headers: Dict[str, str], content: bytes,
+                 from_cache: bool = False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.from_cache = from_cache
+
+    @property
+    def content_type(self) -> str:
+        """Lower-case MIME type without parameters."""
+        return self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+
+    @property
+    def text(self) -> str:
+        """Body decoded with the declared charset (UTF-8 if none)."""
+        match = re.search(r'charset=([\w-]+)', self.headers.get("Content-Type", ""), re.IGNORECASE)
+        encoding = match.group(1) if match else "utf-8"
+        try:
+            return self.content.decode(encoding, errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+
+def _freshness_lifetime(headers: Dict[str, str], default_ttl: int) -> Optional[float]:
+    """
+    Seconds a response may be reused without revalidation.
+
+    Returns:
+        Lifetime in seconds, or None if the response must not be stored
+    """
+    cache_control = headers.get("Cache-Control", "").lower()
+    directives = {}
+    for part in cache_control.split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+    for name in ("s-maxage", "max-age"):
+        if directives.get(name, "").isdigit():
+            return int(directives[name])
+    if headers.get("Expires"):
+        try:
+            return max(0.0, parsedate_to_datetime(headers["Expires"]).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return 0
+    return default_ttl
+
+
+class ResponseCache:
+    """
+    SQLite cache of GET responses following HTTP caching rules.
+
+    Fresh entries (per Cache-Control max-age / Expires, or the default TTL)
+    are served directly. Stale entries with an ETag or Last-Modified are
+    revalidated with a conditional request, and a 304 refreshes them without
+    downloading the body again. Entries beyond max_entries are evicted least
+    recently used first.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, default_ttl: Optional[int] = None,
+                 max_entries: Optional[int] = None):
+        self.db_path = db_path or os.path.join(get_cache_dir("http"), "responses.db")
+        self.default_ttl = default_ttl if default_ttl is not None else int(
+            os.getenv("HTTP_CACHE_DEFAULT_TTL", DEFAULT_TTL_SECONDS))
+        self.max_entries = max_entries or int(os.getenv("HTTP_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "url TEXT PRIMARY KEY, final_url TEXT, headers TEXT, body BLOB, "
+                "expires_at REAL, last_access REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+
+    def _connect(self):
+        return sqlite_connection(self.db_path)
+
+    def get(self, url: str) -> Optional[tuple]:
+        """Return (response, is_fresh) for a stored URL, or None."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT final_url, headers, body, expires_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+        response = CachedResponse(row[0], 200, json.loads(row[1]), row[2], from_cache=True)
+        return response, time.time() < row[3]
+
+    def put(self, url: str, response: CachedResponse):
+        """Store a 200 response unless its headers forbid it."""
+        lifetime = _freshness_lifetime(response.headers, self.default_ttl)
+        if lifetime is None:
+            return
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (url, response.url, json.dumps(response.headers), response.content, now + lifetime, now)
+            )
+            conn.execute(
+                "DELETE FROM responses WHERE url IN ("
+                "SELECT url FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def signature(self) -> tuple:
+        """Value that changes whenever a response is added, replaced or evicted."""
+        with self._lock, self._connect() as conn:
+            return tuple(conn.execute("SELECT COUNT(*), MAX(expires_at) FROM responses").fetchone())
+
+    def responses(self) -> List[Tuple[str, CachedResponse]]:
+        """Every stored (URL, response) pair, e.g. to index the cached pages for local search."""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute("SELECT url, final_url, headers, body FROM responses").fetchall()
+        return [(url, CachedResponse(final_url, 200, json.loads(headers), body, from_cache=True))
+                for url, final_url, headers, body in rows]
+
+    def refresh(self, url: str, response: CachedResponse, new_headers: Dict[str, str]):
+        """Extend a stored response's lifetime after a 304, merging any updated headers."""
+        response.headers.update({k: v for k, v in new_headers.items() if k in CACHED_HEADERS})
+        self.put(url, response)
+
+
+_response_cache = None
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+# Directories whose files fetch serves for file:// URLs; nothing else on disk is readable
+_local_roots: List[Path] = []
+_local_roots_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide HTTP response cache."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
+
+
+def allow_local_files(directory: str):
+    """Let fetch serve file:// URLs of files under a directory (e.g. a local search corpus)."""
+    root = Path(directory).resolve()
+    with _local_roots_lock:
+        if root not in _local_roots:
+            _local_roots.append(root)
+
+
+def local_file_response(path: Path) -> CachedResponse:
+    """Read a local file as a response, with a Content-Type guessed from its name."""
+    content = path.read_bytes()
+    content_type = mimetypes.guess_type(path.name)[0] or "text/plain"
+    if content_type.startswith("text/") and b"charset" not in content[:2048].lower():
+        # Local files are taken as UTF-8 unless the page declares otherwise
+        content_type += "; charset=utf-8"
+    return CachedResponse(path.as_uri(), 200, {"Content-Type": content_type}, content)
+
+
+def _fetch_local(url: str) -> CachedResponse:
+    import requests
+
+    path = Path(url2pathname(urlparse(url).path)).resolve()
+    with _local_roots_lock:
+        allowed = any(root == path or root in path.parents for root in _local_roots)
+    if not allowed or not path.is_file():
+        raise requests.exceptions.InvalidURL(f"Local file not readable: {url}")
+    return local_file_response(path)
+
+
+def _fetch_uncoalesced(url: str, timeout: float) -> CachedResponse:
+    if url.startswith("file:"):
+        return _fetch_local(url)
+
+    cache = get_response_cache()
+    cached = cache.get(url)
+    if cached is not None and cached[1]:
+        return cached[0]
+
+    headers = {}
+    if cached is not None:
+        if cached[0].headers.get("ETag"):
+            headers["If-None-Match"] = cached[0].headers["ETag"]
+        if cached[0].headers.get("Last-Modified"):
+            headers["If-Modified-Since"] = cached[0].headers["Last-Modified"]
+
+    response = get_session().get(url, headers=headers, timeout=timeout)
+    if cached is not None and response.status_code == 304:
+        cache.refresh(url, cached[0], response.headers)
+        return cached[0]
+    response.raise_for_status()
+
+    result = CachedResponse(
+        response.url, response.status_code,
+        {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers},
+        response.content
+    )
+    if response.status_code == 200:
+        cache.put(url, result)
+    return result
+
+
+def fetch(url: str, timeout: float = 10) -> CachedResponse:
+    """
+    GET a URL through the shared session and response cache.
+
+    Concurrent calls for the same URL share a single request: the first
+    caller fetches, the others wait for its result. file:// URLs are read
+    from disk, only under directories registered with allow_local_files.
+
+    Args:
+        url: URL to fetch
+        timeout: Request timeout in seconds
+
+    Returns:
+        The response (from_cache is True when no body was downloaded)
+
+    Raises:
+        requests.exceptions.RequestException: On network errors and HTTP error statuses
+    """
+    with _inflight_lock:
+        future = _inflight.get(url)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[url] = future
+
+    if not owner:
+        return future.result()
+
+    try:
+        future.set_result(_fetch_uncoalesced(url, timeout))
+    except BaseException as e:
+        future.set_exception(e)
+    finally:
+        with _inflight_lock:
+            del _inflight[url]
+    return future.result()
@@ -0,0 +1,167 @@
+"""Perceptual image hashing for detecting near-identical images and video frames."""
+import os
+import time
+import threading
+from typing import List, Optional, Tuple, Union
+import numpy as np
+from PIL import Image
+
+from tools.cache_utils import get_cache_dir, normalize_question, sqlite_connection
+
+
+# Frames whose 64-bit hashes differ in at most this many bits are treated as duplicates
+DEFAULT_HAMMING_THRESHOLD = 5
+
+
+def _to_grayscale_array(image: Union[Image.Image, np.ndarray], size: Tuple[int, int]) -> np.ndarray:
+    """Convert an image or RGB array to a resized float grayscale array."""
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    gray = image.convert("L").resize(size, Image.LANCZOS)
+    return np.asarray(gray, dtype=np.float64)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    """Pack a boolean array into an integer hash."""
+    return int("".join("1" if bit else "0" for bit in bits.flatten()), 2)
+
+
+def dhash(image: Union[Image.Image, np.ndarray], hash_size: int = 8) -> int:
+    """
+    Compute a difference hash: compares horizontally adjacent pixels.
+    
+    Args:
+        image: PIL image or RGB array
+        hash_size: Hash is hash_size x hash_size bits (default 64 bits)
+    
+    Returns:
+        The hash as an integer
+    """
+    pixels = _to_grayscale_array(image, (hash_size + 1, hash_size))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis matrix of size n x n."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+def phash(image: Union[Image.Image, np.ndarray], hash_size: int = 8, highfreq_factor: int = 4) -> int:
+    """
+    Compute a perceptual hash from the low-frequency DCT coefficients.
+    
+    Args:
+        image: PIL image or RGB array
+        hash_size: Hash is hash_size x hash_size bits (default 64 bits)
+        highfreq_factor: Image is resized to hash_size * highfreq_factor before the DCT
+    
+    Returns:
+        The hash as an integer
+    """
+    size = hash_size * highfreq_factor
+    pixels = _to_grayscale_array(image, (size, size))
+    dct = _dct_matrix(size)
+    coefficients = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    # Median excludes the DC term, which only reflects overall brightness
+    median = np.median(coefficients.flatten()[1:])
+    return _bits_to_int(coefficients > median)
+
+
+def hamming_distance(hash_a: int, hash_b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return (hash_a ^ hash_b).bit_count()
+
+
+def hash_to_hex(image_hash: int, hash_size: int = 8) -> str:
+    """Format a hash as a fixed-width hex string (used as a cache key)."""
+    return f"{image_hash:0{hash_size * hash_size // 4}x}"
+
+
+def group_similar_hashes(hashes: List[int], threshold: int = DEFAULT_HAMMING_THRESHOLD) -> List[int]:
+    """
+    Collapse near-identical hashes into groups.
+    
+    Each hash is compared with the representatives found so far; the first
+    representative within the threshold absorbs it, otherwise it becomes a new
+    representative.
+    
+    Args:
+        hashes: Image hashes in order
+        threshold: Maximum Hamming distance for two hashes to be considered the same
+    
+    Returns:
+        For every input, the index of its representative (itself if it is one)
+    """
+    representatives = []
+    assignment = []
+    for index, image_hash in enumerate(hashes):
+        for rep in representatives:
+            if hamming_distance(image_hash, hashes[rep]) <= threshold:
+                assignment.append(rep)
+                break
+        else:
+            representatives.append(index)
+            assignment.append(index)
+    return assignment
+
+
+def _question_key(question: str, timestamp: Optional[float]) -> str:
+    """Normalized question, tied to a frame timestamp when the answer depends on it."""
+    key = normalize_question(question)
+    return key if timestamp is None else f"{key} @{timestamp:.3f}s"
+
+
+class FrameAnswerCache:
+    """
+    Disk-backed cache of vision answers keyed by perceptual hash and question.
+    
+    Because the key is the image content rather than the video it came from,
+    repeated footage is only analyzed once across videos and sessions. Answers
+    that depend on where the frame sits in its video (questions about time)
+    are stored with the timestamp as part of the key.
+    """
+    
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join(get_cache_dir("frames"), "frame_answers.db")
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS frame_answers ("
+                "frame_hash TEXT, question TEXT, answer TEXT, created_at REAL, "
+                "PRIMARY KEY (frame_hash, question))"
+            )
+    
+    def _connect(self):
+        return sqlite_connection(self.db_path)
+    
+    def get(self, frame_hash: str, question: str, timestamp: Optional[float] = None) -> Optional[str]:
+        """Return the cached answer for a frame hash and question (at a timestamp, if given)."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT answer FROM frame_answers WHERE frame_hash = ? AND question = ?",
+                (frame_hash, _question_key(question, timestamp))
+            ).fetchone()
+        return row[0] if row else None
+    
+    def put(self, frame_hash: str, question: str, answer: str, timestamp: Optional[float] = None):
+        """Store an answer for a frame hash and question (at a timestamp, if given)."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO frame_answers VALUES (?, ?, ?, ?)",
+                (frame_hash, _question_key(question, timestamp), answer, time.time())
+            )
+
+
+_frame_answer_cache = None
+
+
+def get_frame_answer_cache() -> FrameAnswerCache:
+    """Get the process-wide frame answer cache."""
+    global _frame_answer_cache
+    if _frame_answer_cache is None:
+        _frame_answer_cache = FrameAnswerCache()
+    return _frame_answer_cache
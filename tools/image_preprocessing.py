@@ -0,0 +1,190 @@
+"""Image preprocessing before vision calls: MIME sniffing, orientation, downscaling and recompression."""
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from PIL import Image, ImageOps
+
+from tools.cache_utils import get_cache_dir, content_hash
+
+
+# Per-question presets: OCR needs resolution, a general description does not
+IMAGE_PRESETS = {
+    "ocr": {"max_edge": 2048, "format": "JPEG", "quality": 92},
+    "count": {"max_edge": 1536, "format": "JPEG", "quality": 88},
+    "diagram": {"max_edge": 1024, "format": "PNG", "quality": None},
+    "describe": {"max_edge": 768, "format": "JPEG", "quality": 80},
+    "default": {"max_edge": 1024, "format": "JPEG", "quality": 85},
+}
+
+# Formats Gemini accepts as-is
+SUPPORTED_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/heic", "image/heif"}
+
+FORMAT_MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+# Formats PIL only decodes with the optional pillow-heif plugin
+HEIF_MIME_TYPES = {"image/heic", "image/heif"}
+
+# Question wording that selects each preset, checked in order and matched on whole
+# words so that e.g. "bread" or "design" does not select OCR
+PRESET_KEYWORDS = (
+    ("ocr", re.compile(r"\b(text|read|reads|reading|ocr|written|writing|labels?|signs?)\b")),
+    ("count", re.compile(r"\b(count|how many|number of)\b")),
+    ("describe", re.compile(r"\b(describe|description)\b")),
+    ("diagram", re.compile(r"\b(chess|board|diagram|chart)\b")),
+)
+
+# Number of resized variants kept in memory
+MEMORY_CACHE_SIZE = 64
+
+_memory_cache = OrderedDict()
+_memory_cache_lock = threading.Lock()
+
+
+def sniff_mime_type(data: bytes) -> Optional[str]:
+    """
+    Detect the image type from its magic bytes.
+
+    Args:
+        data: Raw file bytes (only the first few bytes are inspected)
+
+    Returns:
+        MIME type, or None if the data is not a recognized image
+    """
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data.startswith(b"BM"):
+        return "image/bmp"
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if data[4:8] == b"ftyp" and data[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    return None
+
+
+def pil_can_decode(mime_type: Optional[str]) -> bool:
+    """Whether PIL can open an image type (HEIC/HEIF only when pillow-heif is installed)."""
+    if mime_type not in HEIF_MIME_TYPES:
+        return True
+    try:
+        from pillow_heif import register_heif_opener
+    except ImportError:
+        return False
+    register_heif_opener()
+    return True
+
+
+def choose_preset(question: str) -> str:
+    """Pick a preprocessing preset from the wording of a vision question."""
+    question_lower = question.lower()
+    for preset, pattern in PRESET_KEYWORDS:
+        if pattern.search(question_lower):
+            return preset
+    return "default"
+
+
+def _encode(img: Image.Image, fmt: str, quality: Optional[int]) -> bytes:
+    """Encode a PIL image in the given format."""
+    buffer = io.BytesIO()
+    if fmt == "JPEG":
+        if img.mode in ("RGBA", "LA", "P"):
+            # JPEG has no alpha channel; flatten onto white
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, "white")
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(buffer, format="JPEG", quality=quality or 85, optimize=True)
+    elif fmt == "WEBP":
+        img.save(buffer, format="WEBP", quality=quality or 85)
+    else:
+        if img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+            img = img.convert("RGBA")
+        img.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def preprocess_image(data: bytes, preset: str = "default", max_edge: Optional[int] = None,
+                     output_format: Optional[str] = None, quality: Optional[int] = None) -> Tuple[bytes, str]:
+    """
+    Prepare raw image bytes for a vision request.
+
+    Applies EXIF orientation, downscales to fit max_edge and recompresses.
+    Images already small, upright and in a supported format are passed
+    through untouched, as are HEIC/HEIF images when pillow-heif is not
+    installed. Results are cached in memory and on disk by content
+    hash and settings, so the same image is only resized once.
+
+    Args:
+        data: Raw image file bytes
+        preset: Name of an entry in IMAGE_PRESETS (e.g. "ocr", "describe")
+        max_edge: Override the preset's maximum edge length in pixels
+        output_format: Override the preset's output format (JPEG, PNG or WEBP)
+        quality: Override the preset's JPEG/WEBP quality
+
+    Returns:
+        Tuple of (image bytes, MIME type)
+    """
+    settings = dict(IMAGE_PRESETS.get(preset, IMAGE_PRESETS["default"]))
+    if max_edge:
+        settings["max_edge"] = max_edge
+    if output_format:
+        settings["format"] = output_format.upper()
+    if quality:
+        settings["quality"] = quality
+
+    mime_type = sniff_mime_type(data)
+    if mime_type is None:
+        raise ValueError("Data is not a recognized image format")
+    if not pil_can_decode(mime_type):
+        # Gemini reads HEIC/HEIF itself; without pillow-heif it is sent at its original size
+        return data, mime_type
+
+    key = f"{content_hash(data)}_{settings['max_edge']}_{settings['format']}_{settings['quality']}"
+    with _memory_cache_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+
+    extension = settings["format"].lower()
+    cache_path = os.path.join(get_cache_dir("images_resized"), f"{key}.{extension}")
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            result = (f.read(), FORMAT_MIME_TYPES[settings["format"]])
+    else:
+        result = _preprocess_uncached(data, mime_type, settings)
+        if result[0] is not data:
+            with open(cache_path, "wb") as f:
+                f.write(result[0])
+
+    with _memory_cache_lock:
+        _memory_cache[key] = result
+        if len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    return result
+
+
+def _preprocess_uncached(data: bytes, mime_type: str, settings: dict) -> Tuple[bytes, str]:
+    """Do the actual decode / rotate / resize / encode work."""
+    with Image.open(io.BytesIO(data)) as img:
+        # Animated images: analyze the first frame
+        img.seek(0)
+        orientation = img.getexif().get(0x0112, 1)
+        max_edge = settings["max_edge"]
+
+        if (mime_type in SUPPORTED_MIME_TYPES and orientation == 1
+                and max(img.size) <= max_edge):
+            return data, mime_type
+
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        return _encode(img, settings["format"], settings["quality"]), FORMAT_MIME_TYPES[settings["format"]]
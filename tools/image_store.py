@@ -0,0 +1,187 @@
+"""Content-addressed store of downloaded images with streamed, size-capped fetching."""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from tools.cache_utils import get_cache_dir, content_hash, sqlite_connection
+from tools.http_client import get_session
+from tools.image_preprocessing import sniff_mime_type
+
+
+# Defaults, overridable with IMAGE_MAX_BYTES and IMAGE_URL_TTL (seconds)
+DEFAULT_MAX_IMAGE_BYTES = 20 * 1024 * 1024
+DEFAULT_URL_TTL_SECONDS = 24 * 3600
+
+# Total size of image bytes kept in memory
+MEMORY_CACHE_BYTES = 64 * 1024 * 1024
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Servers often label images generically; these are accepted and sniffed
+GENERIC_CONTENT_TYPES = ("application/octet-stream", "binary/octet-stream")
+
+
+class ImageStore:
+    """
+    Images stored on disk by SHA-256 of their bytes, with a URL index.
+
+    Each URL maps to the content hash of its last download plus the
+    response's ETag / Last-Modified, so a URL referenced again is served
+    from the store while fresh and revalidated with a conditional request
+    afterwards. Recently used images are also kept in memory.
+    """
+
+    def __init__(self, store_dir: Optional[str] = None, max_bytes: Optional[int] = None,
+                 url_ttl_seconds: Optional[int] = None):
+        self.store_dir = store_dir or get_cache_dir("images")
+        self.max_bytes = max_bytes or int(os.getenv("IMAGE_MAX_BYTES", DEFAULT_MAX_IMAGE_BYTES))
+        self.url_ttl_seconds = url_ttl_seconds or int(os.getenv("IMAGE_URL_TTL", DEFAULT_URL_TTL_SECONDS))
+        self.db_path = os.path.join(self.store_dir, "urls.db")
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                "url TEXT PRIMARY KEY, content_hash TEXT, etag TEXT, last_modified TEXT, fetched_at REAL)"
+            )
+
+    def _connect(self):
+        return sqlite_connection(self.db_path)
+
+    def path_for(self, image_hash: str) -> str:
+        """Location of an image in the store (sharded by hash prefix)."""
+        return os.path.join(self.store_dir, image_hash[:2], image_hash)
+
+    def _remember(self, image_hash: str, data: bytes):
+        with self._lock:
+            if image_hash in self._memory:
+                self._memory.move_to_end(image_hash)
+                return
+            self._memory[image_hash] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > MEMORY_CACHE_BYTES and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def get(self, image_hash: str) -> Optional[bytes]:
+        """Return stored image bytes, or None if not in the store."""
+        with self._lock:
+            if image_hash in self._memory:
+                self._memory.move_to_end(image_hash)
+                return self._memory[image_hash]
+        path = self.path_for(image_hash)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        self._remember(image_hash, data)
+        return data
+
+    def put(self, data: bytes) -> str:
+        """Store image bytes and return their content hash."""
+        image_hash = content_hash(data)
+        path = self.path_for(image_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        self._remember(image_hash, data)
+        return image_hash
+
+    def get_url(self, url: str) -> Optional[dict]:
+        """Content hash, validators and fetch time recorded for a URL."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT content_hash, etag, last_modified, fetched_at FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"content_hash": row[0], "etag": row[1], "last_modified": row[2], "fetched_at": row[3]}
+
+    def put_url(self, url: str, image_hash: str, etag: Optional[str], last_modified: Optional[str]):
+        """Record the content a URL returned and its validators."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?)",
+                (url, image_hash, etag, last_modified, time.time())
+            )
+
+    def fetch(self, url: str) -> bytes:
+        """
+        Get the image at a URL, downloading it only when needed.
+
+        Fresh URLs are served from the store without a request. Stale ones are
+        revalidated with If-None-Match / If-Modified-Since. Downloads are
+        streamed: non-image responses are rejected from their headers or first
+        bytes, and bodies larger than max_bytes are aborted.
+
+        Args:
+            url: HTTP(S) image URL
+
+        Returns:
+            The image bytes
+
+        Raises:
+            ValueError: If the URL does not return an image or it is too large
+            requests.exceptions.RequestException: On network or HTTP errors
+        """
+        record = self.get_url(url)
+        stored = self.get(record["content_hash"]) if record else None
+        if stored is not None and time.time() - record["fetched_at"] < self.url_ttl_seconds:
+            return stored
+
+        headers = {}
+        if stored is not None:
+            if record["etag"]:
+                headers["If-None-Match"] = record["etag"]
+            if record["last_modified"]:
+                headers["If-Modified-Since"] = record["last_modified"]
+
+        print(f"Downloading image from: {url}")
+        with get_session().get(url, headers=headers, timeout=10, stream=True) as response:
+            if stored is not None and response.status_code == 304:
+                self.put_url(url, record["content_hash"], record["etag"], record["last_modified"])
+                return stored
+            response.raise_for_status()
+
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if content_type and not content_type.startswith("image/") and content_type not in GENERIC_CONTENT_TYPES:
+                raise ValueError(f"URL did not return an image (content type: {content_type})")
+            content_length = response.headers.get("Content-Length")
+            if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+                raise ValueError(f"Image is too large ({int(content_length)} bytes, limit {self.max_bytes})")
+
+            chunks, size, sniffed = [], 0, False
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise ValueError(f"Image is larger than the {self.max_bytes} byte limit")
+                # Magic bytes fit in the first 16 bytes; stop before downloading the rest
+                if not sniffed and size >= 16:
+                    if sniff_mime_type(b"".join(chunks)[:16]) is None:
+                        raise ValueError("URL did not return a recognized image format")
+                    sniffed = True
+
+            data = b"".join(chunks)
+            if not sniffed and sniff_mime_type(data) is None:
+                raise ValueError("URL did not return a recognized image format")
+            image_hash = self.put(data)
+            self.put_url(url, image_hash, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return data
+
+
+_image_store = None
+
+
+def get_image_store() -> ImageStore:
+    """Get the process-wide image store."""
+    global _image_store
+    if _image_store is None:
+        _image_store = ImageStore()
+    return _image_store
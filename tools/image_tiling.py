@@ -0,0 +1,227 @@
+"""Tiled vision analysis of large images for object counting and OCR."""
+import io
+import math
+import difflib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from PIL import Image, ImageOps
+
+from tools.gemini_client import gemini_max_concurrency
+from tools.image_preprocessing import pil_can_decode, sniff_mime_type
+from tools.vision_analyzer import invoke_vision_model, bytes_to_data_url, parse_json_answers
+
+
+# Images whose longest edge exceeds this are tiled; smaller ones use a single request
+TILING_THRESHOLD = 2048
+
+TILE_SIZE = 1024
+
+# Fraction of the tile size shared with each neighbour, so objects and text
+# cut by one tile boundary appear whole in the adjacent tile
+TILE_OVERLAP = 0.15
+
+# Share of tiles that must return a usable answer for a tiled result to be trusted
+MIN_ANSWERED_SHARE = 0.5
+
+COUNT_TILE_PROMPT = """This image is one tile of a larger picture. Find every {object_type} visible in it.
+Respond with only a JSON object of the form:
+{{"objects": [{{"label": "<type or species>", "box": [ymin, xmin, ymax, xmax]}}]}}
+Box coordinates are normalized to 0-1000 relative to this tile. Include objects cut off by the tile edge."""
+
+OCR_TILE_PROMPT = """This image is one tile of a larger picture. Transcribe every line of text visible in it.
+Respond with only a JSON object of the form:
+{"lines": [{"text": "<line text>", "box": [ymin, xmin, ymax, xmax]}]}
+Box coordinates are normalized to 0-1000 relative to this tile. Include text cut off by the tile edge."""
+
+
+class TilingError(Exception):
+    """Too few tiles of an image returned a usable answer."""
+
+
+def needs_tiling(image_data: bytes, threshold: int = TILING_THRESHOLD) -> bool:
+    """Check from the image header whether an image is large enough to tile."""
+    if not pil_can_decode(sniff_mime_type(image_data)):
+        # Cannot be cut into tiles; analyzed in one request
+        return False
+    with Image.open(io.BytesIO(image_data)) as img:
+        return max(img.size) > threshold
+
+
+def compute_tiles(width: int, height: int, tile_size: int = TILE_SIZE,
+                  overlap: float = TILE_OVERLAP) -> List[Tuple[int, int, int, int]]:
+    """
+    Split an image into overlapping tiles that cover it completely.
+
+    Returns:
+        Tile boxes as (left, top, right, bottom) in pixels
+    """
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        # Fewest tiles that keep at least the requested overlap, spread evenly
+        step = tile_size * (1 - overlap)
+        count = math.ceil((length - tile_size) / step) + 1
+        return [round(i * (length - tile_size) / (count - 1)) for i in range(count)]
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height) for x in starts(width)
+    ]
+
+
+def _to_global_box(box: List[float], tile: Tuple[int, int, int, int]) -> Optional[Tuple[float, float, float, float]]:
+    """Convert a 0-1000 [ymin, xmin, ymax, xmax] tile box to global pixel (left, top, right, bottom)."""
+    try:
+        ymin, xmin, ymax, xmax = (float(v) for v in box)
+    except (TypeError, ValueError):
+        return None
+    left, top, right, bottom = tile
+    tile_width, tile_height = right - left, bottom - top
+    return (left + xmin / 1000 * tile_width, top + ymin / 1000 * tile_height,
+            left + xmax / 1000 * tile_width, top + ymax / 1000 * tile_height)
+
+
+def _overlap_ratio(a: Tuple[float, ...], b: Tuple[float, ...]) -> float:
+    """Intersection area divided by the smaller box's area (1.0 = one box inside the other)."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return (width * height) / smaller if smaller > 0 else 0.0
+
+
+def analyze_tiles(image_data: bytes, prompt: str,
+                  preset: str = "ocr") -> Tuple[List[Tuple[Tuple[int, int, int, int], dict]], int]:
+    """
+    Run the same JSON-answer prompt on every tile of an image concurrently.
+
+    Concurrency is bounded by GEMINI_MAX_CONCURRENCY; the shared rate limiter
+    inside invoke_vision_model enforces the global quota. A tile fails if its
+    request raises or its reply is not valid JSON.
+
+    Returns:
+        (list of (tile box, parsed JSON reply) for the tiles that answered, number of failed tiles)
+
+    Raises:
+        TilingError: If fewer than MIN_ANSWERED_SHARE of the tiles answered
+    """
+    with Image.open(io.BytesIO(image_data)) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        tiles = compute_tiles(*img.size)
+        tile_urls = []
+        for tile in tiles:
+            buffer = io.BytesIO()
+            img.crop(tile).save(buffer, format="JPEG", quality=92)
+            tile_urls.append(bytes_to_data_url(buffer.getvalue(), preset))
+
+    def analyze(tile_url: str) -> Optional[dict]:
+        try:
+            reply = invoke_vision_model([
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": tile_url}
+            ])
+        except Exception:
+            return None
+        return parse_json_answers(reply)
+
+    with ThreadPoolExecutor(max_workers=max(1, gemini_max_concurrency())) as executor:
+        replies = list(executor.map(analyze, tile_urls))
+
+    results = [(tile, reply) for tile, reply in zip(tiles, replies) if reply is not None]
+    failed = len(tiles) - len(results)
+    if not results or len(results) < len(tiles) * MIN_ANSWERED_SHARE:
+        raise TilingError(f"{failed} of {len(tiles)} tiles returned no usable answer")
+    return results, failed
+
+
+def _tiles_note(results: list, failed: int) -> str:
+    """Summary of how the image was analyzed, e.g. "12 overlapping tiles, 1 failed"."""
+    note = f"{len(results) + failed} overlapping tiles"
+    return note + (f", {failed} failed" if failed else "")
+
+
+def count_objects_tiled(image_data: bytes, object_type: str) -> Tuple[str, int]:
+    """
+    Count objects in a large image tile by tile, merging duplicates in the overlaps.
+
+    An object seen in two adjacent tiles is counted once: detections with the
+    same label from different tiles whose global boxes mostly overlap are merged.
+
+    Returns:
+        (count summary per label, number of tiles that failed)
+
+    Raises:
+        TilingError: If too few tiles answered
+    """
+    results, failed = analyze_tiles(image_data, COUNT_TILE_PROMPT.format(object_type=object_type), "count")
+
+    detections = []
+    for tile_index, (tile, reply) in enumerate(results):
+        for obj in reply.get("objects", []):
+            if not isinstance(obj, dict):
+                continue
+            box = _to_global_box(obj.get("box"), tile)
+            if box is None:
+                continue
+            label = str(obj.get("label", object_type)).strip().lower()
+            # Only detections from different tiles can be the same object
+            if any(other_tile != tile_index and label == other_label
+                   and _overlap_ratio(box, other_box) > 0.6
+                   for other_tile, other_label, other_box in detections):
+                continue
+            detections.append((tile_index, label, box))
+
+    counts = Counter(label for _, label, _ in detections)
+    lines = [f"Total {object_type}: {len(detections)} (image analyzed as {_tiles_note(results, failed)})"]
+    for label, count in counts.most_common():
+        lines.append(f"- {label}: {count}")
+    return "\n".join(lines), failed
+
+
+def extract_text_tiled(image_data: bytes) -> Tuple[str, int]:
+    """
+    Transcribe text in a large image tile by tile, merging lines repeated in the overlaps.
+
+    Lines whose boxes overlap and whose text matches (or one contains the
+    other, for lines cut by a tile edge) are merged, keeping the longer text.
+    The result is in reading order.
+
+    Returns:
+        (the extracted text, number of tiles that failed)
+
+    Raises:
+        TilingError: If too few tiles answered
+    """
+    results, failed = analyze_tiles(image_data, OCR_TILE_PROMPT, "ocr")
+
+    lines = []
+    for tile, reply in results:
+        for line in reply.get("lines", []):
+            if not isinstance(line, dict) or not str(line.get("text", "")).strip():
+                continue
+            box = _to_global_box(line.get("box"), tile)
+            if box is None:
+                continue
+            text = str(line["text"]).strip()
+
+            for i, (other_text, other_box) in enumerate(lines):
+                if _overlap_ratio(box, other_box) < 0.3:
+                    continue
+                similar = difflib.SequenceMatcher(None, text.lower(), other_text.lower()).ratio() > 0.8
+                if similar or text.lower() in other_text.lower() or other_text.lower() in text.lower():
+                    if len(text) > len(other_text):
+                        lines[i] = (text, box)
+                    break
+            else:
+                lines.append((text, box))
+
+    note = f"[Image analyzed as {_tiles_note(results, failed)}]" if failed else ""
+    if not lines:
+        return "\n".join(filter(None, ["No text found", note])), failed
+
+    # Reading order: top to bottom in rows about one line high, then left to right
+    row_height = max(1.0, sorted(box[3] - box[1] for _, box in lines)[len(lines) // 2])
+    lines.sort(key=lambda item: (round(item[1][1] / row_height), item[1][0]))
+    return "\n".join([text for text, _ in lines] + ([note] if note else [])), failed
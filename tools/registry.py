@@ -3,14 +3,17 @@ from typing import List
 from langchain_core.tools import Tool
 
 # Phase 2: Information Retrieval Tools
-from tools.web_search import web_search, web_search_wikipedia
+from tools.web_search import web_search, search_and_read, web_search_wikipedia
+from tools.wikipedia_snapshot import read_wikipedia_article
 from tools.document_reader import read_url, extract_links, search_in_document
+from tools.crawler import crawl_pages
+from tools.web_tables import read_tables, query_table
 
 # Phase 3: Multimedia Analysis Tools
 from tools.audio_processor import transcribe_audio, transcribe_audio_from_url, extract_audio_from_video
 from tools.vision_analyzer import (
-    analyze_image, count_objects_in_image, describe_image,
-    extract_text_from_image, analyze_chess_position
+    analyze_image, analyze_multiple_images, analyze_image_questions, count_objects_in_image,
+    describe_image, extract_text_from_image, analyze_chess_position
 )
 from tools.video_analyzer import analyze_video, transcribe_video, analyze_video_comprehensive
 
@@ -45,10 +48,15 @@ def get_all_tools() -> List[Tool]:
     # Phase 2: Web search and document reader
     tools.extend([
         web_search,
+        search_and_read,
         web_search_wikipedia,
+        read_wikipedia_article,
         read_url,
         extract_links,
         search_in_document,
+        crawl_pages,
+        read_tables,
+        query_table,
     ])
     
     # Phase 3: Multimedia analysis
@@ -59,6 +67,8 @@ def get_all_tools() -> List[Tool]:
         extract_audio_from_video,
         # Vision tools
         analyze_image,
+        analyze_multiple_images,
+        analyze_image_questions,
         count_objects_in_image,
         describe_image,
         extract_text_from_image,
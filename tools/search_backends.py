@@ -0,0 +1,220 @@
+"""Search backends behind web_search: the Tavily API, or a local BM25 index over cached pages or a corpus."""
+import os
+import re
+import time
+import random
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+
+from tools.http_client import CachedResponse, allow_local_files, get_response_cache, local_file_response
+from tools.text_retrieval import BM25Index
+
+
+# Retries of a failed search on rate limiting, timeouts and server errors, with exponential backoff
+SEARCH_RETRIES = 3
+SEARCH_BACKOFF_SECONDS = 1.0
+
+# Characters of the best matching passage returned as a local result's content
+LOCAL_SNIPPET_CHARS = 500
+
+# Cached responses that cannot be parsed as documents
+NON_DOCUMENT_TYPES = ("image/", "audio/", "video/", "font/", "application/octet-stream", "application/zip")
+
+SITE_OPERATOR = re.compile(r"\bsite:(\S+)", re.IGNORECASE)
+
+
+class SearchBackend(ABC):
+    """
+    A search engine behind web_search.
+
+    search returns a Tavily-shaped response: {"answer": str or None,
+    "results": [{"title", "url", "content", "score"}, ...]}, best first.
+    """
+
+    name = "base"
+
+    # Whether responses should go through the search result cache
+    cacheable = True
+
+    @abstractmethod
+    def search(self, query: str, max_results: int = 5, include_answer: bool = True) -> dict:
+        """Run one search and return its response."""
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_tavily_client(api_key: str):
+    """Get the process-wide TavilyClient for an API key, created on first use."""
+    from tavily import TavilyClient
+
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = TavilyClient(api_key=api_key)
+        return _clients[api_key]
+
+
+def _is_transient(error: Exception) -> bool:
+    """Whether a failed search is worth retrying (rate limit, timeout, connection or server error)."""
+    import requests
+    from tavily.errors import UsageLimitExceededError
+
+    if isinstance(error, UsageLimitExceededError):
+        # Raised for every 429; only "too many requests" clears up by waiting
+        return "too many requests" in str(error).lower()
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return False
+
+
+class TavilyBackend(SearchBackend):
+    """The Tavily search API, on a shared client with retries."""
+
+    name = "tavily"
+
+    def search(self, query: str, max_results: int = 5, include_answer: bool = True) -> dict:
+        """
+        Run one Tavily search, retrying transient failures with backoff.
+
+        Raises:
+            ValueError: If TAVILY_API_KEY is not set
+            Exception: The last error once retries are exhausted, or any non-transient error
+        """
+        api_key = os.getenv("TAVILY_API_KEY")
+        if not api_key:
+            raise ValueError("TAVILY_API_KEY not found in environment variables. Please add it to your .env file.")
+        client = get_tavily_client(api_key)
+
+        for attempt in range(SEARCH_RETRIES + 1):
+            try:
+                return client.search(
+                    query=query,
+                    max_results=max_results,
+                    include_answer=include_answer,
+                    include_raw_content=False
+                )
+            except Exception as e:
+                if attempt == SEARCH_RETRIES or not _is_transient(e):
+                    raise
+                # Jitter keeps concurrent queries from retrying in lockstep
+                time.sleep(SEARCH_BACKOFF_SECONDS * 2 ** attempt * (1 + random.random() / 2))
+
+
+class LocalSearchBackend(SearchBackend):
+    """
+    BM25 search over local documents, for offline runs and benchmarks.
+
+    The corpus is a directory of files (HTML, PDF, DOCX, JSON, text; read
+    with the same parsers as read_url) or, without one, every page in the
+    HTTP response cache. The index is built on first use and rebuilt when
+    the corpus changes. A "site:domain" term in the query restricts results
+    to that domain, as it does on Tavily.
+    """
+
+    name = "local"
+    cacheable = False
+
+    def __init__(self, corpus_dir: Optional[str] = None):
+        self.corpus_dir = corpus_dir
+        if corpus_dir:
+            # Results link to the corpus files; let read_url and search_and_read open them
+            allow_local_files(corpus_dir)
+        self._lock = threading.Lock()
+        self._signature = None
+        self._documents = []
+        self._index = BM25Index([])
+
+    def _corpus_signature(self) -> tuple:
+        if not self.corpus_dir:
+            return get_response_cache().signature()
+        return tuple(sorted(
+            (str(path), stat.st_mtime, stat.st_size)
+            for path in Path(self.corpus_dir).rglob("*") if path.is_file()
+            for stat in [path.stat()]
+        ))
+
+    def _corpus(self) -> List[Tuple[str, CachedResponse]]:
+        if not self.corpus_dir:
+            return get_response_cache().responses()
+        corpus = []
+        for path in sorted(Path(self.corpus_dir).rglob("*")):
+            if path.is_file() and not path.name.startswith("."):
+                response = local_file_response(path.resolve())
+                corpus.append((response.url, response))
+        return corpus
+
+    def _ensure_index(self):
+        from tools.document_cache import parse_document
+
+        with self._lock:
+            signature = self._corpus_signature()
+            if signature == self._signature:
+                return
+            documents = []
+            for url, response in self._corpus():
+                if response.content_type.startswith(NON_DOCUMENT_TYPES):
+                    continue
+                try:
+                    documents.append(parse_document(url, response))
+                except Exception:
+                    # An unreadable file should not make the whole corpus unsearchable
+                    continue
+            self._index = BM25Index([f"{doc.title}\n{doc.search_text}" for doc in documents])
+            self._documents = documents
+            self._signature = signature
+
+    def search(self, query: str, max_results: int = 5, include_answer: bool = True) -> dict:
+        self._ensure_index()
+        sites = [site.lower().lstrip(".") for site in SITE_OPERATOR.findall(query)]
+        terms = SITE_OPERATOR.sub(" ", query)
+
+        results = []
+        # Rank deeper than needed so site: filtering still fills max_results
+        for doc_id, score in self._index.search(terms, len(self._index) if sites else max_results):
+            document = self._documents[doc_id]
+            host = (urlparse(document.url).hostname or "").lower()
+            if sites and not any(host == site or host.endswith("." + site) for site in sites):
+                continue
+            passages, passage_index = document.passage_index()
+            best = passage_index.search(terms, 1)
+            content = passages[best[0][0]][1] if best else document.text
+            results.append({
+                "title": document.title or document.url,
+                "url": document.url,
+                "content": " ".join(content.split())[:LOCAL_SNIPPET_CHARS],
+                "score": score,
+            })
+            if len(results) >= max_results:
+                break
+        # No generated answer offline; the results have the same shape as Tavily's
+        return {"query": query, "answer": None, "results": results}
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend() -> SearchBackend:
+    """
+    Get the process-wide search backend chosen by SEARCH_BACKEND.
+
+    "tavily" (default) uses the Tavily API; "local" searches SEARCH_CORPUS_DIR,
+    or the HTTP response cache when that is not set.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.getenv("SEARCH_BACKEND", "tavily").strip().lower()
+            if name == "local":
+                _backend = LocalSearchBackend(os.getenv("SEARCH_CORPUS_DIR") or None)
+            elif name == "tavily":
+                _backend = TavilyBackend()
+            else:
+                raise ValueError(f"Unknown SEARCH_BACKEND '{name}'. Use: tavily, local")
+        return _backend
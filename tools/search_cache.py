@@ -0,0 +1,90 @@
+"""Disk-backed cache of web search responses keyed by normalized query and search parameters."""
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Optional, Tuple
+
+from tools.cache_utils import get_cache_dir, normalize_question, sqlite_connection
+
+
+# Defaults, overridable with SEARCH_CACHE_TTL, SEARCH_CACHE_STALE_TTL (seconds) and SEARCH_CACHE_MAX_ENTRIES
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_STALE_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def search_offline() -> bool:
+    """Whether SEARCH_OFFLINE is set, i.e. searches are answered from the cache only."""
+    return os.getenv("SEARCH_OFFLINE", "").strip().lower() in ("1", "true", "yes")
+
+
+class SearchCache:
+    """
+    SQLite cache of search responses with LRU eviction.
+
+    Queries that differ only in case or whitespace share an entry. Entries
+    are not deleted when they expire: the caller decides from their age
+    whether to use them, refresh them in the background or (offline) serve
+    them anyway.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, ttl_seconds: Optional[int] = None,
+                 stale_seconds: Optional[int] = None, max_entries: Optional[int] = None):
+        self.db_path = db_path or os.path.join(get_cache_dir("search"), "search_cache.db")
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(
+            os.getenv("SEARCH_CACHE_TTL", DEFAULT_TTL_SECONDS))
+        self.stale_seconds = stale_seconds if stale_seconds is not None else int(
+            os.getenv("SEARCH_CACHE_STALE_TTL", DEFAULT_STALE_SECONDS))
+        self.max_entries = max_entries or int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS searches ("
+                "key TEXT PRIMARY KEY, query TEXT, response TEXT, created_at REAL, last_access REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS searches_lru ON searches (last_access)")
+
+    def _connect(self):
+        return sqlite_connection(self.db_path)
+
+    @staticmethod
+    def make_key(query: str, **params) -> str:
+        """Cache key from the normalized query and the search parameters."""
+        raw = json.dumps([normalize_question(query), sorted(params.items())])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[dict, float]]:
+        """Return (response, age in seconds) for a stored search, or None."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM searches WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE searches SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0]), time.time() - row[1]
+
+    def put(self, key: str, query: str, response: dict):
+        """Store a search response, evicting the least recently used entries beyond max_entries."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?)",
+                (key, query, json.dumps(response), now, now)
+            )
+            conn.execute(
+                "DELETE FROM searches WHERE key IN ("
+                "SELECT key FROM searches ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+
+_search_cache = None
+
+
+def get_search_cache() -> SearchCache:
+    """Get the process-wide search cache."""
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = SearchCache()
+    return _search_cache
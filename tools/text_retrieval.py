@@ -0,0 +1,88 @@
+"""Lightweight lexical retrieval: tokenization, BM25 ranking and passage chunking."""
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+
+# BM25 parameters (standard defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Rough characters per model token, for budgeting output
+CHARS_PER_TOKEN = 4
+
+# Passages longer than this are split at line boundaries
+MAX_PASSAGE_CHARS = 1500
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from had has have he her his how i in is it its of on or
+she that the their them there these they this to was were what when where which who why
+will with you your
+""".split())
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens without stopwords."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory BM25 index over a list of texts.
+
+    Building is a single pass over the tokens; queries only touch the
+    postings of their own terms.
+    """
+
+    def __init__(self, texts: List[str]):
+        self.doc_lengths = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, freq in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, freq))
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Rank the indexed texts against a query.
+
+        Returns:
+            Up to top_k (text index, score) pairs, best first, with score > 0
+        """
+        scores = Counter()
+        count = len(self.doc_lengths)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, freq in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / (self.avg_length or 1))
+                scores[doc_id] += idf * freq * (BM25_K1 + 1) / (freq + norm)
+        return [(doc_id, score) for doc_id, score in scores.most_common(top_k) if score > 0]
+
+
+def split_passages(text: str, max_chars: int = MAX_PASSAGE_CHARS) -> List[str]:
+    """Split text into passages of at most about max_chars, breaking between lines."""
+    passages, current, size = [], [], 0
+    for line in text.split("\n"):
+        if current and size + len(line) > max_chars:
+            passages.append("\n".join(current))
+            current, size = [], 0
+        # A single overlong line is cut hard
+        while len(line) > max_chars:
+            passages.append(line[:max_chars])
+            line = line[max_chars:]
+        current.append(line)
+        size += len(line) + 1
+    if current and "".join(current).strip():
+        passages.append("\n".join(current))
+    return passages
@@ -0,0 +1,150 @@
+"""Multi-term text search in one pass, with context windows ranked by match density."""
+import re
+import difflib
+from functools import lru_cache
+from typing import List, Tuple
+
+
+MATCH_MODES = ("exact", "word", "regex", "fuzzy")
+
+# Minimum similarity (difflib ratio) for a fuzzy match
+FUZZY_THRESHOLD = 0.8
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+@lru_cache(maxsize=64)
+def _build_matcher(terms: Tuple[str, ...], mode: str):
+    """
+    Compile a matcher for a set of lower-cased terms.
+
+    Uses a pyahocorasick automaton when the package is installed, otherwise a
+    single compiled regex. Both scan the text once for all terms. Regex terms
+    are compiled one by one, since joining them would renumber their groups
+    and break backreferences such as \\1.
+    """
+    if mode == "regex":
+        return "regex", [re.compile(term, re.IGNORECASE) for term in terms]
+
+    try:
+        import ahocorasick
+        automaton = ahocorasick.Automaton()
+        # Terms differing only in case lower-case to the same key; keep all their indexes
+        indexes = {}
+        for i, term in enumerate(terms):
+            indexes.setdefault(term, []).append(i)
+        for term, term_indexes in indexes.items():
+            automaton.add_word(term, (tuple(term_indexes), len(term)))
+        automaton.make_automaton()
+        return "automaton", automaton
+    except ImportError:
+        # One optional zero-width lookahead per term, so every term starting at a
+        # position is captured (e.g. both "new" and "new york"); the leading
+        # alternation skips positions where no term starts
+        alternation = "|".join(re.escape(term) for term in terms)
+        groups = "".join(f"(?=(?P<t{i}>{re.escape(term)}))?" for i, term in enumerate(terms))
+        return "lookahead", re.compile(f"(?=(?:{alternation})){groups}")
+
+
+def _fuzzy_matches(text: str, terms: List[str]) -> List[Tuple[int, int, int]]:
+    """Match each term against runs of the same number of words, tolerating small differences."""
+    words = [(m.start(), m.end(), m.group().lower()) for m in WORD_PATTERN.finditer(text)]
+    term_words = [WORD_PATTERN.findall(term.lower()) for term in terms]
+    matches = []
+    for i in range(len(words)):
+        for term_index, parts in enumerate(term_words):
+            n = len(parts)
+            if not parts or i + n > len(words):
+                continue
+            candidate = " ".join(word for _, _, word in words[i:i + n])
+            target = " ".join(parts)
+            if abs(len(candidate) - len(target)) > max(2, len(target) // 4):
+                continue
+            if difflib.SequenceMatcher(None, candidate, target).ratio() >= FUZZY_THRESHOLD:
+                matches.append((words[i][0], words[i + n - 1][1], term_index))
+    return matches
+
+
+def find_matches(text: str, terms: List[str], mode: str = "exact") -> List[Tuple[int, int, int]]:
+    """
+    Find every occurrence of any of several terms in a single pass over the text.
+
+    Args:
+        text: Text to search
+        terms: Search terms (regular expressions in "regex" mode)
+        mode: "exact" (case-insensitive substring), "word" (whole words only),
+              "regex" or "fuzzy" (tolerates typos and spelling variants)
+
+    Returns:
+        Sorted (start, end, term index) matches
+    """
+    if mode not in MATCH_MODES:
+        raise ValueError(f"Unknown match mode '{mode}'. Use one of: {', '.join(MATCH_MODES)}")
+    terms = [term for term in terms if term.strip()]
+    if not terms:
+        return []
+    if mode == "fuzzy":
+        return _fuzzy_matches(text, terms)
+
+    kind, matcher = _build_matcher(tuple(term.lower() for term in terms) if mode != "regex" else tuple(terms), mode)
+    matches = []
+    if kind == "regex":
+        for term_index, pattern in enumerate(matcher):
+            for m in pattern.finditer(text):
+                if m.end() > m.start():
+                    matches.append((m.start(), m.end(), term_index))
+    else:
+        text_lower = text.lower()
+        if len(text_lower) != len(text):
+            # A few characters lower-case to several; keep offsets aligned with the original
+            text_lower = "".join(ch.lower()[:1] for ch in text)
+        if kind == "automaton":
+            for end, (term_indexes, length) in matcher.iter(text_lower):
+                for term_index in term_indexes:
+                    matches.append((end - length + 1, end + 1, term_index))
+        else:
+            for m in matcher.finditer(text_lower):
+                for name, value in m.groupdict().items():
+                    if value is not None:
+                        matches.append((m.start(name), m.end(name), int(name[1:])))
+
+    if mode == "word":
+        matches = [
+            (start, end, term_index) for start, end, term_index in matches
+            if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+        ]
+    return sorted(matches)
+
+
+def context_windows(text: str, matches: List[Tuple[int, int, int]], context_chars: int = 200) -> List[dict]:
+    """
+    Merge matches into non-overlapping context windows, ranked by term density.
+
+    Windows are ranked by the number of distinct terms they contain, then by
+    matches per character, so passages where several terms occur close
+    together come first.
+
+    Returns:
+        Windows as dicts with start, end, text, terms (set of term indexes) and matches
+    """
+    windows = []
+    for start, end, term_index in matches:
+        window_start = max(0, start - context_chars)
+        window_end = min(len(text), end + context_chars)
+        if windows and window_start <= windows[-1]["end"]:
+            windows[-1]["end"] = max(windows[-1]["end"], window_end)
+            windows[-1]["terms"].add(term_index)
+            windows[-1]["matches"] += 1
+        else:
+            windows.append({"start": window_start, "end": window_end, "terms": {term_index}, "matches": 1})
+
+    for window in windows:
+        snippet = text[window["start"]:window["end"]]
+        if window["start"] > 0:
+            snippet = "..." + snippet
+        if window["end"] < len(text):
+            snippet = snippet + "..."
+        window["text"] = snippet
+
+    windows.sort(key=lambda w: (-len(w["terms"]), -w["matches"] / (w["end"] - w["start"]), w["start"]))
+    return windows
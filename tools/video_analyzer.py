@@ -1,7 +1,8 @@
 """Video analysis tools combining frame extraction and vision analysis."""
 import os
+import re
 import tempfile
-from typing import Optional
+from typing import List, Optional
 from langchain_core.tools import tool
 
 
@@ -67,11 +68,61 @@ def download_video_from_url(url: str) -> str:
             return f"Error downloading video: {str(e)}"
 
 
+# Videos at least this long (seconds) are sampled at scene changes instead of evenly
+LONG_VIDEO_SECONDS = 600
+
+# Answer for a frame whose stored thumbnail cannot be read and cannot be decoded again
+# (starts like other failed answers, so it is never cached)
+FRAME_UNREADABLE = "No answer returned: the stored frame could not be read"
+
+# Questions about time ("what happens at 0:30", "when does...") are answered using the
+# frame timestamps in the prompt, so their cached answers are keyed by timestamp too
+TIME_REFERENCE = re.compile(
+    r"\d+:\d{2}|\b\d+(?:\.\d+)?\s*(?:s|secs?|seconds?|mins?|minutes?)\b"
+    r"|\b(?:when|time|timestamp|moment|seconds?|minutes?)\b",
+    re.IGNORECASE
+)
+
+
+def _evenly_spaced_times(duration: float, num_frames: int) -> List[float]:
+    """Timestamps of num_frames frames spread evenly over the video, excluding the ends."""
+    return [duration * i / (num_frames + 1) for i in range(1, num_frames + 1)]
+
+
+def _select_frame_times(video_index, video_path: Optional[str], num_frames: int) -> Optional[List[float]]:
+    """
+    Choose the frames to analyze for a video.
+    
+    Short videos are sampled evenly. Long videos are decoded in parallel
+    segments to find scene changes, and the strongest ones are used; the scene
+    scores are stored in the index so later questions skip the decode.
+    
+    Returns:
+        Timestamps, or None if scene scores are needed but no local file was given
+    """
+    from tools.frame_extractor import decode_scene_scores, select_keyframe_times
+    
+    if video_index.duration < LONG_VIDEO_SECONDS:
+        return _evenly_spaced_times(video_index.duration, num_frames)
+    
+    if video_index.scene_scores is None:
+        if video_path is None:
+            return None
+        print("Detecting scene changes across all cores...")
+        video_index.scene_scores = decode_scene_scores(video_path)
+    
+    times = select_keyframe_times(video_index.scene_scores, num_frames)
+    return times or _evenly_spaced_times(video_index.duration, num_frames)
+
+
 @tool
 def analyze_video(video_path: str, question: str, num_frames: int = 5) -> str:
     """
     Analyze a video by extracting frames and analyzing them with vision AI.
     Supports local files, YouTube URLs, and direct video URLs.
+    Frames and answers are kept in a per-video index, so follow-up questions
+    about the same video reuse decoded frames and earlier answers. Long videos
+    are sampled at scene changes.
     
     Args:
         video_path: Path to the video file, YouTube URL, or direct video URL
@@ -82,59 +133,132 @@ def analyze_video(video_path: str, question: str, num_frames: int = 5) -> str:
         Analysis of the video based on the extracted frames
     """
     try:
-        from moviepy.editor import VideoFileClip
-        from tools.vision_analyzer import analyze_image
+        from tools.frame_extractor import probe_duration, extract_frames
+        from tools.vision_analyzer import analyze_images_batch, get_google_api_key
+        from tools.image_hashing import (
+            phash, hash_to_hex, group_similar_hashes, get_frame_answer_cache
+        )
+        from tools.video_index import VideoIndex
         
-        # Handle URL download
-        temp_video = None
-        if video_path.startswith(('http://', 'https://')):
-            downloaded_path = download_video_from_url(video_path)
-            if downloaded_path.startswith("Error"):
-                return downloaded_path
-            temp_video = downloaded_path
-            video_path = temp_video
-        
-        # Verify file exists
-        if not os.path.exists(video_path):
-            return f"Error: Video file not found: {video_path}"
+        if not get_google_api_key():
+            return "Error: GOOGLE_API_KEY not configured in .env file"
         
-        print(f"Loading video: {video_path}")
-        video = VideoFileClip(video_path)
-        duration = video.duration
-        
-        # Calculate frame extraction times (evenly spaced)
-        frame_times = [duration * i / (num_frames + 1) for i in range(1, num_frames + 1)]
-        
-        # Extract frames and analyze
-        frame_analyses = []
+        source = video_path
+        is_url = video_path.startswith(('http://', 'https://'))
+        temp_video = None
         temp_frames = []
         
         try:
-            for i, time in enumerate(frame_times, 1):
-                # Extract frame
-                frame = video.get_frame(time)
+            # Follow-up questions about a known URL need no download at all
+            frame_times = None
+            video_index = VideoIndex.for_url(source) if is_url else None
+            if video_index is not None and video_index.duration:
+                times = _select_frame_times(video_index, None, num_frames)
+                if times and video_index.has_frames(times):
+                    frame_times = times
+                    print(f"Using indexed frames for: {source}")
+            
+            if frame_times is None:
+                # Handle URL download
+                if is_url:
+                    downloaded_path = download_video_from_url(video_path)
+                    if downloaded_path.startswith("Error"):
+                        return downloaded_path
+                    temp_video = downloaded_path
+                    video_path = temp_video
                 
-                # Save frame to temp file
-                from PIL import Image
-                frame_image = Image.fromarray(frame)
-                temp_frame = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-                frame_image.save(temp_frame.name)
-                temp_frames.append(temp_frame.name)
+                # Verify file exists
+                if not os.path.exists(video_path):
+                    return f"Error: Video file not found: {video_path}"
                 
-                print(f"Analyzing frame {i}/{num_frames} at {time:.2f}s...")
+                print(f"Loading video: {video_path}")
+                video_index = VideoIndex.for_file(video_path)
+                if is_url:
+                    video_index.remember_url(source)
+                if not video_index.duration:
+                    video_index.duration = probe_duration(video_path)
                 
-                # Analyze frame
-                analysis = analyze_image.invoke({
-                    "image_path": temp_frame.name,
-                    "question": f"{question} (Frame at {time:.2f}s)"
-                })
+                # Evenly spaced for short videos, scene changes for long ones
+                frame_times = _select_frame_times(video_index, video_path, num_frames)
                 
-                frame_analyses.append(f"Frame {i} ({time:.2f}s): {analysis}")
+                # Only decode frames the index doesn't already hold
+                missing = [t for t in frame_times if not video_index.has_frames([t])]
+                if missing:
+                    for time, frame in zip(missing, extract_frames(video_path, missing)):
+                        video_index.add_frame(time, frame, hash_to_hex(phash(frame)))
+            
+            # Timestamps the index has no hash for (an edited or partly written index) are skipped
+            frame_times = [t for t in frame_times if video_index.get_frame_hash(t) is not None]
+            if not frame_times:
+                return "Error: No frames could be extracted from the video"
+            
+            # Collapse near-identical frames so each distinct view is analyzed once
+            frame_hashes = [int(video_index.get_frame_hash(t), 16) for t in frame_times]
+            representatives = group_similar_hashes(frame_hashes)
+            unique_indices = sorted(set(representatives))
+            
+            # Reuse answers from earlier questions on this video, or for the same
+            # footage seen in any other video (at the same time, for questions about time)
+            cache = get_frame_answer_cache()
+            timed = TIME_REFERENCE.search(question) is not None
+            answers = {}
+            to_analyze = []
+            for i in unique_indices:
+                cached = video_index.get_answer(frame_times[i], question)
+                if cached is None:
+                    cached = cache.get(hash_to_hex(frame_hashes[i]), question,
+                                       frame_times[i] if timed else None)
+                if cached is not None:
+                    answers[i] = cached
+                else:
+                    to_analyze.append(i)
+            
+            # A corrupted thumbnail is decoded again when the video file is at hand,
+            # otherwise that frame is left out of the analysis
+            frames = {i: video_index.get_frame(frame_times[i]) for i in to_analyze}
+            unreadable = [i for i in to_analyze if frames[i] is None]
+            if unreadable and os.path.exists(video_path):
+                for i, frame in zip(unreadable, extract_frames(video_path, [frame_times[i] for i in unreadable])):
+                    video_index.add_frame(frame_times[i], frame, hash_to_hex(phash(frame)))
+                    frames[i] = frame
+            for i in to_analyze:
+                if frames[i] is None:
+                    answers[i] = FRAME_UNREADABLE
+            to_analyze = [i for i in to_analyze if frames[i] is not None]
+            
+            for i in to_analyze:
+                temp_frame = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
+                frames[i].save(temp_frame.name)
+                temp_frame.close()
+                temp_frames.append(temp_frame.name)
+            
+            if to_analyze:
+                # Analyze the remaining frames in as few multi-image requests as possible
+                print(f"Analyzing {len(to_analyze)} distinct frames "
+                      f"({len(unique_indices) - len(to_analyze)} cached, "
+                      f"{len(frame_times) - len(unique_indices)} duplicates skipped)...")
+                analyses = analyze_images_batch(
+                    temp_frames,
+                    question,
+                    descriptions=[f"(Frame at {frame_times[i]:.2f}s)" for i in to_analyze]
+                )
+                for i, analysis in zip(to_analyze, analyses):
+                    answers[i] = analysis
+                    if not analysis.startswith("No answer returned"):
+                        cache.put(hash_to_hex(frame_hashes[i]), question, analysis,
+                                  frame_times[i] if timed else None)
             
-            video.close()
+            # Fan representative answers back out to the collapsed frames
+            frame_analyses = []
+            for i, (time, rep) in enumerate(zip(frame_times, representatives)):
+                if not answers[rep].startswith("No answer returned"):
+                    video_index.put_answer(time, question, answers[rep])
+                note = f" [near-identical to frame {rep + 1}]" if rep != i else ""
+                frame_analyses.append(f"Frame {i + 1} ({time:.2f}s){note}: {answers[rep]}")
+            video_index.save()
             
             # Combine analyses
-            result = f"Video Analysis ({num_frames} frames analyzed):\n\n"
+            result = f"Video Analysis ({len(frame_times)} frames analyzed):\n\n"
             result += "\n\n".join(frame_analyses)
             
             return result
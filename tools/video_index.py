@@ -0,0 +1,155 @@
+"""Persistent per-video frame index for answering follow-up questions without re-decoding."""
+import os
+import json
+import hashlib
+import threading
+from typing import List, Optional
+from PIL import Image
+
+from tools.cache_utils import get_cache_dir, normalize_question
+
+
+def file_content_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in chunks so large videos are never fully loaded."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _timestamp_key(timestamp: float) -> str:
+    """Stable string key for a timestamp (millisecond precision)."""
+    return f"{timestamp:.3f}"
+
+
+def _write_json(path: str, data: dict):
+    """Write JSON atomically so an interrupted run never leaves a corrupt index."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class VideoIndex:
+    """
+    Frames and vision answers stored for one video, keyed by its content hash.
+
+    The index keeps sampled frames as JPEG thumbnails together with their
+    timestamps and perceptual hashes, plus every per-frame answer keyed by the
+    normalized question. Later questions reuse the stored frames and only pay
+    for vision calls on questions not seen before.
+    """
+
+    _url_lock = threading.Lock()
+
+    def __init__(self, video_hash: str):
+        self.video_hash = video_hash
+        self.directory = os.path.join(get_cache_dir("video_index"), video_hash)
+        os.makedirs(self.directory, exist_ok=True)
+        self.index_path = os.path.join(self.directory, "index.json")
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                self.data = json.load(f)
+        else:
+            self.data = {"video_hash": video_hash, "duration": None, "frames": {}, "answers": {}}
+
+    @classmethod
+    def for_file(cls, video_path: str) -> "VideoIndex":
+        """Open (or create) the index for a local video file."""
+        return cls(file_content_hash(video_path))
+
+    @staticmethod
+    def _url_map_path() -> str:
+        return os.path.join(get_cache_dir("video_index"), "urls.json")
+
+    @classmethod
+    def for_url(cls, url: str) -> Optional["VideoIndex"]:
+        """Return the index of a previously downloaded URL, or None if the URL is unknown."""
+        path = cls._url_map_path()
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            video_hash = json.load(f).get(url)
+        return cls(video_hash) if video_hash else None
+
+    def remember_url(self, url: str):
+        """Record that a URL resolves to this video so it need not be downloaded again."""
+        path = self._url_map_path()
+        with self._url_lock:
+            url_map = {}
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    url_map = json.load(f)
+            url_map[url] = self.video_hash
+            _write_json(path, url_map)
+
+    @property
+    def duration(self) -> Optional[float]:
+        return self.data.get("duration")
+
+    @duration.setter
+    def duration(self, value: float):
+        self.data["duration"] = value
+
+    @property
+    def scene_scores(self) -> Optional[List[List[float]]]:
+        """Per-sample (timestamp, scene score) pairs, if scene detection has run."""
+        return self.data.get("scene_scores")
+
+    @scene_scores.setter
+    def scene_scores(self, value: List[List[float]]):
+        self.data["scene_scores"] = [list(item) for item in value]
+
+    def has_frames(self, timestamps: List[float]) -> bool:
+        """Check whether all given timestamps have a stored frame and hash."""
+        for timestamp in timestamps:
+            entry = self.data["frames"].get(_timestamp_key(timestamp))
+            if not entry or not entry.get("phash"):
+                return False
+            if not os.path.exists(os.path.join(self.directory, entry["thumbnail"])):
+                return False
+        return True
+
+    def get_frame(self, timestamp: float) -> Optional[Image.Image]:
+        """Load the stored frame for a timestamp, or None if it is missing or unreadable."""
+        entry = self.data["frames"].get(_timestamp_key(timestamp))
+        if not entry:
+            return None
+        path = os.path.join(self.directory, entry["thumbnail"])
+        try:
+            with Image.open(path) as img:
+                return img.convert("RGB")
+        except OSError:
+            return None
+
+    def get_frame_hash(self, timestamp: float) -> Optional[str]:
+        """Perceptual hash (hex) stored for a timestamp, if any."""
+        entry = self.data["frames"].get(_timestamp_key(timestamp))
+        return entry["phash"] if entry else None
+
+    def add_frame(self, timestamp: float, frame: Image.Image, frame_hash: str):
+        """Store a decoded frame and its perceptual hash."""
+        key = _timestamp_key(timestamp)
+        filename = f"{key}.jpg"
+        frame.convert("RGB").save(os.path.join(self.directory, filename), quality=90)
+        with self._lock:
+            self.data["frames"][key] = {"thumbnail": filename, "phash": frame_hash}
+
+    def get_answer(self, timestamp: float, question: str) -> Optional[str]:
+        """Previously computed answer for a frame and question, if any."""
+        answers = self.data["answers"].get(normalize_question(question), {})
+        return answers.get(_timestamp_key(timestamp))
+
+    def put_answer(self, timestamp: float, question: str, answer: str):
+        """Store the answer for a frame and question."""
+        with self._lock:
+            answers = self.data["answers"].setdefault(normalize_question(question), {})
+            answers[_timestamp_key(timestamp)] = answer
+
+    def save(self):
+        """Persist the index to disk."""
+        with self._lock:
+            _write_json(self.index_path, self.data)
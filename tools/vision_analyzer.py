@@ -1,109 +1,499 @@
 """Vision and image analysis tools using Gemini Vision."""
 import os
+import re
+import json
+import math
 import base64
-from typing import Optional
+from typing import List, Optional, Tuple
 from langchain_core.tools import tool
-import requests
 from PIL import Image
 import io
 
+from tools.cache_utils import content_hash
+from tools.gemini_client import DEFAULT_MODEL, get_chat_model, get_gemini_rate_limiter
+from tools.image_preprocessing import preprocess_image, choose_preset
+from tools.vision_cache import get_vision_cache
+from tools.image_store import get_image_store
 
-def encode_image(image_path: str) -> str:
-    """Encode image to base64 string."""
+
+def download_image(url: str) -> str:
+    """
+    Download an image from a URL into the local image store.
+    
+    Returns:
+        Path of the stored image file (shared; do not delete it)
+    """
+    store = get_image_store()
+    return store.path_for(content_hash(store.fetch(url)))
+
+
+# Maximum number of images packed into a single multi-image vision request
+MAX_IMAGES_PER_REQUEST = 8
+
+# Matches the "[k]" labels used to split multi-image answers back apart
+LABELED_ANSWER_PATTERN = re.compile(r'^\s*\**\[(\d+)\]\**\s*:?\s*', re.MULTILINE)
+
+# Questions used by the convenience tools (shared so cache keys line up)
+DESCRIBE_QUESTION = "Provide a detailed description of this image. Include all relevant objects, people, text, colors, and any other notable features."
+OCR_QUESTION = "Extract all text visible in this image. Include any words, numbers, signs, labels, or other readable text. If there is no text, say 'No text found'."
+COUNT_QUESTION_TEMPLATE = "Count how many {object_type} are visible in this image. Be specific and provide the exact count. If there are different types or species, list them separately."
+
+# Presets ordered from most to least demanding; a combined request uses the most demanding one
+PRESET_PRIORITY = ["ocr", "count", "diagram", "default", "describe"]
+
+
+def get_google_api_key() -> Optional[str]:
+    """Return the configured Gemini API key, or None if it is missing."""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key or api_key == "your_api_key_here":
+        return None
+    return api_key
+
+
+def image_to_data_url(image_path: str, preset: str = "default") -> str:
+    """
+    Encode an image file as a base64 data URL for Gemini.
+    
+    The image is oriented, downscaled and recompressed according to the preset
+    (see tools.image_preprocessing), and labelled with its real MIME type.
+    """
     with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+        return bytes_to_data_url(image_file.read(), preset)
 
 
-def download_image(url: str) -> str:
-    """Download image from URL and save to temp file."""
-    import tempfile
+def bytes_to_data_url(image_data: bytes, preset: str = "default") -> str:
+    """Encode raw image bytes as a preprocessed base64 data URL for Gemini."""
+    data, mime_type = preprocess_image(image_data, preset)
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+def invoke_vision_model(content: List[dict]) -> str:
+    """
+    Send a multimodal message to Gemini Vision and return the answer text.
+    
+    Args:
+        content: LangChain message content parts (text and image_url entries)
+    
+    Returns:
+        The model's answer
+    """
+    from langchain_core.messages import HumanMessage
+    
+    # Pooled client shared with the agent; the limiter enforces the API quota
+    model = get_chat_model()
+    with get_gemini_rate_limiter():
+        response = model.invoke([HumanMessage(content=content)])
+    return response.content
+
+
+def build_contact_sheet(image_paths: List[str], labels: List[str],
+                        tile_size: int = 512, columns: Optional[int] = None) -> Image.Image:
+    """
+    Tile several images into one labelled contact sheet.
+    
+    Args:
+        image_paths: Paths of the images to tile
+        labels: Label drawn in the corner of each tile (e.g. "[1]")
+        tile_size: Maximum edge length of each tile in pixels
+        columns: Number of columns (default: roughly square grid)
     
-    response = requests.get(url, timeout=10)
-    response.raise_for_status()
+    Returns:
+        The contact sheet as a PIL image
+    """
+    from PIL import ImageDraw
     
-    # Determine file extension from content type or URL
-    content_type = response.headers.get('content-type', '')
-    if 'jpeg' in content_type or 'jpg' in content_type:
-        suffix = '.jpg'
-    elif 'png' in content_type:
-        suffix = '.png'
-    elif 'gif' in content_type:
-        suffix = '.gif'
-    else:
-        suffix = '.jpg'  # default
+    columns = columns or math.ceil(math.sqrt(len(image_paths)))
+    rows = math.ceil(len(image_paths) / columns)
+    sheet = Image.new("RGB", (columns * tile_size, rows * tile_size), "black")
+    draw = ImageDraw.Draw(sheet)
     
-    # Save to temp file
-    tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-    tmp_file.write(response.content)
-    tmp_file.close()
+    for index, (path, label) in enumerate(zip(image_paths, labels)):
+        with Image.open(path) as img:
+            tile = img.convert("RGB")
+            tile.thumbnail((tile_size, tile_size))
+        x = (index % columns) * tile_size + (tile_size - tile.width) // 2
+        y = (index // columns) * tile_size + (tile_size - tile.height) // 2
+        sheet.paste(tile, (x, y))
+        
+        # Draw the label on an opaque box so it stays readable on any frame
+        label_x = (index % columns) * tile_size + 4
+        label_y = (index // columns) * tile_size + 4
+        box = draw.textbbox((label_x, label_y), label)
+        draw.rectangle((box[0] - 3, box[1] - 3, box[2] + 3, box[3] + 3), fill="yellow")
+        draw.text((label_x, label_y), label, fill="black")
     
-    return tmp_file.name
+    return sheet
+
+
+def parse_labeled_answers(text: str, count: int) -> List[str]:
+    """
+    Split a multi-image answer of the form "[1] ... [2] ..." into per-image answers.
+    
+    Args:
+        text: Raw model answer
+        count: Number of images that were sent
+    
+    Returns:
+        One answer per image, in order
+    """
+    answers = {}
+    matches = list(LABELED_ANSWER_PATTERN.finditer(text))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        number = int(match.group(1))
+        if 1 <= number <= count and number not in answers:
+            answers[number] = text[match.end():end].strip()
+    
+    # A single image needs no label; use the whole answer
+    if not answers and count == 1:
+        return [text.strip()]
+    
+    return [answers.get(i, "No answer returned for this image") for i in range(1, count + 1)]
+
+
+def analyze_images_batch(image_paths: List[str], question: str,
+                         descriptions: Optional[List[str]] = None,
+                         contact_sheet: bool = False,
+                         max_images_per_request: int = MAX_IMAGES_PER_REQUEST,
+                         preset: Optional[str] = None) -> List[str]:
+    """
+    Answer the same question about several images using as few vision requests as possible.
+    
+    Images are packed up to max_images_per_request per message, each preceded by
+    a "[k]" label, and the per-image answers are parsed back out of the reply.
+    With contact_sheet=True each group is tiled into a single labelled image instead.
+    
+    Args:
+        image_paths: Local paths of the images to analyze
+        question: Question to ask about every image
+        descriptions: Optional extra context per image (e.g. "frame at 12.50s")
+        contact_sheet: Send each group as one tiled image instead of separate images
+        max_images_per_request: Maximum number of images per request
+        preset: Image preprocessing preset (default: chosen from the question)
+    
+    Returns:
+        One answer per image, in input order
+    """
+    descriptions = descriptions or [""] * len(image_paths)
+    preset = preset or choose_preset(question)
+    answers = []
+    
+    for start in range(0, len(image_paths), max_images_per_request):
+        group = image_paths[start:start + max_images_per_request]
+        group_descriptions = descriptions[start:start + max_images_per_request]
+        labels = [f"[{i}]" for i in range(1, len(group) + 1)]
+        
+        instructions = (
+            f"You are given {len(group)} image(s), labelled {', '.join(labels)}. "
+            f"Answer the following question separately for each image.\n"
+            f"Question: {question}\n\n"
+            f"Reply with one section per image, each starting on a new line with its label, "
+            f"for example:\n[1] answer for image 1\n[2] answer for image 2"
+        )
+        content = [{"type": "text", "text": instructions}]
+        
+        if contact_sheet:
+            sheet = build_contact_sheet(group, labels)
+            buffer = io.BytesIO()
+            sheet.save(buffer, format="JPEG", quality=90)
+            legend = "; ".join(
+                f"{label} {desc}".strip() for label, desc in zip(labels, group_descriptions)
+            )
+            content[0]["text"] += (
+                f"\n\nThe images are tiled into one contact sheet; each tile is marked "
+                f"with its label in the top-left corner. Tiles: {legend}"
+            )
+            content.append({
+                "type": "image_url",
+                "image_url": "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode('utf-8')
+            })
+        else:
+            for label, path, desc in zip(labels, group, group_descriptions):
+                content.append({"type": "text", "text": f"{label} {desc}".strip()})
+                content.append({"type": "image_url", "image_url": image_to_data_url(path, preset)})
+        
+        answers.extend(parse_labeled_answers(invoke_vision_model(content), len(group)))
+    
+    return answers
+
+
+def load_image_for_question(image_path: str, question: str, preset: str) -> Tuple[Optional[str], Optional[bytes]]:
+    """
+    Load an image for a question, short-circuiting on an answer cached for the same preset.
+    
+    URL images come from the image store, so a URL seen before is not
+    downloaded again while fresh and only revalidated once stale.
+    
+    Returns:
+        (cached answer, None) if a valid cached answer exists, else (None, image bytes)
+    """
+    image_data = read_image_source(image_path)
+    cached = get_vision_cache().get(content_hash(image_data), question, DEFAULT_MODEL, preset)
+    if cached is not None:
+        return cached, None
+    return None, image_data
+
+
+def answer_image_question(image_data: bytes, question: str, preset: Optional[str] = None,
+                          cache: bool = True) -> str:
+    """Ask Gemini one question about an image and (unless cache is False) cache the answer."""
+    preset = preset or choose_preset(question)
+    answer = invoke_vision_model([
+        {"type": "text", "text": question},
+        {"type": "image_url", "image_url": bytes_to_data_url(image_data, preset)}
+    ])
+    if cache:
+        get_vision_cache().put(content_hash(image_data), question, DEFAULT_MODEL, preset, answer)
+    return answer
 
 
 @tool
-def analyze_image(image_path: str, question: str) -> str:
+def analyze_image(image_path: str, question: str, preset: Optional[str] = None) -> str:
     """
     Analyze an image and answer a question about it using Gemini Vision.
     
     Args:
         image_path: Path to the image file or URL
         question: Question to ask about the image
+        preset: Image size/quality preset: "ocr", "count", "diagram", "describe"
+                or "default" (chosen from the question if not given)
     
     Returns:
         Answer to the question based on image analysis
     """
     try:
-        from langchain_google_genai import ChatGoogleGenerativeAI
-        from langchain_core.messages import HumanMessage
-        
         # Check if API key is configured
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key or api_key == "your_api_key_here":
+        if not get_google_api_key():
             return "Error: GOOGLE_API_KEY not configured in .env file"
         
-        # Handle URL vs local file
-        temp_file = None
-        if image_path.startswith(('http://', 'https://')):
-            print(f"Downloading image from: {image_path}")
-            image_path = download_image(image_path)
-            temp_file = image_path
+        preset = preset or choose_preset(question)
+        cached, image_data = load_image_for_question(image_path, question, preset)
+        if cached is not None:
+            return cached
         
-        # Verify file exists
-        if not os.path.exists(image_path):
-            return f"Error: Image file not found: {image_path}"
+        return answer_image_question(image_data, question, preset)
         
+    except FileNotFoundError as e:
+        return f"Error: {str(e)}"
+    except ImportError as e:
+        return f"Error: Missing library: {str(e)}"
+    except Exception as e:
+        return f"Error analyzing image: {str(e)}"
+
+
+def analyze_with_tiling(image_path: str, question: str, preset: str, tiled_analysis) -> str:
+    """
+    Answer a question, switching to tiled analysis for images above the size threshold.
+    
+    Args:
+        image_path: Path to the image file or URL
+        question: Full question (also the cache key)
+        preset: Preset for the single-request path
+        tiled_analysis: Function taking image bytes and returning (tiled answer, failed tile count),
+                        raising TilingError when too few tiles answered
+    
+    Returns:
+        The answer
+    """
+    from tools.image_tiling import needs_tiling, TilingError
+    
+    try:
+        if not get_google_api_key():
+            return "Error: GOOGLE_API_KEY not configured in .env file"
+        
+        cached, image_data = load_image_for_question(image_path, question, preset)
+        if cached is not None:
+            return cached
+        
+        # Small images gain nothing from tiling; keep them to one request
+        if not needs_tiling(image_data):
+            return answer_image_question(image_data, question, preset)
+        
+        print("Large image: analyzing overlapping tiles...")
         try:
-            # Initialize Gemini Vision model
-            model = ChatGoogleGenerativeAI(
-                model="gemini-2.0-flash-exp",
-                google_api_key=api_key
+            answer, failed_tiles = tiled_analysis(image_data)
+        except TilingError as e:
+            # Most tiles gave no usable answer; a single request on the whole image beats a wrong total
+            print(f"Tiled analysis failed ({str(e)}); asking about the whole image")
+            return (f"[Tiled analysis failed: {str(e)}; answered from the whole image]\n"
+                    + answer_image_question(image_data, question, preset, cache=False))
+        # A result missing some tiles is returned but not cached, so the next call retries them
+        if not failed_tiles:
+            get_vision_cache().put(content_hash(image_data), question, DEFAULT_MODEL, preset, answer)
+        return answer
+        
+    except FileNotFoundError as e:
+        return f"Error: {str(e)}"
+    except ImportError as e:
+        return f"Error: Missing library: {str(e)}"
+    except Exception as e:
+        return f"Error analyzing image: {str(e)}"
+
+
+@tool
+def analyze_multiple_images(image_paths: List[str], question: str, contact_sheet: bool = False) -> str:
+    """
+    Ask the same question about several images in as few vision requests as possible.
+    
+    Args:
+        image_paths: List of image file paths or URLs
+        question: Question to ask about each image
+        contact_sheet: If True, tile the images into one labelled grid image per request
+    
+    Returns:
+        Per-image answers, labelled by position in the input list
+    """
+    try:
+        if not get_google_api_key():
+            return "Error: GOOGLE_API_KEY not configured in .env file"
+        
+        if not image_paths:
+            return "Error: No images provided"
+        
+        # URL images are resolved to their files in the image store
+        local_paths = []
+        for path in image_paths:
+            if path.startswith(('http://', 'https://')):
+                path = download_image(path)
+            if not os.path.exists(path):
+                return f"Error: Image file not found: {path}"
+            local_paths.append(path)
+        
+        answers = analyze_images_batch(local_paths, question, contact_sheet=contact_sheet)
+        
+        result = f"Analysis of {len(image_paths)} images:\n\n"
+        result += "\n\n".join(
+            f"Image {i} ({source}): {answer}"
+            for i, (source, answer) in enumerate(zip(image_paths, answers), 1)
+        )
+        return result
+        
+    except ImportError as e:
+        return f"Error: Missing library: {str(e)}"
+    except Exception as e:
+        return f"Error analyzing images: {str(e)}"
+
+
+def resolve_question(question: str) -> Tuple[str, str]:
+    """
+    Expand question shortcuts to the exact prompts used by the single-question tools.
+    
+    "describe" -> describe_image, "text"/"ocr" -> extract_text_from_image,
+    "count:<objects>" -> count_objects_in_image. Anything else is used as-is.
+    
+    Returns:
+        Tuple of (full question, preprocessing preset)
+    """
+    shortcut = question.strip().lower()
+    if shortcut == "describe":
+        return DESCRIBE_QUESTION, "describe"
+    if shortcut in ("text", "ocr"):
+        return OCR_QUESTION, "ocr"
+    if shortcut.startswith("count:"):
+        return COUNT_QUESTION_TEMPLATE.format(object_type=question.split(":", 1)[1].strip()), "count"
+    return question, choose_preset(question)
+
+
+def parse_json_answers(text: str) -> Optional[dict]:
+    """Extract the first JSON object from a model reply (tolerates code fences)."""
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        parsed = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def read_image_source(image_path: str) -> bytes:
+    """Read image bytes from a local path or URL."""
+    if image_path.startswith(('http://', 'https://')):
+        return get_image_store().fetch(image_path)
+    
+    if not os.path.exists(image_path):
+        raise FileNotFoundError(f"Image file not found: {image_path}")
+    with open(image_path, "rb") as image_file:
+        return image_file.read()
+
+
+@tool
+def analyze_image_questions(image_path: str, questions: List[str]) -> str:
+    """
+    Answer several questions about one image with a single vision request.
+    Use this instead of calling describe_image, extract_text_from_image and
+    count_objects_in_image one after another on the same image.
+    
+    Args:
+        image_path: Path to the image file or URL
+        questions: Questions to answer. Shortcuts: "describe", "text" (OCR),
+                   "count:<objects>" (e.g. "count:birds")
+    
+    Returns:
+        Each question with its answer
+    """
+    try:
+        if not get_google_api_key():
+            return "Error: GOOGLE_API_KEY not configured in .env file"
+        
+        if not questions:
+            return "Error: No questions provided"
+        
+        resolved = [resolve_question(q) for q in questions]
+        image_data = read_image_source(image_path)
+        image_hash = content_hash(image_data)
+        
+        # Only ask what isn't cached already
+        cache = get_vision_cache()
+        answers = {}
+        pending = []
+        for i, (question, question_preset) in enumerate(resolved):
+            cached = cache.get(image_hash, question, DEFAULT_MODEL, question_preset)
+            if cached is not None:
+                answers[i] = cached
+            else:
+                pending.append(i)
+        
+        if pending:
+            preset = min(
+                (resolved[i][1] for i in pending),
+                key=lambda p: PRESET_PRIORITY.index(p) if p in PRESET_PRIORITY else len(PRESET_PRIORITY)
             )
-            
-            # Read and encode image
-            with open(image_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            # Create message with image
-            message = HumanMessage(
-                content=[
-                    {"type": "text", "text": question},
-                    {
-                        "type": "image_url",
-                        "image_url": f"data:image/jpeg;base64,{image_data}"
-                    }
-                ]
+            numbered = "\n".join(f"q{n}: {resolved[i][0]}" for n, i in enumerate(pending, 1))
+            prompt = (
+                "Answer each of the following questions about this image.\n\n"
+                f"{numbered}\n\n"
+                "Respond with only a JSON object mapping each question id to its answer "
+                "as a string, for example: {\"q1\": \"...\", \"q2\": \"...\"}"
             )
+            reply = invoke_vision_model([
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": bytes_to_data_url(image_data, preset)}
+            ])
             
-            # Get response
-            response = model.invoke([message])
-            
-            return response.content
+            parsed = parse_json_answers(reply)
+            if parsed is None:
+                return f"Answers for {image_path} (unstructured reply):\n\n{reply}"
             
-        finally:
-            # Clean up temp file if we downloaded one
-            if temp_file and os.path.exists(temp_file):
-                os.unlink(temp_file)
+            # Seed the cache so later single-question calls are free (under the preset
+            # actually sent, which can be sharper than the question's own)
+            for n, i in enumerate(pending, 1):
+                answer = parsed.get(f"q{n}")
+                if answer is None:
+                    answers[i] = "No answer returned for this question"
+                    continue
+                answers[i] = answer if isinstance(answer, str) else json.dumps(answer)
+                cache.put(image_hash, resolved[i][0], DEFAULT_MODEL, preset, answers[i])
         
+        result = f"Answers for {image_path}:\n\n"
+        result += "\n\n".join(
+            f"{n}. {question}\n{answers[n - 1]}" for n, question in enumerate(questions, 1)
+        )
+        return result
+        
+    except FileNotFoundError as e:
+        return f"Error: {str(e)}"
     except ImportError as e:
         return f"Error: Missing library: {str(e)}"
     except Exception as e:
@@ -114,6 +504,7 @@ def analyze_image(image_path: str, question: str) -> str:
 def count_objects_in_image(image_path: str, object_type: str) -> str:
     """
     Count specific objects in an image.
+    Large images are split into overlapping tiles so small objects are not lost.
     
     Args:
         image_path: Path to the image file or URL
@@ -122,8 +513,13 @@ def count_objects_in_image(image_path: str, object_type: str) -> str:
     Returns:
         Count and description of the objects found
     """
-    question = f"Count how many {object_type} are visible in this image. Be specific and provide the exact count. If there are different types or species, list them separately."
-    return analyze_image.invoke({"image_path": image_path, "question": question})
+    from tools.image_tiling import count_objects_tiled
+    
+    question = COUNT_QUESTION_TEMPLATE.format(object_type=object_type)
+    return analyze_with_tiling(
+        image_path, question, "count",
+        lambda image_data: count_objects_tiled(image_data, object_type)
+    )
 
 
 @tool
@@ -137,14 +533,15 @@ def describe_image(image_path: str) -> str:
     Returns:
         Detailed description of the image
     """
-    question = "Provide a detailed description of this image. Include all relevant objects, people, text, colors, and any other notable features."
-    return analyze_image.invoke({"image_path": image_path, "question": question})
+    question = DESCRIBE_QUESTION
+    return analyze_image.invoke({"image_path": image_path, "question": question, "preset": "describe"})
 
 
 @tool
 def extract_text_from_image(image_path: str) -> str:
     """
     Extract any text visible in an image (OCR).
+    Large images are split into overlapping tiles so small text stays readable.
     
     Args:
         image_path: Path to the image file or URL
@@ -152,24 +549,50 @@ def extract_text_from_image(image_path: str) -> str:
     Returns:
         Text extracted from the image
     """
-    question = "Extract all text visible in this image. Include any words, numbers, signs, labels, or other readable text. If there is no text, say 'No text found'."
-    return analyze_image.invoke({"image_path": image_path, "question": question})
+    from tools.image_tiling import extract_text_tiled
+    
+    question = OCR_QUESTION
+    return analyze_with_tiling(image_path, question, "ocr", extract_text_tiled)
 
 
 @tool
-def analyze_chess_position(image_path: str) -> str:
+def analyze_chess_position(image_path: str, turn: str = "w", flipped: Optional[bool] = None) -> str:
     """
     Analyze a chess board position from an image.
     
+    Clean digital diagrams are recognized locally and analyzed with the
+    chess engine; photos and unusual piece sets fall back to the vision model.
+    
     Args:
         image_path: Path to the chess board image or URL
+        turn: Side to move, "w" or "b" (default: "w")
+        flipped: True if the board is shown from Black's side, False if from White's;
+                 leave unset to read it from the coordinate labels
     
     Returns:
         Chess position in FEN notation and analysis
     """
+    from tools.chess_vision import recognize_chess_board, MIN_CONFIDENCE
+    from tools.chess_engine import analyze_chess_fen
+    
+    try:
+        fen, confidence = recognize_chess_board(
+            io.BytesIO(read_image_source(image_path)), turn=turn, flipped=flipped
+        )
+    except Exception as e:
+        print(f"Local chess recognition failed: {e}")
+        fen, confidence = None, 0.0
+    
+    if fen and confidence >= MIN_CONFIDENCE:
+        print(f"Recognized board locally (confidence {confidence:.2f})")
+        analysis = analyze_chess_fen.invoke({"fen": fen})
+        return f"FEN: {fen}\nRecognition confidence: {confidence:.2f}\n\n{analysis}"
+    
     question = """Analyze this chess board image. Provide:
 1. The position in FEN (Forsyth-Edwards Notation) format
 2. Whose turn it is
 3. Any notable features of the position
 Be very precise about piece positions."""
-    return analyze_image.invoke({"image_path": image_path, "question": question})
+    if flipped is not None:
+        question += f"\nThe board is shown from {'Black' if flipped else 'White'}'s side."
+    return analyze_image.invoke({"image_path": image_path, "question": question, "preset": "diagram"})
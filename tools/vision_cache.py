@@ -0,0 +1,87 @@
+"""Disk-backed cache of vision answers keyed by image content, question, model and preprocessing preset."""
+import os
+import time
+import hashlib
+import threading
+from typing import Optional
+
+from tools.cache_utils import get_cache_dir, normalize_question, sqlite_connection
+
+
+# Defaults, overridable with VISION_CACHE_TTL (seconds) and VISION_CACHE_MAX_ENTRIES
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+
+class VisionCache:
+    """
+    SQLite cache of vision answers with TTL expiry and LRU eviction.
+
+    URL images are looked up by content, so the image store (which maps URLs
+    to content hashes) decides whether a URL needs downloading again. The
+    preprocessing preset is part of the key: the same image sent at another
+    resolution can get a different answer.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, ttl_seconds: Optional[int] = None,
+                 max_entries: Optional[int] = None):
+        self.db_path = db_path or os.path.join(get_cache_dir("vision"), "vision_cache.db")
+        self.ttl_seconds = ttl_seconds or int(os.getenv("VISION_CACHE_TTL", DEFAULT_TTL_SECONDS))
+        self.max_entries = max_entries or int(os.getenv("VISION_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, answer TEXT, created_at REAL, last_access REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_lru ON answers (last_access)")
+
+    def _connect(self):
+        return sqlite_connection(self.db_path)
+
+    @staticmethod
+    def make_key(image_hash: str, question: str, model: str, preset: str) -> str:
+        """Cache key for (image content hash, normalized question, model, preset)."""
+        raw = f"{model}\n{preset}\n{image_hash}\n{normalize_question(question)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, image_hash: str, question: str, model: str, preset: str) -> Optional[str]:
+        """Return a fresh cached answer, or None."""
+        key = self.make_key(image_hash, question, model, preset)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT answer, created_at FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, image_hash: str, question: str, model: str, preset: str, answer: str):
+        """Store an answer, evicting the least recently used entries beyond max_entries."""
+        key = self.make_key(image_hash, question, model, preset)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)", (key, answer, now, now)
+            )
+            conn.execute(
+                "DELETE FROM answers WHERE key IN ("
+                "SELECT key FROM answers ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+
+_vision_cache = None
+
+
+def get_vision_cache() -> VisionCache:
+    """Get the process-wide vision answer cache."""
+    global _vision_cache
+    if _vision_cache is None:
+        _vision_cache = VisionCache()
+    return _vision_cache
@@ -1,62 +1,348 @@
-"""Web search tool using Tavily API."""
-import os
-from typing import Optional
+"""Web search tools, backed by the Tavily API or a local corpus (see tools.search_backends)."""
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from langchain_core.tools import tool
 
+from tools.search_cache import get_search_cache, search_offline
+from tools.search_backends import get_search_backend
+from tools.document_cache import get_document, best_passages
+from tools.text_retrieval import BM25Index, CHARS_PER_TOKEN
+
+
+# Queries of one web_search call sent to the search backend at the same time
+SEARCH_MAX_WORKERS = 4
+
+# Search results read in full by search_and_read, and how many are fetched at the same time
+READ_TOP_N = 3
+READ_MAX_WORKERS = 4
+
+# Reciprocal rank fusion constant for merging the result lists of several queries
+RRF_K = 60
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|ref_src)$", re.IGNORECASE)
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _refresh_in_background(key: str, query: str, max_results: int, include_answer: bool):
+    """Re-run a search whose cached response is stale and store the result, once per key at a time."""
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    
+    def refresh():
+        try:
+            get_search_cache().put(key, query, get_search_backend().search(query, max_results, include_answer))
+        except Exception:
+            # The stale response was already served; the next call tries again
+            pass
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+    
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def cached_search(query: str, max_results: int = 5, include_answer: bool = True) -> dict:
+    """
+    Search with the configured backend through the on-disk search cache.
+    
+    Fresh entries (younger than SEARCH_CACHE_TTL) are returned directly.
+    Stale entries within SEARCH_CACHE_STALE_TTL after that are returned too,
+    while a background search refreshes them. With SEARCH_OFFLINE set, only
+    the cache is used, whatever the age of the entry.
+    
+    Raises:
+        LookupError: In offline mode, if the search is not cached
+        Exception: As the backend's search, when there is no cached response to fall back on
+    """
+    backend = get_search_backend()
+    if not backend.cacheable:
+        return backend.search(query, max_results, include_answer)
+    
+    cache = get_search_cache()
+    key = cache.make_key(query, backend=backend.name, max_results=max_results, include_answer=include_answer)
+    cached = cache.get(key)
+    
+    if cached is not None:
+        response, age = cached
+        if age < cache.ttl_seconds or search_offline():
+            return response
+        if age < cache.ttl_seconds + cache.stale_seconds:
+            _refresh_in_background(key, query, max_results, include_answer)
+            return response
+    elif search_offline():
+        raise LookupError(f"'{query}' is not in the search cache (SEARCH_OFFLINE is set)")
+    
+    try:
+        response = backend.search(query, max_results, include_answer)
+    except Exception:
+        # An outdated answer beats none
+        if cached is not None:
+            return cached[0]
+        raise
+    cache.put(key, query, response)
+    return response
+
+
+def canonical_url(url: str) -> str:
+    """
+    Canonical form of a URL for spotting the same page under different URLs.
+    
+    Lower-cases the host, drops "www." and mobile "m." prefixes, the fragment,
+    tracking parameters and a trailing slash, and sorts the query parameters.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    host = re.sub(r"^www\.", "", host)
+    host = re.sub(r"^(\w+\.)?m\.", r"\1", host)
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not TRACKING_PARAMS.match(k)))
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https" if parts.scheme in ("http", "https") else parts.scheme, host, path, query, ""))
+
+
+def merge_results(responses: List[dict], max_results: int) -> List[dict]:
+    """
+    Merge the results of several searches into one ranked list without duplicates.
+    
+    Results are grouped by canonical URL and ranked by reciprocal rank fusion,
+    so pages that several queries find near the top come first.
+    
+    Returns:
+        Result dicts with title, url, content, and queries (indexes of the queries that found them)
+    """
+    merged: Dict[str, dict] = {}
+    for query_index, response in enumerate(responses):
+        for rank, result in enumerate(response.get("results", []), 1):
+            key = canonical_url(result.get("url", ""))
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = {**result, "queries": [], "fusion": 0.0}
+            elif len(result.get("content") or "") > len(entry.get("content") or ""):
+                entry["content"] = result["content"]
+            if query_index not in entry["queries"]:
+                entry["queries"].append(query_index)
+                entry["fusion"] += 1 / (RRF_K + rank)
+    ranked = sorted(merged.values(), key=lambda entry: -entry["fusion"])
+    return ranked[:max_results]
+
+
+def search_queries(queries: List[str], max_results: int) -> Tuple[List[dict], List[Tuple[str, Exception]]]:
+    """
+    Run several searches concurrently.
+    
+    Returns:
+        (one response per query, empty for failed ones; (query, error) pairs of the failures)
+    
+    Raises:
+        Exception: The first error, if every query failed
+    """
+    def search(q: str):
+        try:
+            return cached_search(q, max_results)
+        except Exception as e:
+            return e
+    
+    with ThreadPoolExecutor(max_workers=min(SEARCH_MAX_WORKERS, len(queries))) as executor:
+        responses = list(executor.map(search, queries))
+    
+    errors = [(q, r) for q, r in zip(queries, responses) if isinstance(r, Exception)]
+    if len(errors) == len(queries):
+        raise errors[0][1]
+    return [r if not isinstance(r, Exception) else {} for r in responses], errors
+
+
+def rerank_results(results: List[dict], question: str) -> List[dict]:
+    """
+    Order search results by lexical relevance of their title and snippet to the question.
+    
+    Uses BM25 over the result snippets; results the scorer cannot tell apart
+    keep their search engine order. Each result gets its score as "relevance".
+    """
+    index = BM25Index([f"{r.get('title') or ''}\n{r.get('content') or ''}" for r in results])
+    scores = dict(index.search(question, len(results)))
+    order = sorted(range(len(results)), key=lambda i: (-scores.get(i, 0.0), i))
+    return [{**results[i], "relevance": scores.get(i, 0.0)} for i in order]
+
+
+def pick_distinct_domains(results: List[dict], count: int) -> List[dict]:
+    """The first count relevant results, taking at most one per domain while other domains remain."""
+    picked, domains = [], set()
+    for result in results:
+        domain = urlsplit(canonical_url(result.get("url", ""))).hostname
+        if domain not in domains and result.get("relevance", 1.0) > 0:
+            picked.append(result)
+            domains.add(domain)
+        if len(picked) == count:
+            return picked
+    # Fewer distinct domains than wanted: fill up with the best remaining results
+    picked += [result for result in results if result not in picked][:count - len(picked)]
+    return picked
+
+
+def _format_result(results: List[str], i: int, result: dict):
+    title = result.get("title", "No title")
+    url = result.get("url", "")
+    content = result.get("content", "No content available")
+    
+    results.append(f"\n{i}. {title}")
+    results.append(f"   URL: {url}")
+    results.append(f"   {content}")
+
 
 @tool
-def web_search(query: str, max_results: int = 5) -> str:
+def web_search(query: str = "", max_results: int = 5, queries: Optional[List[str]] = None) -> str:
     """
-    Search the web for information using Tavily API.
+    Search the web for information using Tavily API (or the local search backend, if configured).
+    
+    Results are cached on disk, so repeating a search is free. Several reformulations of a question can be searched in one call with
+    queries; they run concurrently and the results are merged, without
+    duplicates, into one ranked list.
     
     Args:
         query: The search query
         max_results: Maximum number of results to return (default: 5)
+        queries: Optional list of additional queries searched together with query
     
     Returns:
         A formatted string containing search results with titles, URLs, and snippets
     """
     try:
-        from tavily import TavilyClient
+        all_queries = list(dict.fromkeys(q.strip() for q in [query] + list(queries or []) if q and q.strip()))
+        if not all_queries:
+            return "Error: No search query provided"
         
-        # Get API key from environment
-        api_key = os.getenv("TAVILY_API_KEY")
-        if not api_key:
-            return "Error: TAVILY_API_KEY not found in environment variables. Please add it to your .env file."
-        
-        # Initialize client
-        client = TavilyClient(api_key=api_key)
+        if len(all_queries) == 1:
+            response = cached_search(all_queries[0], max_results)
+            
+            # Format results
+            results = []
+            
+            # Add the AI-generated answer if available
+            if response.get("answer"):
+                results.append(f"Quick Answer: {response['answer']}\n")
+            
+            # Add individual search results
+            results.append("Search Results:")
+            for i, result in enumerate(response.get("results", []), 1):
+                _format_result(results, i, result)
+            
+            return "\n".join(results) if results else "No results found."
         
-        # Perform search
-        response = client.search(
-            query=query,
-            max_results=max_results,
-            include_answer=True,
-            include_raw_content=False
-        )
+        responses, errors = search_queries(all_queries, max_results)
         
-        # Format results
         results = []
+        answers = [(q, r["answer"]) for q, r in zip(all_queries, responses) if r.get("answer")]
+        if answers:
+            results.append("Quick Answers:")
+            results.extend(f"- {q}: {answer}" for q, answer in answers)
+            results.append("")
         
-        # Add the AI-generated answer if available
-        if response.get("answer"):
-            results.append(f"Quick Answer: {response['answer']}\n")
+        merged = merge_results(responses, max_results)
+        results.append(f"Search Results ({len(all_queries)} queries, duplicates merged):")
+        for i, result in enumerate(merged, 1):
+            _format_result(results, i, result)
+            results.append(f"   Found by: {'; '.join(all_queries[q] for q in result['queries'])}")
+        for q, error in errors:
+            results.append(f"\n[Query '{q}' failed: {str(error)}]")
         
-        # Add individual search results
-        results.append("Search Results:")
-        for i, result in enumerate(response.get("results", []), 1):
-            title = result.get("title", "No title")
-            url = result.get("url", "")
-            content = result.get("content", "No content available")
-            
-            results.append(f"\n{i}. {title}")
-            results.append(f"   URL: {url}")
-            results.append(f"   {content}")
+        return "\n".join(results) if merged else "No results found."
+        
+    except ImportError:
+        return "Error: Tavily library not installed. Run: pip install tavily-python"
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    except Exception as e:
+        return f"Error performing web search: {str(e)}"
+
+
+@tool
+def search_and_read(query: str, queries: Optional[List[str]] = None, read_top: int = READ_TOP_N,
+                    max_results: int = 8, top_k: int = 6, max_tokens: int = 3000) -> str:
+    """
+    Search the web and read the most relevant results in one step.
+    Results are reranked against the query, the best ones (from different sites) are read in full,
+    and the passages that best answer the query are returned. Use this instead of web_search
+    followed by read_url on each result.
+    
+    Args:
+        query: The question or search query
+        queries: Optional list of additional search queries (reformulations) run at the same time
+        read_top: Number of top results read in full (default: 3)
+        max_results: Search results considered per query (default: 8)
+        top_k: Maximum number of passages returned (default: 6)
+        max_tokens: Approximate token budget for the output (default: 3000)
+    
+    Returns:
+        The most relevant passages from the top results, followed by the other results' titles and URLs
+    """
+    try:
+        all_queries = list(dict.fromkeys(q.strip() for q in [query] + list(queries or []) if q and q.strip()))
+        if not all_queries:
+            return "Error: No search query provided"
         
-        return "\n".join(results) if results else "No results found."
+        responses, errors = search_queries(all_queries, max_results)
+        candidates = rerank_results(merge_results(responses, max_results * len(all_queries)), query)
+        if not candidates:
+            return "No results found."
+        top = pick_distinct_domains(candidates, max(1, read_top))
+        
+        def read(result: dict):
+            try:
+                return get_document(result["url"])
+            except Exception:
+                return None
+        
+        with ThreadPoolExecutor(max_workers=min(READ_MAX_WORKERS, len(top))) as executor:
+            documents = list(executor.map(read, top))
+        read_documents = [document for document in documents if document is not None]
+        
+        budget = max_tokens * CHARS_PER_TOKEN
+        parts = []
+        answers = [r["answer"] for r in responses if r.get("answer")]
+        if answers:
+            parts.append(f"Quick Answer: {answers[0]}")
+        
+        passages = best_passages(read_documents, query, top_k) if read_documents else []
+        if passages:
+            parts.append(f"Most relevant passages ({len(read_documents)} of {len(top)} top results read):")
+        for rank, (document, heading, text) in enumerate(passages, 1):
+            if len(text) > budget:
+                if rank > 1:
+                    break
+                text = text[:budget] + " [...]"
+            parts.append(f"\n{rank}. {document.title or document.url} [{heading}] ({document.url})\n{text}")
+            budget -= len(text)
+        
+        # Top results whose page could not be read (or had no matching passage) keep their snippet
+        passage_urls = {document.url for document, _, _ in passages}
+        unread = [result for result, document in zip(top, documents)
+                  if document is None or document.url not in passage_urls]
+        if unread:
+            parts.append("\nOther top results:")
+            for i, result in enumerate(unread, 1):
+                _format_result(parts, i, result)
+        
+        others = [result for result in candidates if result not in top]
+        if others:
+            parts.append("\nMore results (not read):")
+            parts.extend(f"- {r.get('title', 'No title')} ({r.get('url', '')})" for r in others[:max_results])
+        for q, error in errors:
+            parts.append(f"\n[Query '{q}' failed: {str(error)}]")
+        
+        return "\n".join(parts)
         
     except ImportError:
         return "Error: Tavily library not installed. Run: pip install tavily-python"
+    except ValueError as e:
+        return f"Error: {str(e)}"
     except Exception as e:
         return f"Error performing web search: {str(e)}"
 
@@ -65,6 +351,7 @@ def web_search(query: str, max_results: int = 5) -> str:
 def web_search_wikipedia(query: str, year: Optional[int] = None) -> str:
     """
     Search Wikipedia for information. Useful for historical data and factual queries.
+    With a year, a local snapshot of that year is searched when one has been ingested.
     
     Args:
         query: The search query
@@ -73,9 +360,22 @@ def web_search_wikipedia(query: str, year: Optional[int] = None) -> str:
     Returns:
         Wikipedia search results
     """
+    if year:
+        from tools.wikipedia_snapshot import get_snapshot, article_url, lead_snippet
+        
+        snapshot = get_snapshot(year)
+        hits = snapshot.search(query, top_k=3) if snapshot else []
+        if hits:
+            results = [f"Search Results (English Wikipedia, {year} snapshot; read with read_wikipedia_article):"]
+            for i, (title, text, _) in enumerate(hits, 1):
+                results.append(f"\n{i}. {title}")
+                results.append(f"   URL: {article_url(title)}")
+                results.append(f"   {lead_snippet(text)}")
+            return "\n".join(results)
+    
     # Enhance query for Wikipedia
     wiki_query = f"{query} site:wikipedia.org"
     if year:
         wiki_query += f" {year}"
     
-    return web_search(wiki_query, max_results=3)
+    return web_search.invoke({"query": wiki_query, "max_results": 3})
@@ -0,0 +1,240 @@
+"""Tools for reading HTML tables from web pages as DataFrames and querying them."""
+import io
+import re
+import pandas as pd
+from typing import List, Optional
+from langchain_core.tools import tool
+
+from tools.document_cache import get_document
+
+
+# Footnote markers such as "[1]", "[a]" or "[note 2]" in Wikipedia cells
+FOOTNOTE_PATTERN = re.compile(r"\[(?:\w{1,3}|note \d+|citation needed)\]", re.IGNORECASE)
+
+# Share of non-empty cells that must parse as numbers for a column to become numeric
+NUMERIC_SHARE = 0.8
+
+# Rows shown when a table or filter result is printed
+MAX_ROWS_SHOWN = 30
+
+
+def _column_name(column) -> str:
+    """Flatten a (possibly multi-level) header into one name, dropping repeated levels."""
+    if not isinstance(column, tuple):
+        return str(column).strip()
+    parts = []
+    for part in column:
+        part = str(part).strip()
+        if part and not part.startswith("Unnamed:") and part not in parts:
+            parts.append(part)
+    return " / ".join(parts)
+
+
+def _clean_table(df: pd.DataFrame) -> pd.DataFrame:
+    """Flatten headers, strip footnote markers and make mostly-numeric columns numeric."""
+    df = df.copy()
+    names, seen = [], {}
+    for column in df.columns:
+        name = FOOTNOTE_PATTERN.sub("", _column_name(column)).strip() or f"Column {len(names)}"
+        # Duplicate names would make df[name] ambiguous
+        seen[name] = seen.get(name, 0) + 1
+        names.append(name if seen[name] == 1 else f"{name} ({seen[name]})")
+    df.columns = names
+
+    for column in df.columns:
+        if pd.api.types.is_numeric_dtype(df[column]):
+            continue
+        cleaned = df[column].astype(str).str.replace(FOOTNOTE_PATTERN, "", regex=True).str.strip()
+        cleaned = cleaned.where(df[column].notna())
+        numbers = pd.to_numeric(cleaned.str.replace(",", "", regex=False), errors="coerce")
+        present = cleaned.notna() & (cleaned != "")
+        if present.any() and numbers[present].notna().mean() >= NUMERIC_SHARE:
+            df[column] = numbers
+        else:
+            df[column] = cleaned
+    return df
+
+
+def parse_html_tables(html: str) -> List[pd.DataFrame]:
+    """
+    Parse every <table> in an HTML page into a cleaned DataFrame.
+
+    Uses pandas.read_html with the lxml parser, which handles rowspan and
+    colspan; headers are flattened and footnote markers removed.
+
+    Returns:
+        DataFrames in document order (empty list if the page has no tables)
+    """
+    try:
+        tables = pd.read_html(io.StringIO(html), flavor="lxml")
+    except ValueError:
+        # read_html raises ValueError when there are no tables
+        return []
+    return [_clean_table(df) for df in tables if not df.empty]
+
+
+def tables_from_rows(tables: List[List[List[str]]]) -> List[pd.DataFrame]:
+    """Build cleaned DataFrames from tables given as rows of cell texts (first row = header)."""
+    frames = []
+    for rows in tables:
+        if len(rows) < 2:
+            continue
+        width = max(len(row) for row in rows)
+        padded = [row + [None] * (width - len(row)) for row in rows]
+        header = [cell if cell else f"Column {i}" for i, cell in enumerate(padded[0])]
+        frames.append(_clean_table(pd.DataFrame(padded[1:], columns=header)))
+    return frames
+
+
+def _select_tables(url: str, match: Optional[str]) -> List[tuple]:
+    """(index, DataFrame) pairs of a page's tables, optionally only those containing some text."""
+    tables = list(enumerate(get_document(url).dataframes()))
+    if match:
+        match_lower = match.lower()
+        tables = [
+            (i, df) for i, df in tables
+            if match_lower in " ".join(df.columns).lower()
+            or df.astype(str).apply(lambda col: col.str.lower().str.contains(match_lower, regex=False)).any().any()
+        ]
+    return tables
+
+
+def _apply_filter(df: pd.DataFrame, column: str, condition: str, value: str) -> pd.DataFrame:
+    """Filter rows the way filter_excel_data does, with >=, <= and between (inclusive "low,high") added."""
+    numeric = pd.api.types.is_numeric_dtype(df[column])
+    if condition in (">", "<", ">=", "<="):
+        number = float(value)
+        if condition == ">":
+            return df[df[column] > number]
+        if condition == "<":
+            return df[df[column] < number]
+        if condition == ">=":
+            return df[df[column] >= number]
+        return df[df[column] <= number]
+    if condition in ("==", "!="):
+        try:
+            target = float(value) if numeric else value
+        except ValueError:
+            target = value
+        if not numeric:
+            mask = df[column].astype(str).str.lower() == str(target).lower()
+        else:
+            mask = df[column] == target
+        return df[mask] if condition == "==" else df[~mask]
+    if condition == "between":
+        low, high = (float(part) for part in value.split(","))
+        return df[df[column].between(low, high)]
+    if condition == "contains":
+        return df[df[column].astype(str).str.contains(value, case=False, regex=False)]
+    raise ValueError(f"Unknown condition '{condition}'. Use: >, <, >=, <=, ==, !=, between, contains")
+
+
+@tool
+def read_tables(url: str, match: Optional[str] = None) -> str:
+    """
+    List the tables on a web page (e.g. Wikipedia discographies, medal tables) with their columns and first rows.
+    Use query_table afterwards to filter, count or aggregate a table exactly.
+
+    Args:
+        url: The URL of the page
+        match: Optional text; only tables containing it (in a header or cell) are listed
+
+    Returns:
+        Index, size, columns and first rows of each table
+    """
+    try:
+        tables = _select_tables(url, match)
+        if not tables:
+            return f"No tables{f' containing {match!r}' if match else ''} found on {url}"
+
+        summary = [f"Found {len(tables)} table(s) on {url}"]
+        preview_rows = 5 if len(tables) <= 5 else 2
+        for i, df in tables:
+            summary.append(f"\nTable {i}: {df.shape[0]} rows × {df.shape[1]} columns")
+            summary.append(f"Columns: {', '.join(df.columns)}")
+            summary.append(df.head(preview_rows).to_string())
+        return "\n".join(summary)
+
+    except Exception as e:
+        return f"Error reading tables from {url}: {str(e)}"
+
+
+@tool
+def query_table(url: str, table_index: int, column: Optional[str] = None, condition: Optional[str] = None,
+                value: Optional[str] = None, operation: str = "rows", target_column: Optional[str] = None,
+                group_by: Optional[str] = None) -> str:
+    """
+    Filter, count or aggregate one table from a web page (see read_tables for table indexes and columns).
+    Example: count albums per year -> operation="count", group_by="Year";
+    albums from 2000 to 2009 -> column="Year", condition="between", value="2000,2009", operation="count".
+
+    Args:
+        url: The URL of the page
+        table_index: Index of the table as listed by read_tables
+        column: Optional column to filter on
+        condition: Filter operator (>, <, >=, <=, ==, !=, between, contains)
+        value: Value to compare against ("low,high" for between, both inclusive)
+        operation: rows (show matching rows), count, sum, average, max, min, or unique (distinct values)
+        target_column: Column the operation applies to (not needed for rows and count)
+        group_by: Optional column to group by before applying the operation
+
+    Returns:
+        The matching rows or the computed result
+    """
+    try:
+        tables = get_document(url).dataframes()
+        if not 0 <= table_index < len(tables):
+            return f"Error: Table {table_index} not found. The page has {len(tables)} table(s)"
+        df = tables[table_index]
+
+        for name in (column, target_column, group_by):
+            if name and name not in df.columns:
+                return f"Error: Column '{name}' not found. Available: {', '.join(df.columns)}"
+
+        description = f"Table {table_index}"
+        if column and condition:
+            if value is None:
+                return "Error: A value is required for the filter"
+            df = _apply_filter(df, column, condition, value)
+            description += f" where {column} {condition} {value}"
+
+        operation_lower = operation.lower()
+        if operation_lower == "rows":
+            result = [f"{description}: {len(df)} matching rows"]
+            if group_by:
+                df = df.sort_values(group_by)
+            result.append(df.head(MAX_ROWS_SHOWN).to_string())
+            if len(df) > MAX_ROWS_SHOWN:
+                result.append(f"[{len(df) - MAX_ROWS_SHOWN} more rows not shown]")
+            return "\n".join(result)
+
+        if operation_lower == "count":
+            if group_by:
+                counts = df.groupby(group_by).size()
+                return f"Row count of {description} by '{group_by}':\n{counts.to_string()}"
+            if target_column:
+                return f"Count of non-empty '{target_column}' in {description}: {df[target_column].count()}"
+            return f"Row count of {description}: {len(df)}"
+
+        if not target_column:
+            return f"Error: target_column is required for '{operation}'"
+
+        if operation_lower == "unique":
+            values = df[target_column].dropna().unique()
+            return f"{len(values)} distinct '{target_column}' in {description}: {', '.join(map(str, values[:100]))}"
+
+        aggregations = {"sum": "sum", "average": "mean", "mean": "mean", "max": "max", "min": "min"}
+        if operation_lower not in aggregations:
+            return f"Error: Unknown operation '{operation}'. Use: rows, count, sum, average, max, min, unique"
+        numeric_only = operation_lower in ("sum", "average", "mean")
+        if numeric_only and not pd.api.types.is_numeric_dtype(df[target_column]):
+            return f"Error: Column '{target_column}' is not numeric"
+
+        if group_by:
+            grouped = df.groupby(group_by)[target_column].agg(aggregations[operation_lower])
+            return f"{operation.capitalize()} of '{target_column}' in {description} by '{group_by}':\n{grouped.to_string()}"
+        result = df[target_column].agg(aggregations[operation_lower])
+        return f"{operation.capitalize()} of '{target_column}' in {description}: {result}"
+
+    except Exception as e:
+        return f"Error querying table from {url}: {str(e)}"
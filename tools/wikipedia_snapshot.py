@@ -0,0 +1,477 @@
+"""Offline English Wikipedia snapshots: year-pinned article lookup and full-text search without network."""
+import os
+import io
+import re
+import bz2
+import gzip
+import html
+import json
+import math
+import mmap
+import shutil
+import hashlib
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+import numpy as np
+from langchain_core.tools import tool
+
+from tools.cache_utils import get_cache_dir
+from tools.document_cache import split_sections
+from tools.text_retrieval import tokenize, BM25_K1, BM25_B
+
+
+# Title words count this many times in the full-text index, so articles about a term rank first
+TITLE_WEIGHT = 3
+
+# Characters of article text returned by read_wikipedia_article when no section is asked for
+MAX_ARTICLE_CHARS = 12000
+
+# Characters of the lead section shown per search result
+SNIPPET_CHARS = 300
+
+WIKI_URL = "https://en.wikipedia.org/wiki/"
+
+# Links to these namespaces are media or metadata, not text
+DROPPED_LINK_PREFIXES = ("file:", "image:", "category:", "media:")
+
+HEADING_PATTERN = re.compile(r"^(={2,6})\s*(.+?)\s*\1\s*$")
+
+
+def normalize_title(title: str) -> str:
+    """Lookup form of a title: case-insensitive, underscores as spaces, single spaces."""
+    return " ".join(title.replace("_", " ").split()).casefold()
+
+
+def _hash(key: str) -> int:
+    """64-bit hash used as the sort key of the title and term tables."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _replace_link(match: re.Match) -> str:
+    target, _, label = match.group(1).partition("|")
+    if target.strip().lower().startswith(DROPPED_LINK_PREFIXES):
+        return ""
+    return (label.split("|")[-1] if label else target).strip()
+
+
+def _table_to_text(markup: str) -> str:
+    """Turn a {| ... |} wikitable into one " | "-separated line per row."""
+    rows, cells = [], []
+    for line in markup.split("\n"):
+        line = line.strip()
+        if line.startswith("{|") or line.startswith("|+"):
+            continue
+        if line.startswith("|-") or line.startswith("|}"):
+            if cells:
+                rows.append(" | ".join(cells))
+                cells = []
+            continue
+        if line.startswith(("|", "!")):
+            for cell in re.split(r"\|\||!!", line[1:]):
+                # "style=... | text": the text follows the last single bar
+                cell = re.split(r"(?<!\|)\|(?!\|)", cell)[-1].strip()
+                cells.append(cell)
+        elif line and cells:
+            cells[-1] += " " + line
+    if cells:
+        rows.append(" | ".join(cells))
+    return "\n".join(rows)
+
+
+def wikitext_to_text(markup: str) -> str:
+    """
+    Convert MediaWiki markup to plain text, keeping "== Heading ==" lines.
+
+    Templates (infoboxes, citations), references, comments, files and
+    categories are dropped; links become their label and tables become one
+    line per row.
+    """
+    text = re.sub(r"<!--.*?-->", "", markup, flags=re.DOTALL)
+    text = re.sub(r"<ref[^>/]*/>", "", text)
+    text = re.sub(r"<ref[^>]*>.*?</ref>", "", text, flags=re.DOTALL | re.IGNORECASE)
+    # Innermost first, so nested templates and links inside captions are handled
+    previous = None
+    while previous != text:
+        previous = text
+        text = re.sub(r"\{\{[^{}]*\}\}", "", text)
+    text = re.sub(r"\{\|.*?\n\|\}", lambda m: _table_to_text(m.group()), text, flags=re.DOTALL)
+    previous = None
+    while previous != text:
+        previous = text
+        text = re.sub(r"\[\[([^\[\]]*)\]\]", _replace_link, text)
+    text = re.sub(r"\[https?://\S+\s+([^\]]+)\]", r"\1", text)
+    text = re.sub(r"\[https?://[^\]]+\]", "", text)
+    text = re.sub(r"'{2,}", "", text)
+    text = re.sub(r"<[^>]+>", "", text)
+    text = html.unescape(text)
+
+    lines = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if line.startswith(("__", "#REDIRECT", "#redirect")):
+            continue
+        line = re.sub(r"^[*#:;]+\s*", "", line)
+        if line:
+            lines.append(" ".join(line.split()))
+    return "\n".join(lines)
+
+
+def _open_dump(path: str):
+    """Open a dump file, decompressing .bz2 and .gz on the fly."""
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def iter_dump_pages(path: str) -> Iterator[Tuple[str, Optional[str], str, str]]:
+    """
+    Stream main-namespace pages from a MediaWiki XML dump or a JSON-lines file.
+
+    JSON lines need "title" and "text" and may have "redirect" and "timestamp".
+    The XML is parsed incrementally and each page is freed once read, so
+    memory does not grow with the dump size.
+
+    Yields:
+        (title, redirect target or None, wikitext, revision timestamp) tuples
+    """
+    if path.endswith((".jsonl", ".jsonl.bz2", ".jsonl.gz")):
+        with _open_dump(path) as f:
+            for line in io.TextIOWrapper(f, encoding="utf-8"):
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["title"], record.get("redirect"), record.get("text", ""), record.get("timestamp", "")
+        return
+
+    from lxml import etree
+
+    with _open_dump(path) as f:
+        for _, page in etree.iterparse(f, events=("end",), tag="{*}page", huge_tree=True):
+            ns = page.tag[:-len("page")]
+            if page.findtext(f"{ns}ns", "0") == "0":
+                redirect = page.find(f"{ns}redirect")
+                yield (
+                    page.findtext(f"{ns}title", ""),
+                    redirect.get("title") if redirect is not None else None,
+                    page.findtext(f"{ns}revision/{ns}text", ""),
+                    page.findtext(f"{ns}revision/{ns}timestamp", ""),
+                )
+            page.clear()
+            while page.getprevious() is not None:
+                del page.getparent()[0]
+
+
+def ingest_dump(path: str, year: Optional[int] = None, max_pages: Optional[int] = None) -> dict:
+    """
+    Build the snapshot store for one year from a Wikipedia dump (or a subset of one).
+
+    Article texts go into one file; the title table (redirects included) and
+    the inverted index are sorted numpy arrays that are memory-mapped at query
+    time. The postings are collected in memory while building, so very large
+    dumps should be ingested as a subset (max_pages or a filtered dump).
+
+    Args:
+        path: pages-articles XML dump (.xml, .xml.bz2, .xml.gz) or JSON lines with title/text
+        year: Snapshot year; defaults to the year of the newest revision in the dump
+        max_pages: Stop after this many articles
+
+    Returns:
+        The snapshot metadata
+    """
+    base_dir = get_cache_dir("wikipedia")
+    build_dir = os.path.join(base_dir, f"build-{os.getpid()}")
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+
+    titles: Dict[str, int] = {}
+    redirects: List[Tuple[str, str]] = []
+    offsets, sizes, lengths = array("Q"), array("I"), array("I")
+    postings: Dict[str, Tuple[array, array]] = {}
+    newest = ""
+
+    with open(os.path.join(build_dir, "articles.bin"), "wb") as articles:
+        for title, redirect, markup, timestamp in iter_dump_pages(path):
+            newest = max(newest, timestamp)
+            if redirect:
+                redirects.append((title, redirect))
+                continue
+            text = wikitext_to_text(markup)
+            if not text:
+                continue
+            doc_id = len(offsets)
+            record = f"{title}\n{text}".encode("utf-8")
+            offsets.append(articles.tell())
+            sizes.append(len(record))
+            articles.write(record)
+            titles.setdefault(normalize_title(title), doc_id)
+
+            counts = Counter(tokenize(text))
+            for token in tokenize(title):
+                counts[token] += TITLE_WEIGHT
+            lengths.append(sum(counts.values()))
+            for term, freq in counts.items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = (array("I"), array("I"))
+                entry[0].append(doc_id)
+                entry[1].append(freq)
+
+            if max_pages and len(offsets) >= max_pages:
+                break
+
+    title_keys = dict(titles)
+    for title, target in redirects:
+        doc_id = titles.get(normalize_title(target))
+        if doc_id is not None:
+            title_keys.setdefault(normalize_title(title), doc_id)
+
+    title_hashes = np.array([_hash(key) for key in title_keys], dtype=np.uint64)
+    order = np.argsort(title_hashes, kind="stable")
+    np.save(os.path.join(build_dir, "title_hashes.npy"), title_hashes[order])
+    np.save(os.path.join(build_dir, "title_docs.npy"), np.array(list(title_keys.values()), dtype=np.uint32)[order])
+
+    terms = sorted(postings, key=_hash)
+    counts = np.array([len(postings[term][0]) for term in terms], dtype=np.uint32)
+    np.save(os.path.join(build_dir, "term_hashes.npy"), np.array([_hash(term) for term in terms], dtype=np.uint64))
+    np.save(os.path.join(build_dir, "term_starts.npy"), np.concatenate(([0], np.cumsum(counts, dtype=np.uint64)[:-1])).astype(np.uint64))
+    np.save(os.path.join(build_dir, "term_counts.npy"), counts)
+    np.save(os.path.join(build_dir, "posting_docs.npy"),
+            np.array([doc for term in terms for doc in postings[term][0]], dtype=np.uint32))
+    np.save(os.path.join(build_dir, "posting_freqs.npy"),
+            np.array([freq for term in terms for freq in postings[term][1]], dtype=np.uint32))
+    np.save(os.path.join(build_dir, "doc_offsets.npy"), np.frombuffer(offsets, dtype=np.uint64))
+    np.save(os.path.join(build_dir, "doc_sizes.npy"), np.frombuffer(sizes, dtype=np.uint32))
+    np.save(os.path.join(build_dir, "doc_lengths.npy"), np.frombuffer(lengths, dtype=np.uint32))
+
+    if year is None:
+        if not newest:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise ValueError("The dump has no revision timestamps; pass the snapshot year explicitly")
+        year = int(newest[:4])
+    meta = {
+        "year": year,
+        "source": os.path.basename(path),
+        "articles": len(offsets),
+        "redirects": len(title_keys) - len(titles),
+        "terms": len(terms),
+        "avg_length": (sum(lengths) / len(lengths)) if lengths else 0.0,
+        "newest_revision": newest,
+    }
+    with open(os.path.join(build_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    # Swap the finished build in, replacing any earlier snapshot of the same year
+    target_dir = os.path.join(base_dir, str(year))
+    with _snapshots_lock:
+        old = _snapshots.pop(year, None)
+        if old:
+            old.close()
+        shutil.rmtree(target_dir, ignore_errors=True)
+        os.replace(build_dir, target_dir)
+    return meta
+
+
+class WikipediaSnapshot:
+    """
+    A read-only, memory-mapped Wikipedia snapshot for one year.
+
+    Opening only maps the files; a title lookup is a binary search in the
+    title table and one read from the article file, and a search touches
+    only the postings of the query terms.
+    """
+
+    def __init__(self, year: int):
+        self.year = year
+        self.directory = os.path.join(get_cache_dir("wikipedia"), str(year))
+        with open(os.path.join(self.directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r")
+
+        self._title_hashes = load("title_hashes")
+        self._title_docs = load("title_docs")
+        self._term_hashes = load("term_hashes")
+        self._term_starts = load("term_starts")
+        self._term_counts = load("term_counts")
+        self._posting_docs = load("posting_docs")
+        self._posting_freqs = load("posting_freqs")
+        self._doc_offsets = load("doc_offsets")
+        self._doc_sizes = load("doc_sizes")
+        self._doc_lengths = load("doc_lengths")
+        self._file = open(os.path.join(self.directory, "articles.bin"), "rb")
+        self._articles = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.meta["articles"] else b""
+
+    def close(self):
+        if isinstance(self._articles, mmap.mmap):
+            self._articles.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.meta["articles"]
+
+    def _record(self, doc_id: int) -> Tuple[str, str]:
+        start = int(self._doc_offsets[doc_id])
+        record = self._articles[start:start + int(self._doc_sizes[doc_id])].decode("utf-8")
+        title, _, text = record.partition("\n")
+        return title, text
+
+    def get_article(self, title: str) -> Optional[Tuple[str, str]]:
+        """
+        Look up an article by title (case-insensitive; redirects are followed).
+
+        Returns:
+            (article title, plain text) or None if the snapshot has no such page
+        """
+        key = normalize_title(title)
+        target = np.uint64(_hash(key))
+        left = int(np.searchsorted(self._title_hashes, target, side="left"))
+        right = int(np.searchsorted(self._title_hashes, target, side="right"))
+        candidates = [self._record(int(doc_id)) for doc_id in self._title_docs[left:right]]
+        for article in candidates:
+            if normalize_title(article[0]) == key:
+                return article
+        # Only a redirect title can hash here without matching the article's own title
+        return candidates[0] if candidates else None
+
+    def get_sections(self, title: str) -> Optional[List[Tuple[str, str]]]:
+        """(heading path, text) sections of an article, or None if it is not in the snapshot."""
+        article = self.get_article(title)
+        return article_sections(*article) if article else None
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, str, float]]:
+        """
+        Full-text BM25 search over the snapshot.
+
+        Returns:
+            Up to top_k (title, text, score) results, best first
+        """
+        doc_ids, scores = [], []
+        count = len(self)
+        avg_length = self.meta["avg_length"] or 1.0
+        for term in set(tokenize(query)):
+            target = np.uint64(_hash(term))
+            position = int(np.searchsorted(self._term_hashes, target))
+            if position >= len(self._term_hashes) or self._term_hashes[position] != target:
+                continue
+            start, df = int(self._term_starts[position]), int(self._term_counts[position])
+            docs = np.asarray(self._posting_docs[start:start + df])
+            freqs = np.asarray(self._posting_freqs[start:start + df], dtype=np.float64)
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[docs] / avg_length)
+            doc_ids.append(docs)
+            scores.append(idf * freqs * (BM25_K1 + 1) / (freqs + norm))
+        if not doc_ids:
+            return []
+
+        unique, inverse = np.unique(np.concatenate(doc_ids), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        best = np.argsort(-totals, kind="stable")[:top_k]
+        return [(*self._record(int(unique[i])), float(totals[i])) for i in best]
+
+
+def article_sections(title: str, text: str) -> List[Tuple[str, str]]:
+    """Split snapshot article text into (heading path, text) sections at its == Heading == lines."""
+    blocks = []
+    for line in text.split("\n"):
+        match = HEADING_PATTERN.match(line)
+        blocks.append((len(match.group(1)), match.group(2)) if match else (0, line))
+    return split_sections(blocks, title)
+
+
+def article_url(title: str) -> str:
+    return WIKI_URL + quote(title.replace(" ", "_"))
+
+
+def lead_snippet(text: str, max_chars: int = SNIPPET_CHARS) -> str:
+    """Start of the lead section, cut at a word boundary."""
+    lead = text.split("\n==", 1)[0].replace("\n", " ")
+    if len(lead) <= max_chars:
+        return lead
+    return lead[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+# Open snapshots by year
+_snapshots: Dict[int, WikipediaSnapshot] = {}
+_snapshots_lock = threading.Lock()
+
+
+def available_years() -> List[int]:
+    """Years for which a snapshot has been ingested."""
+    base_dir = get_cache_dir("wikipedia")
+    return sorted(
+        int(name) for name in os.listdir(base_dir)
+        if name.isdigit() and os.path.exists(os.path.join(base_dir, name, "meta.json"))
+    )
+
+
+def get_snapshot(year: Optional[int] = None) -> Optional[WikipediaSnapshot]:
+    """
+    Get the snapshot for a year (the newest one if year is None).
+
+    Returns:
+        The opened snapshot, or None if no snapshot of that year was ingested
+    """
+    if year is None:
+        years = available_years()
+        if not years:
+            return None
+        year = years[-1]
+    with _snapshots_lock:
+        if year not in _snapshots:
+            if not os.path.exists(os.path.join(get_cache_dir("wikipedia"), str(year), "meta.json")):
+                return None
+            _snapshots[year] = WikipediaSnapshot(year)
+        return _snapshots[year]
+
+
+@tool
+def read_wikipedia_article(title: str, year: Optional[int] = None, section: Optional[str] = None) -> str:
+    """
+    Read an English Wikipedia article as it was in a given year, from a local snapshot (no network).
+    Use this for questions like "according to the 2022 version of English Wikipedia".
+
+    Args:
+        title: Article title (e.g. "Mercedes Sosa"); case-insensitive, redirects are followed
+        year: Snapshot year (default: the newest snapshot available)
+        section: Optional heading (or part of it) to return only matching sections, e.g. "Discography"
+
+    Returns:
+        The article text or the requested sections
+    """
+    try:
+        snapshot = get_snapshot(year)
+        if snapshot is None:
+            years = available_years()
+            return (f"Error: No Wikipedia snapshot for {year or 'any year'}. "
+                    + (f"Available years: {', '.join(map(str, years))}. " if years else "")
+                    + "Use read_url on the Wikipedia page (with its revision history for older versions) instead.")
+
+        article = snapshot.get_article(title)
+        if article is None:
+            suggestions = [result[0] for result in snapshot.search(title, top_k=5)]
+            return (f"Error: '{title}' not found in the {snapshot.year} Wikipedia snapshot."
+                    + (f" Closest articles: {'; '.join(suggestions)}" if suggestions else ""))
+        article_title, text = article
+        header = f"{article_title} (English Wikipedia, {snapshot.year} snapshot)\nURL: {article_url(article_title)}\n"
+
+        sections = article_sections(article_title, text)
+        if section:
+            section_lower = section.lower()
+            matching = [(heading, body) for heading, body in sections if section_lower in heading.lower()]
+            if not matching:
+                return (f"Error: No section matching '{section}'. Sections: "
+                        + "; ".join(dict.fromkeys(heading for heading, _ in sections)))
+            return header + "\n\n".join(f"[{heading}]\n{body}" for heading, body in matching)
+
+        if len(text) <= MAX_ARTICLE_CHARS:
+            return header + "\n" + text
+        return (header + "\n" + text[:MAX_ARTICLE_CHARS] + "\n[...]\n\nSections (use section= to read one): "
+                + "; ".join(dict.fromkeys(heading for heading, _ in sections)))
+
+    except Exception as e:
+        return f"Error reading Wikipedia article '{title}': {str(e)}"